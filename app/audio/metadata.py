@@ -0,0 +1,512 @@
+import mmap
+import struct
+from abc import ABC, abstractmethod
+
+import httpx
+
+from app.models.audio_blob import AudioMetadataDTO
+
+HEADER_SCAN_SIZE = 64 * 1024
+ADTS_SCAN_SIZE = 256 * 1024
+OGG_TAIL_SIZE = 64 * 1024
+MP4_MOOV_MAX_SIZE = 32 * 1024 * 1024
+HTTP_BLOCK_SIZE = 64 * 1024
+
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    25: [11025, 12000, 8000],
+}
+ADTS_SAMPLE_RATES = [
+    96000,
+    88200,
+    64000,
+    48000,
+    44100,
+    32000,
+    24000,
+    22050,
+    16000,
+    12000,
+    11025,
+    8000,
+    7350,
+]
+WAV_CODECS = {
+    0x0001: "pcm",
+    0x0003: "pcm_float",
+    0x0006: "alaw",
+    0x0007: "mulaw",
+    0x0011: "adpcm_ima",
+    0x0055: "mp3",
+}
+MP4_CODECS = {
+    b"mp4a": "aac",
+    b"alac": "alac",
+    b".mp3": "mp3",
+    b"ac-3": "ac3",
+    b"Opus": "opus",
+    b"fLaC": "flac",
+}
+MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+class AudioMetadataError(ValueError):
+    pass
+
+
+# sources give random access to the first/last bytes of a blob, the parsers
+# only ever touch headers so whole files are never read
+class BaseAudioSource(ABC):
+    size: int
+
+    @abstractmethod
+    def read(self, offset: int, size: int) -> bytes:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MmapAudioSource(BaseAudioSource):
+    def __init__(self, *, path: str):
+        # the map holds its own descriptor, so the file closes right away
+        with open(path, "rb") as file:
+            self.size = file.seek(0, 2)
+            self.map = (
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if self.size
+                else None
+            )
+
+    def read(self, offset: int, size: int) -> bytes:
+        if self.map is None or offset >= self.size:
+            return b""
+
+        return self.map[offset : offset + size]
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+
+
+class HttpRangeAudioSource(BaseAudioSource):
+    # reads are served from aligned blocks fetched with range requests
+    def __init__(self, *, url: str, timeout: float = 30.0):
+        self.url = url
+        self.client = httpx.Client(timeout=timeout)
+        self.blocks: dict[int, bytes] = {}
+
+        response = self.client.get(url, headers={"range": "bytes=0-0"})
+        response.raise_for_status()
+        content_range = response.headers.get("content-range", "")
+        if "/" in content_range:
+            self.size = int(content_range.rsplit("/", 1)[1])
+        else:
+            self.size = int(response.headers["content-length"])
+
+    def _get_block(self, index: int) -> bytes:
+        if index not in self.blocks:
+            start = index * HTTP_BLOCK_SIZE
+            end = min(start + HTTP_BLOCK_SIZE, self.size) - 1
+            response = self.client.get(
+                self.url, headers={"range": f"bytes={start}-{end}"}
+            )
+            response.raise_for_status()
+            self.blocks[index] = response.content
+
+        return self.blocks[index]
+
+    def read(self, offset: int, size: int) -> bytes:
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return b""
+
+        data = b"".join(
+            self._get_block(index)
+            for index in range(
+                offset // HTTP_BLOCK_SIZE, (end - 1) // HTTP_BLOCK_SIZE + 1
+            )
+        )
+        start = offset % HTTP_BLOCK_SIZE
+        return data[start : start + end - offset]
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def _get_id3v2_size(header: bytes) -> int:
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _get_audio_end(source: BaseAudioSource) -> int:
+    # an ID3v1 tag at the end of the file is not audio data
+    if source.size >= 128 and source.read(source.size - 128, 3) == b"TAG":
+        return source.size - 128
+
+    return source.size
+
+
+def _parse_mp3_frame(header: bytes) -> dict | None:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+
+    version = {0: 25, 2: 2, 3: 1}.get((header[1] >> 3) & 0x03)
+    layer = {1: 3, 2: 2, 3: 1}.get((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if (
+        version is None
+        or layer is None
+        or bitrate_index in (0, 15)
+        or sample_rate_index == 3
+    ):
+        return None
+
+    bitrate = MP3_BITRATES[(min(version, 2), layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        samples, length = 576, 72 * bitrate // sample_rate + padding
+    else:
+        samples, length = 1152, 144 * bitrate // sample_rate + padding
+
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if header[3] >> 6 == 3 else 2,
+        "samples": samples,
+        "length": length,
+    }
+
+
+def _parse_mp3(source: BaseAudioSource) -> AudioMetadataDTO:
+    start = _get_id3v2_size(source.read(0, 10))
+    data = source.read(start, HEADER_SCAN_SIZE)
+
+    # the first frame counts only if another frame follows right after it
+    for position in range(len(data) - 4):
+        frame = _parse_mp3_frame(data[position : position + 4])
+        if frame is None:
+            continue
+
+        following = source.read(start + position + frame["length"], 4)
+        if len(following) < 4 or _parse_mp3_frame(following) is not None:
+            break
+    else:
+        raise AudioMetadataError("No MPEG audio frame found")
+
+    frame_start = start + position
+    audio_size = _get_audio_end(source) - frame_start
+    frame_data = source.read(frame_start, 4 + 32 + 26)
+    mono = frame["channels"] == 1
+    side_info = (17 if mono else 32) if frame["version"] == 1 else (9 if mono else 17)
+
+    frames = None
+    xing = frame_data[4 + side_info : 4 + side_info + 12]
+    if xing[:4] in (b"Xing", b"Info"):
+        (flags,) = struct.unpack(">I", xing[4:8])
+        if flags & 0x01:
+            (frames,) = struct.unpack(">I", xing[8:12])
+    elif frame_data[36:40] == b"VBRI":
+        (frames,) = struct.unpack(">I", frame_data[50:54])
+
+    if frames:
+        duration = frames * frame["samples"] / frame["sample_rate"]
+        bitrate = int(audio_size * 8 / duration) if duration else frame["bitrate"]
+    else:
+        duration = audio_size * 8 / frame["bitrate"]
+        bitrate = frame["bitrate"]
+
+    return AudioMetadataDTO(
+        format="mp3",
+        codec="mp3" if frame["layer"] == 3 else f"mp{frame['layer']}",
+        duration=duration,
+        bitrate=bitrate,
+        sample_rate=frame["sample_rate"],
+        channels=frame["channels"],
+    )
+
+
+def _parse_adts(source: BaseAudioSource) -> AudioMetadataDTO:
+    start = _get_id3v2_size(source.read(0, 10))
+    audio_size = _get_audio_end(source) - start
+    data = source.read(start, ADTS_SCAN_SIZE)
+
+    # frame sizes vary, the average over the scanned window is extrapolated
+    position = frames = 0
+    sample_rate = channels = None
+    while position + 7 <= len(data):
+        header = data[position : position + 7]
+        if header[0] != 0xFF or header[1] & 0xF6 != 0xF0:
+            break
+
+        sample_rate_index = (header[2] >> 2) & 0x0F
+        if sample_rate_index >= len(ADTS_SAMPLE_RATES):
+            break
+        sample_rate = ADTS_SAMPLE_RATES[sample_rate_index]
+        channels = ((header[2] & 0x01) << 2) | (header[3] >> 6)
+        length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+        if length < 7:
+            break
+
+        position += length
+        frames += (header[6] & 0x03) + 1
+
+    if not frames or sample_rate is None:
+        raise AudioMetadataError("No ADTS frame found")
+
+    frames_total = frames * audio_size / min(position, audio_size)
+    duration = frames_total * 1024 / sample_rate
+
+    return AudioMetadataDTO(
+        format="aac",
+        codec="aac",
+        duration=duration,
+        bitrate=int(audio_size * 8 / duration),
+        sample_rate=sample_rate,
+        channels=channels,
+    )
+
+
+def _parse_wav(source: BaseAudioSource) -> AudioMetadataDTO:
+    position = 12
+    fmt = None
+    while position + 8 <= source.size:
+        chunk_id, chunk_size = struct.unpack("<4sI", source.read(position, 8))
+        position += 8
+
+        if chunk_id == b"fmt ":
+            fmt = source.read(position, min(chunk_size, 40))
+            if len(fmt) < 16:
+                raise AudioMetadataError("Truncated WAV fmt chunk")
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioMetadataError("WAV data chunk before fmt chunk")
+
+            # streamed files leave the size unset
+            data_size = min(chunk_size, source.size - position)
+            format_tag, channels, sample_rate, byte_rate = struct.unpack(
+                "<HHII", fmt[:12]
+            )
+            if format_tag == 0xFFFE and len(fmt) >= 26:
+                (format_tag,) = struct.unpack("<H", fmt[24:26])
+            if not byte_rate:
+                raise AudioMetadataError("WAV byte rate is zero")
+
+            return AudioMetadataDTO(
+                format="wav",
+                codec=WAV_CODECS.get(format_tag, f"wav_0x{format_tag:04x}"),
+                duration=data_size / byte_rate,
+                bitrate=byte_rate * 8,
+                sample_rate=sample_rate,
+                channels=channels,
+            )
+
+        position += chunk_size + (chunk_size & 1)
+
+    raise AudioMetadataError("No WAV data chunk found")
+
+
+def _get_ogg_last_granule(source: BaseAudioSource, serial: int) -> int | None:
+    tail_start = max(0, source.size - OGG_TAIL_SIZE)
+    tail = source.read(tail_start, OGG_TAIL_SIZE)
+    position = len(tail)
+    while (position := tail.rfind(b"OggS", 0, position)) != -1:
+        header = tail[position : position + 27]
+        if len(header) == 27:
+            granule, page_serial = struct.unpack("<qI", header[6:18])
+            if page_serial == serial and granule >= 0:
+                return granule
+
+    return None
+
+
+def _parse_ogg(source: BaseAudioSource) -> AudioMetadataDTO:
+    header = source.read(0, 27)
+    if len(header) < 27:
+        raise AudioMetadataError("Truncated Ogg page")
+
+    (serial,) = struct.unpack("<I", header[14:18])
+    segments = header[26]
+    packet = source.read(27 + segments, sum(source.read(27, segments)))
+
+    if packet[:7] == b"\x01vorbis":
+        channels, sample_rate, _, bitrate_nominal = struct.unpack(
+            "<BIiI", packet[11:24]
+        )
+        codec, granule_rate, pre_skip = "vorbis", sample_rate, 0
+    elif packet[:8] == b"OpusHead":
+        channels, pre_skip, input_rate = struct.unpack("<BHI", packet[9:16])
+        codec, granule_rate, bitrate_nominal = "opus", 48000, 0
+        sample_rate = input_rate or 48000
+    else:
+        raise AudioMetadataError("Unsupported Ogg codec")
+
+    granule = _get_ogg_last_granule(source, serial)
+    if granule is None:
+        raise AudioMetadataError("No final Ogg granule position found")
+
+    duration = max(granule - pre_skip, 0) / granule_rate
+    bitrate = int(source.size * 8 / duration) if duration else bitrate_nominal
+
+    return AudioMetadataDTO(
+        format="ogg",
+        codec=codec,
+        duration=duration,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        channels=channels,
+    )
+
+
+def _iter_mp4_boxes(data: bytes, start: int, end: int):
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[position : position + 8])
+        header_size = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", data[position + 8 : position + 16])
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+
+        yield box_type, position + header_size, min(position + size, end)
+        position += size
+
+
+def _parse_mp4_duration(data: bytes, start: int) -> tuple[int, int]:
+    # mvhd and mdhd share the version dependent time fields
+    if data[start] == 1:
+        timescale, duration = struct.unpack(">IQ", data[start + 20 : start + 32])
+    else:
+        timescale, duration = struct.unpack(">II", data[start + 12 : start + 20])
+    return timescale, duration
+
+
+def _find_mp4_moov(source: BaseAudioSource) -> bytes:
+    position = 0
+    while position + 8 <= source.size:
+        header = source.read(position, 16)
+        size, box_type = struct.unpack(">I4s", header[:8])
+        if size == 1:
+            (size,) = struct.unpack(">Q", header[8:16])
+        elif size == 0:
+            size = source.size - position
+        if size < 8:
+            break
+
+        if box_type == b"moov":
+            if size > MP4_MOOV_MAX_SIZE:
+                raise AudioMetadataError("MP4 moov box too large")
+            return source.read(position, size)
+
+        position += size
+
+    raise AudioMetadataError("No MP4 moov box found")
+
+
+def _parse_m4a(source: BaseAudioSource) -> AudioMetadataDTO:
+    moov = _find_mp4_moov(source)
+
+    movie_duration = None
+    tracks = []
+
+    def walk(start: int, end: int, track: dict | None) -> None:
+        nonlocal movie_duration
+        for box_type, content_start, content_end in _iter_mp4_boxes(moov, start, end):
+            if box_type == b"trak":
+                track = {}
+                tracks.append(track)
+                walk(content_start, content_end, track)
+            elif box_type in MP4_CONTAINERS:
+                walk(content_start, content_end, track)
+            elif box_type == b"mvhd":
+                movie_duration = _parse_mp4_duration(moov, content_start)
+            elif track is None:
+                continue
+            elif box_type == b"mdhd":
+                track["duration"] = _parse_mp4_duration(moov, content_start)
+            elif box_type == b"hdlr":
+                track["handler"] = moov[content_start + 8 : content_start + 12]
+            elif box_type == b"stsd":
+                entry = moov[content_start + 8 : content_start + 8 + 36]
+                if len(entry) == 36:
+                    track["codec"] = MP4_CODECS.get(
+                        entry[4:8], entry[4:8].decode("latin-1").strip()
+                    )
+                    (track["channels"],) = struct.unpack(">H", entry[24:26])
+                    (sample_rate,) = struct.unpack(">I", entry[32:36])
+                    track["sample_rate"] = sample_rate >> 16
+
+    walk(8, len(moov), None)
+
+    track = next((track for track in tracks if track.get("handler") == b"soun"), None)
+    if track is None or "codec" not in track:
+        raise AudioMetadataError("No MP4 audio track found")
+
+    timescale, duration = track.get("duration") or movie_duration or (0, 0)
+    if not timescale:
+        raise AudioMetadataError("MP4 timescale is zero")
+    duration = duration / timescale
+
+    return AudioMetadataDTO(
+        format="m4a",
+        codec=track["codec"],
+        duration=duration,
+        bitrate=int(source.size * 8 / duration) if duration else None,
+        sample_rate=track["sample_rate"],
+        channels=track["channels"],
+    )
+
+
+def parse_metadata(source: BaseAudioSource) -> AudioMetadataDTO:
+    header = source.read(0, 12)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return _parse_wav(source)
+    if header[:4] == b"OggS":
+        return _parse_ogg(source)
+    if header[4:8] == b"ftyp":
+        return _parse_m4a(source)
+
+    # ADTS and MPEG audio share the sync word, ADTS has the layer bits unset
+    start = _get_id3v2_size(header[:10])
+    frame = source.read(start, 2)
+    if len(frame) == 2 and frame[0] == 0xFF and frame[1] & 0xF6 == 0xF0:
+        return _parse_adts(source)
+
+    return _parse_mp3(source)
+
+
+def extract_metadata(
+    *, path: str | None = None, url: str | None = None
+) -> AudioMetadataDTO:
+    # entry point for worker processes, exactly one of path or url is set
+    source = MmapAudioSource(path=path) if path else HttpRangeAudioSource(url=url)
+    try:
+        return parse_metadata(source)
+    except (struct.error, IndexError, ZeroDivisionError) as e:
+        raise AudioMetadataError(f"Malformed audio header: {e}")
+    finally:
+        source.close()
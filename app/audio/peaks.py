@@ -0,0 +1,132 @@
+import struct
+import subprocess
+
+import numpy as np
+
+PEAKS_MAGIC = b"PEAK"
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct("<4sHIH")
+PEAKS_LEVEL = struct.Struct("<IIQ")
+PEAKS_INDEX_MAX_SIZE = 1024
+PEAKS_BLOCK_BUCKETS = 4096
+
+
+class AudioPeaksError(ValueError):
+    pass
+
+
+def _decode_pcm(*, source: str, sample_rate: int, bucket_size: int):
+    # ffmpeg decodes any supported container to mono 16-bit PCM, the output
+    # is consumed in blocks so memory stays bounded for long files
+    process = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-v",
+            "error",
+            "-i",
+            source,
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(sample_rate),
+            "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        block_size = bucket_size * PEAKS_BLOCK_BUCKETS * 2
+        while data := process.stdout.read(block_size):
+            yield np.frombuffer(data[: len(data) - len(data) % 2], dtype="<i2")
+    finally:
+        process.stdout.close()
+        error = process.stderr.read().decode(errors="replace").strip()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise AudioPeaksError(f"Audio decode failed: {error[-500:]}")
+
+
+def _reduce_levels(
+    *, mins: np.ndarray, maxs: np.ndarray, factor: int
+) -> tuple[np.ndarray, np.ndarray]:
+    # coarser levels are folded from the finest one instead of the PCM
+    padding = -mins.size % factor
+    if padding:
+        mins = np.pad(mins, (0, padding), mode="edge")
+        maxs = np.pad(maxs, (0, padding), mode="edge")
+
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def compute_peaks(
+    *,
+    path: str | None = None,
+    url: str | None = None,
+    sample_rate: int,
+    resolutions: list[int],
+) -> bytes:
+    # entry point for worker processes, exactly one of path or url is set
+    resolutions = sorted(set(resolutions))
+    bucket_size = resolutions[0]
+    if any(resolution % bucket_size for resolution in resolutions):
+        raise AudioPeaksError("Peak resolutions must be multiples of the smallest")
+
+    mins_blocks, maxs_blocks = [], []
+    remainder = np.empty(0, dtype="<i2")
+    for samples in _decode_pcm(
+        source=path or url, sample_rate=sample_rate, bucket_size=bucket_size
+    ):
+        if remainder.size:
+            samples = np.concatenate((remainder, samples))
+
+        usable = samples.size - samples.size % bucket_size
+        buckets = samples[:usable].reshape(-1, bucket_size)
+        mins_blocks.append(buckets.min(axis=1))
+        maxs_blocks.append(buckets.max(axis=1))
+        remainder = samples[usable:]
+
+    if remainder.size:
+        mins_blocks.append(remainder.min(keepdims=True))
+        maxs_blocks.append(remainder.max(keepdims=True))
+    if not mins_blocks:
+        raise AudioPeaksError("No audio samples decoded")
+
+    mins = np.concatenate(mins_blocks)
+    maxs = np.concatenate(maxs_blocks)
+
+    index = bytearray(PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, sample_rate, 0))
+    offset = PEAKS_HEADER.size + PEAKS_LEVEL.size * len(resolutions)
+    data = []
+    for resolution in resolutions:
+        level_mins, level_maxs = _reduce_levels(
+            mins=mins, maxs=maxs, factor=resolution // bucket_size
+        )
+        # min/max pairs are stored as interleaved signed bytes
+        level = np.column_stack((level_mins >> 8, level_maxs >> 8)).astype(np.int8)
+        index += PEAKS_LEVEL.pack(resolution, level_mins.size, offset)
+        data.append(level.tobytes())
+        offset += level.nbytes
+
+    PEAKS_HEADER.pack_into(
+        index, 0, PEAKS_MAGIC, PEAKS_VERSION, sample_rate, len(resolutions)
+    )
+    return bytes(index) + b"".join(data)
+
+
+def parse_peaks_index(data: bytes) -> tuple[int, dict[int, tuple[int, int]]]:
+    # returns the sample rate and {resolution: (offset, count)}
+    magic, version, sample_rate, level_count = PEAKS_HEADER.unpack_from(data)
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+        raise AudioPeaksError("Unknown peaks file format")
+
+    levels = {}
+    for number in range(level_count):
+        resolution, count, offset = PEAKS_LEVEL.unpack_from(
+            data, PEAKS_HEADER.size + PEAKS_LEVEL.size * number
+        )
+        levels[resolution] = (offset, count)
+
+    return sample_rate, levels
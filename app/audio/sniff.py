@@ -0,0 +1,73 @@
+from collections.abc import AsyncIterator
+
+SNIFF_SIZE = 64
+
+AUDIO_FORMAT_EXTENSIONS = {
+    "mp3": ".mp3",
+    "wav": ".wav",
+    "ogg": ".ogg",
+    "aac": ".aac",
+    "m4a": ".m4a",
+}
+M4A_BRANDS = {b"M4A ", b"M4B ", b"mp41", b"mp42", b"isom", b"iso2", b"dash"}
+
+
+def _is_mpeg_frame(header: bytes) -> bool:
+    return (
+        len(header) >= 4
+        and header[0] == 0xFF
+        and header[1] & 0xE0 == 0xE0
+        and header[1] & 0x18 != 0x08
+        and header[1] & 0x06 != 0x00
+        and header[2] >> 4 not in (0, 15)
+        and (header[2] >> 2) & 0x03 != 3
+    )
+
+
+def _is_adts_frame(header: bytes) -> bool:
+    return (
+        len(header) >= 7
+        and header[0] == 0xFF
+        and header[1] & 0xF6 == 0xF0
+        and (header[2] >> 2) & 0x0F < 13
+    )
+
+
+def sniff_format(header: bytes) -> str | None:
+    # the real container is taken from the leading bytes, never from the
+    # client supplied name or content type
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[4:8] == b"ftyp" and header[8:12] in M4A_BRANDS:
+        return "m4a"
+    if header[:3] == b"ID3" and len(header) >= 10:
+        return "mp3"
+    if _is_adts_frame(header):
+        return "aac"
+    if _is_mpeg_frame(header):
+        return "mp3"
+
+    return None
+
+
+async def sniff_stream(
+    stream: AsyncIterator[bytes],
+) -> tuple[str | None, AsyncIterator[bytes]]:
+    # buffers just enough of the body to sniff it, the returned stream
+    # replays the buffered bytes before continuing with the rest
+    iterator = aiter(stream)
+    header = bytearray()
+    async for content in iterator:
+        header += content
+        if len(header) >= SNIFF_SIZE:
+            break
+
+    async def replay() -> AsyncIterator[bytes]:
+        if header:
+            yield bytes(header)
+        async for content in iterator:
+            yield content
+
+    return sniff_format(bytes(header)), replay()
@@ -0,0 +1,71 @@
+import os
+import subprocess
+
+RENDITION_FORMATS = {
+    "mp3": {
+        "codec": "libmp3lame",
+        "muxer": "mp3",
+        "extension": ".mp3",
+        "media_type": "audio/mpeg",
+    },
+    "m4a": {
+        "codec": "aac",
+        "muxer": "ipod",
+        "extension": ".m4a",
+        "media_type": "audio/mp4",
+    },
+    "ogg": {
+        "codec": "libopus",
+        "muxer": "ogg",
+        "extension": ".ogg",
+        "media_type": "audio/ogg",
+    },
+}
+
+
+class AudioTranscodeError(ValueError):
+    pass
+
+
+def transcode(
+    *,
+    path: str | None = None,
+    url: str | None = None,
+    target_path: str,
+    format: str,
+    bitrate: int,
+) -> int:
+    # entry point for worker processes, exactly one of path or url is set;
+    # returns the size of the encoded file
+    preset = RENDITION_FORMATS[format]
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-v",
+        "error",
+        "-y",
+        "-i",
+        path or url,
+        "-vn",
+        "-map_metadata",
+        "-1",
+        "-c:a",
+        preset["codec"],
+        "-b:a",
+        f"{bitrate}k",
+    ]
+    # the index goes in front so players can start before the download ends
+    if format == "m4a":
+        command += ["-movflags", "+faststart"]
+    command += ["-f", preset["muxer"], target_path]
+
+    result = subprocess.run(command, capture_output=True, check=False)
+    if result.returncode != 0:
+        try:
+            os.remove(target_path)
+        except FileNotFoundError:
+            pass
+        error = result.stderr.decode(errors="replace").strip()
+        raise AudioTranscodeError(f"Audio transcode failed: {error[-500:]}")
+
+    return os.path.getsize(target_path)
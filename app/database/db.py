@@ -1,16 +1,114 @@
 from logging import getLogger
+from time import perf_counter
+from uuid import uuid4
 
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.database.base import Base
+from app.metrics.metrics import registry
 from app.settings.config import config
 
 logger = getLogger(__name__)
 
-engine = create_async_engine(url=config.DB_URL)
+pool_acquire_seconds = registry.histogram(
+    name="db_pool_acquire_seconds",
+    help="Time spent waiting for a pooled database connection.",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+pool_timeouts_total = registry.counter(
+    name="db_pool_timeouts_total",
+    help="Connection checkouts that gave up after the pool timeout.",
+)
+pool_connects_total = registry.counter(
+    name="db_pool_connects_total",
+    help="New database connections opened by the pool.",
+)
+pool_invalidations_total = registry.counter(
+    name="db_pool_invalidations_total",
+    help="Pooled database connections discarded as broken.",
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def connect(self):
+        # covers queue wait plus opening a connection when the pool is short
+        start = perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            pool_timeouts_total.inc()
+            raise
+        finally:
+            pool_acquire_seconds.observe(perf_counter() - start)
+
+
+def get_connect_args() -> dict:
+    if config.DB_PGBOUNCER:
+        # unique statement names keep asyncpg from colliding with statements
+        # another client left prepared on the same server connection
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+
+    return {"prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE}
+
+
+engine = create_async_engine(
+    url=config.DB_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+    connect_args=get_connect_args(),
+)
 session_factory = async_sessionmaker(
     bind=engine, autoflush=False, expire_on_commit=False
 )
+# shares the pool, connections switch back to the default level on return
+autocommit_session_factory = async_sessionmaker(
+    bind=engine.execution_options(isolation_level="AUTOCOMMIT"),
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# the pool is read on every scrape since dispose() swaps in a fresh one
+registry.gauge(
+    name="db_pool_size",
+    help="Configured number of persistent pooled connections.",
+    callback=lambda: engine.pool.size(),
+)
+registry.gauge(
+    name="db_pool_checked_out",
+    help="Pooled connections currently in use.",
+    callback=lambda: engine.pool.checkedout(),
+)
+registry.gauge(
+    name="db_pool_checked_in",
+    help="Idle pooled connections.",
+    callback=lambda: engine.pool.checkedin(),
+)
+registry.gauge(
+    name="db_pool_overflow",
+    help="Connections open beyond the pool size, negative while below it.",
+    callback=lambda: engine.pool.overflow(),
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def on_connect(dbapi_connection, connection_record):
+    pool_connects_total.inc()
+
+
+@event.listens_for(engine.sync_engine, "invalidate")
+def on_invalidate(dbapi_connection, connection_record, exception):
+    pool_invalidations_total.inc()
 
 
 async def create_tables():
@@ -0,0 +1,138 @@
+import asyncio
+from itertools import count
+from logging import getLogger
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.database.db import (
+    InstrumentedQueuePool,
+    autocommit_session_factory,
+    get_connect_args,
+    session_factory,
+)
+from app.metrics.metrics import registry
+from app.settings.config import config
+
+logger = getLogger(__name__)
+
+readonly_sessions_total = registry.counter(
+    name="db_readonly_sessions_total",
+    help="Read-only units of work by the database they were routed to.",
+)
+
+# a caught up replica reports zero lag even when the primary is idle,
+# otherwise the lag is the age of the last replayed transaction
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class Replica:
+    def __init__(self, *, name: str, url: str):
+        self.name = name
+        self.engine: AsyncEngine = create_async_engine(
+            url=url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=config.DB_REPLICA_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+            connect_args=get_connect_args(),
+        )
+        self.session_factory = async_sessionmaker(
+            bind=self.engine, autoflush=False, expire_on_commit=False
+        )
+        self.autocommit_session_factory = async_sessionmaker(
+            bind=self.engine.execution_options(isolation_level="AUTOCOMMIT"),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+        # unknown until the first check succeeds
+        self.healthy = False
+        self.lag: float | None = None
+
+    async def check(self) -> None:
+        try:
+            async with asyncio.timeout(config.DB_REPLICA_CHECK_TIMEOUT_SECONDS):
+                async with self.engine.connect() as conn:
+                    lag = float(await conn.scalar(REPLICA_LAG_QUERY))
+        except Exception as e:
+            if self.healthy:
+                logger.warning(
+                    "Replica %s check failed: %s", self.name, e, exc_info=True
+                )
+            self.healthy = False
+            self.lag = None
+            return
+
+        if self.lag is None:
+            logger.info("Replica %s is available, lag %.2fs", self.name, lag)
+        self.healthy = True
+        self.lag = lag
+
+    @property
+    def usable(self) -> bool:
+        return (
+            self.healthy
+            and self.lag is not None
+            and self.lag <= config.DB_REPLICA_MAX_LAG_SECONDS
+        )
+
+
+class ReplicaRouter:
+    # read-only work goes round robin over replicas that are reachable and
+    # within the lag limit, the primary takes it whenever none qualifies
+    def __init__(self, *, hosts: list[str]):
+        self.replicas = [
+            Replica(name=host, url=config.get_db_url(host=host)) for host in hosts
+        ]
+        self.counter = count()
+        self.task: asyncio.Task | None = None
+
+    def get_session_factory(self, *, autocommit: bool) -> async_sessionmaker:
+        replicas = [replica for replica in self.replicas if replica.usable]
+        if not replicas:
+            readonly_sessions_total.inc(target="primary")
+            return autocommit_session_factory if autocommit else session_factory
+
+        replica = replicas[next(self.counter) % len(replicas)]
+        readonly_sessions_total.inc(target="replica")
+        if autocommit:
+            return replica.autocommit_session_factory
+        return replica.session_factory
+
+    async def check(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(config.DB_REPLICA_CHECK_SECONDS)
+            await self.check()
+
+    async def start(self) -> None:
+        if not self.replicas or self.task is not None:
+            return
+
+        await self.check()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replica_router = ReplicaRouter(hosts=config.DB_REPLICA_HOSTS)
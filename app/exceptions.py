@@ -20,3 +20,11 @@ class ConflictException(Exception):
 
 class NotFoundException(Exception):
     pass
+
+
+class PayloadTooLargeException(Exception):
+    pass
+
+
+class ServiceUnavailableException(Exception):
+    pass
@@ -1,32 +1,59 @@
+import hmac
 from typing import Annotated
 from logging import getLogger
 
-from fastapi import Depends, HTTPException, Header, status
+from fastapi import Depends, HTTPException, Header, Request, status
 
 from app.exceptions import AuthException
-from app.repositories.uow import UnitOfWork
+from app.oauth.yandex import BaseYandexOAuthClient
+from app.repositories.uow import BaseUnitOfWork, UnitOfWork
 from app.services.audio_file import AudioFileService, BaseAudioFileService
+from app.services.audio_rendition import (
+    AudioRenditionService,
+    BaseAudioRenditionService,
+)
+from app.services.audio_upload import AudioUploadService, BaseAudioUploadService
 from app.services.refresh_session import (
     BaseRefreshSessionService,
     RefreshSessionService,
 )
 from app.services.user import BaseUserService, UserService
+from app.settings.config import config
+from app.storage.storage import storage
+from app.tokens.revocations import revocation_set
 from app.tokens.tokens import TokenPayload, validate_access_token
+from app.workers.pool import process_pool
 
 logger = getLogger(__name__)
 
 
+# unit of work, cached by fastapi so every service in a request shares it
+def get_uow() -> BaseUnitOfWork:
+    return UnitOfWork()
+
+
+UnitOfWorkDep = Annotated[BaseUnitOfWork, Depends(get_uow)]
+
+
+# yandex oauth client, created once in the app lifespan
+def get_oauth_client(request: Request) -> BaseYandexOAuthClient:
+    return request.app.state.yandex_client
+
+
+OAuthClientDep = Annotated[BaseYandexOAuthClient, Depends(get_oauth_client)]
+
+
 # user service
-def get_user_service():
-    return UserService(UnitOfWork())
+def get_user_service(uow: UnitOfWorkDep, oauth_client: OAuthClientDep):
+    return UserService(uow, oauth_client=oauth_client)
 
 
 UserServiceDep = Annotated[BaseUserService, Depends(get_user_service)]
 
 
 # refresh session service
-def get_refresh_session_service():
-    return RefreshSessionService(uow=UnitOfWork())
+def get_refresh_session_service(uow: UnitOfWorkDep):
+    return RefreshSessionService(uow=uow)
 
 
 RefreshSessionServiceDep = Annotated[
@@ -35,13 +62,33 @@ RefreshSessionServiceDep = Annotated[
 
 
 # audio file service
-def get_audio_file_service():
-    return AudioFileService(uow=UnitOfWork())
+def get_audio_file_service(uow: UnitOfWorkDep):
+    return AudioFileService(uow=uow, storage=storage)
 
 
 AudioFileServiceDep = Annotated[BaseAudioFileService, Depends(get_audio_file_service)]
 
 
+# audio upload service
+def get_audio_upload_service(uow: UnitOfWorkDep):
+    return AudioUploadService(uow=uow, storage=storage)
+
+
+AudioUploadServiceDep = Annotated[
+    BaseAudioUploadService, Depends(get_audio_upload_service)
+]
+
+
+# audio rendition service
+def get_audio_rendition_service(uow: UnitOfWorkDep):
+    return AudioRenditionService(uow=uow, storage=storage, executor=process_pool.get())
+
+
+AudioRenditionServiceDep = Annotated[
+    BaseAudioRenditionService, Depends(get_audio_rendition_service)
+]
+
+
 # access token validation
 def get_token_payload(authorization: Annotated[str, Header()]) -> TokenPayload:
     parts = authorization.split(" ")
@@ -66,7 +113,31 @@ def get_token_payload(authorization: Annotated[str, Header()]) -> TokenPayload:
             detail={"msg": "Internal server error"},
         )
 
+    # after the signature check, revocations are a dict lookup in process
+    if revocation_set.is_revoked(user_id=payload["id"], issued_at=payload["iat"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={"msg": "Token revoked"},
+        )
+
     return payload
 
 
 TokenPayloadDep = Annotated[TokenPayload, Depends(get_token_payload)]
+
+
+# metrics scrape token, an empty METRICS_TOKEN leaves /metrics open
+def check_metrics_token(
+    authorization: Annotated[str | None, Header()] = None,
+) -> None:
+    if not config.METRICS_TOKEN:
+        return
+
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme != "Bearer" or not hmac.compare_digest(
+        token.encode(), config.METRICS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={"msg": "Metrics token validation error"},
+        )
@@ -0,0 +1,118 @@
+import os
+from email.utils import parsedate_to_datetime
+
+import aiofiles.os
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+from app.settings.config import config
+
+
+class AudioFileResponse(FileResponse):
+    chunk_size = config.AUDIO_STREAM_CHUNK_SIZE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # whole-file responses are handed to servers supporting the
+        # "http.response.pathsend" extension so they can use sendfile,
+        # everything else is read by starlette in bounded chunks
+        if (
+            "http.response.pathsend" not in scope.get("extensions", {})
+            or scope["method"] != "GET"
+            or "range" in Headers(scope=scope)
+        ):
+            await super().__call__(scope, receive, send)
+            return
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        await send({"type": "http.response.pathsend", "path": str(self.path)})
+        if self.background is not None:
+            await self.background()
+
+
+def is_not_modified(*, request_headers: Headers, response_headers: Headers) -> bool:
+    if if_none_match := request_headers.get("if-none-match"):
+        etag = response_headers.get("etag")
+        if not etag:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+
+        etag = etag.removeprefix("W/")
+        for tag in if_none_match.split(","):
+            if tag.strip().removeprefix("W/") == etag:
+                return True
+        return False
+
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if not if_modified_since or not last_modified:
+        return False
+
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(
+            last_modified
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+def build_not_modified_response(*, response_headers: Headers) -> Response:
+    headers = {
+        name: value
+        for name, value in response_headers.items()
+        if name in ("etag", "last-modified", "cache-control", "accept-ranges")
+    }
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+async def build_file_response(
+    *,
+    request: Request,
+    path: str,
+    filename: str,
+    media_type: str | None = None,
+    etag: str | None = None,
+) -> Response:
+    try:
+        stat_result = await aiofiles.os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Audio file not found"},
+        )
+
+    headers = {"Cache-Control": f"private, max-age={config.AUDIO_CACHE_MAX_AGE}"}
+    if etag:
+        # content-addressed files get a strong validator instead of mtime/size
+        headers["ETag"] = f'"{etag}"'
+
+    response = AudioFileResponse(
+        path=path,
+        stat_result=stat_result,
+        media_type=media_type,
+        filename=filename,
+        content_disposition_type="inline",
+        headers=headers,
+    )
+    if request.method in ("GET", "HEAD") and is_not_modified(
+        request_headers=request.headers, response_headers=response.headers
+    ):
+        return build_not_modified_response(response_headers=response.headers)
+
+    return response
+
+
+def get_download_filename(*, filename_original: str, filename_unique: str) -> str:
+    extension = os.path.splitext(filename_unique)[1]
+    if filename_original.lower().endswith(extension):
+        return filename_original
+
+    return f"{filename_original}{extension}"
@@ -0,0 +1,176 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
+
+from app.exceptions import (
+    BadMediaType,
+    BadRequestException,
+    ConflictException,
+    InternalException,
+    NotFoundException,
+    PayloadTooLargeException,
+)
+from app.http.deps import AudioUploadServiceDep, TokenPayloadDep
+from app.models.audio_file import AudioFileCreateResponseDTO
+from app.models.audio_upload import AudioUploadCreateRequestDTO, AudioUploadResponseDTO
+
+audio_upload_router = APIRouter(prefix="/users/audio/uploads", tags=["Uploads"])
+
+OFFSET_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+@audio_upload_router.post("", status_code=status.HTTP_201_CREATED)
+async def create_audio_upload(
+    upload: AudioUploadCreateRequestDTO,
+    token_payload: TokenPayloadDep,
+    upload_service: AudioUploadServiceDep,
+    request: Request,
+    response: Response,
+) -> AudioUploadResponseDTO:
+    try:
+        upload_response = await upload_service.create_upload(
+            upload_info=upload, user_id=token_payload["id"]
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except ConflictException:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"msg": "Filename already exists"},
+        )
+    except BadMediaType:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail={"msg": "Unsupported media type"},
+        )
+    except PayloadTooLargeException:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"msg": "File too large"},
+        )
+
+    response.headers["Location"] = str(
+        request.url_for("get_audio_upload_offset", id=upload_response.id)
+    )
+    response.headers["Upload-Offset"] = str(upload_response.upload_offset)
+    response.headers["Upload-Length"] = str(upload_response.upload_length)
+    return upload_response
+
+
+@audio_upload_router.head("/{id}")
+async def get_audio_upload_offset(
+    id: str,
+    token_payload: TokenPayloadDep,
+    upload_service: AudioUploadServiceDep,
+) -> Response:
+    try:
+        upload = await upload_service.get_upload(id=id, user_id=token_payload["id"])
+    except InternalException:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except NotFoundException:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "Upload-Offset": str(upload.upload_offset),
+            "Upload-Length": str(upload.upload_length),
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@audio_upload_router.patch("/{id}")
+async def append_audio_upload_chunk(
+    id: str,
+    request: Request,
+    upload_offset: Annotated[int, Header(ge=0)],
+    content_type: Annotated[str, Header()],
+    token_payload: TokenPayloadDep,
+    upload_service: AudioUploadServiceDep,
+) -> Response:
+    if content_type != OFFSET_CONTENT_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail={"msg": f"Content-Type must be {OFFSET_CONTENT_TYPE}"},
+        )
+
+    try:
+        offset_new = await upload_service.append_chunk(
+            id=id,
+            user_id=token_payload["id"],
+            offset=upload_offset,
+            stream=request.stream(),
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Upload not found"},
+        )
+    except ConflictException:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"msg": "Upload offset mismatch"},
+        )
+    except PayloadTooLargeException:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"msg": "Chunk exceeds upload length"},
+        )
+    except BadMediaType:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail={"msg": "Unsupported media type"},
+        )
+
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={"Upload-Offset": str(offset_new)},
+    )
+
+
+@audio_upload_router.post("/{id}/complete")
+async def complete_audio_upload(
+    id: str,
+    token_payload: TokenPayloadDep,
+    upload_service: AudioUploadServiceDep,
+) -> AudioFileCreateResponseDTO:
+    try:
+        file_response = await upload_service.finalize_upload(
+            id=id, user_id=token_payload["id"]
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Upload not found"},
+        )
+    except BadRequestException:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"msg": "Upload is incomplete"},
+        )
+    except ConflictException:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"msg": "Filename already exists"},
+        )
+    except BadMediaType:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail={"msg": "Unsupported media type"},
+        )
+
+    return file_response
@@ -0,0 +1,32 @@
+import hashlib
+import json
+
+from fastapi import APIRouter, Request, Response
+from starlette.datastructures import Headers
+
+from app.http.responses import build_not_modified_response, is_not_modified
+from app.settings.config import config
+from app.tokens.keys import key_ring
+
+jwks_router = APIRouter(prefix="/.well-known", tags=["Keys"])
+
+# the ring is fixed for the process lifetime, so the body is built once
+JWKS_CONTENT = json.dumps(key_ring.jwks, separators=(",", ":")).encode()
+JWKS_HEADERS = Headers(
+    {
+        "etag": f'"{hashlib.sha256(JWKS_CONTENT).hexdigest()[:32]}"',
+        "cache-control": f"public, max-age={config.JWKS_MAX_AGE_SECONDS}",
+    }
+)
+
+
+@jwks_router.get("/jwks.json")
+async def get_jwks(request: Request) -> Response:
+    if is_not_modified(request_headers=request.headers, response_headers=JWKS_HEADERS):
+        return build_not_modified_response(response_headers=JWKS_HEADERS)
+
+    return Response(
+        content=JWKS_CONTENT,
+        media_type="application/jwk-set+json",
+        headers=dict(JWKS_HEADERS),
+    )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.http.deps import check_metrics_token
+from app.metrics.metrics import registry
+
+metrics_router = APIRouter(
+    prefix="/metrics", tags=["Metrics"], dependencies=[Depends(check_metrics_token)]
+)
+
+
+@metrics_router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        content=registry.render(), media_type="text/plain; version=0.0.4"
+    )
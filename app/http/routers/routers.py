@@ -1,4 +1,10 @@
+from app.http.routers.audio_upload import audio_upload_router
+from app.http.routers.jwks import jwks_router
 from app.http.routers.user import user_router
 from app.http.routers.token import token_router
+from app.http.routers.metrics import metrics_router
+from app.settings.config import config
 
-routers = [user_router, token_router]
+routers = [user_router, audio_upload_router, token_router, jwks_router]
+if config.METRICS_ENABLED:
+    routers.append(metrics_router)
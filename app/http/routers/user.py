@@ -1,26 +1,56 @@
-from typing import Annotated
-from fastapi import APIRouter, Form, HTTPException, Response, UploadFile, status
-from fastapi.responses import RedirectResponse
+from typing import Annotated, Literal
+from fastapi import (
+    APIRouter,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.datastructures import Headers
 
+from app.audio.transcode import RENDITION_FORMATS
 from app.exceptions import (
+    AuthException,
     BadMediaType,
     BadRequestException,
     ConflictException,
     InternalException,
     NotFoundException,
+    PayloadTooLargeException,
+    ServiceUnavailableException,
 )
 from app.http.deps import (
     AudioFileServiceDep,
+    AudioRenditionServiceDep,
     RefreshSessionServiceDep,
     TokenPayloadDep,
+    UnitOfWorkDep,
     UserServiceDep,
 )
+from app.http.responses import (
+    build_file_response,
+    build_not_modified_response,
+    get_download_filename,
+    is_not_modified,
+)
 from app.models.audio_file import (
-    AudioFileCreateRequestDTO,
     AudioFileCreateResponseDTO,
+    AudioFileDeleteResponseDTO,
+    AudioFileMetadataResponseDTO,
+    AudioFilesBatchCreateResponseDTO,
     AudioFilesGetResponseDTO,
 )
-from app.models.refresh_session import RefreshSessionRequestDTO
+from app.models.refresh_session import (
+    RefreshSessionDeleteResponseDTO,
+    RefreshSessionRequestDTO,
+    RefreshSessionsGetResponseDTO,
+    RefreshSessionsRevokeResponseDTO,
+)
 from app.models.user import (
     UserDeleteResponseDTO,
     UserGetResponseDTO,
@@ -107,6 +137,85 @@ async def delete_user_by_id(
     return user_response
 
 
+@user_router.get("/{user_id}/sessions")
+async def get_user_sessions(
+    user_id: int,
+    session_service: RefreshSessionServiceDep,
+    token_payload: TokenPayloadDep,
+) -> RefreshSessionsGetResponseDTO:
+    if user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    try:
+        sessions_response = await session_service.get_many_by_user_id(user_id=user_id)
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+
+    return sessions_response
+
+
+@user_router.delete("/{user_id}/sessions/{session_id}")
+async def delete_user_session(
+    user_id: int,
+    session_id: int,
+    session_service: RefreshSessionServiceDep,
+    token_payload: TokenPayloadDep,
+) -> RefreshSessionDeleteResponseDTO:
+    if user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    try:
+        session_response = await session_service.delete_one_by_id(
+            id=session_id, user_id=user_id
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Session not found"},
+        )
+
+    return session_response
+
+
+@user_router.delete("/{user_id}/sessions")
+async def revoke_user_sessions(
+    user_id: int,
+    session_service: RefreshSessionServiceDep,
+    token_payload: TokenPayloadDep,
+) -> RefreshSessionsRevokeResponseDTO:
+    if user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    try:
+        sessions_response = await session_service.revoke_many_by_user_id(
+            user_id=user_id
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+
+    return sessions_response
+
+
 @user_router.get("/yandex/login")
 async def get_yandex_login() -> RedirectResponse:
     params = f"response_type=code&client_id={config.YANDEX_CLIENT_ID}&redirect_uri={config.yandex_redirect_uri}&force_confirm=false"
@@ -116,16 +225,30 @@ async def get_yandex_login() -> RedirectResponse:
 @user_router.get("/yandex/callback")
 async def get_yandex_callback(
     code: str,
+    uow: UnitOfWorkDep,
     user_service: UserServiceDep,
     session_service: RefreshSessionServiceDep,
     response: Response,
 ):
     try:
-        user = await user_service.authenticate_with_yandex(code=code)
-        tokens = await session_service.create_tokens(
-            user_info=RefreshSessionRequestDTO(
-                user_id=user.id, is_superuser=user.is_superuser
+        # the user upsert and the session insert share one transaction
+        async with uow:
+            user = await user_service.authenticate_with_yandex(code=code)
+            tokens = await session_service.create_tokens(
+                user_info=RefreshSessionRequestDTO(
+                    user_id=user.id, is_superuser=user.is_superuser
+                )
             )
+            await uow.commit()
+    except AuthException:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={"msg": "Yandex authorization failed"},
+        )
+    except ServiceUnavailableException:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"msg": "Yandex is unavailable"},
         )
     except InternalException:
         raise HTTPException(
@@ -145,17 +268,9 @@ async def upload_audio_file(
     audio_file_service: AudioFileServiceDep,
 ) -> AudioFileCreateResponseDTO:
     try:
-        localfile = await audio_file_service.save_local(
+        file_response = await audio_file_service.save_file(
             file=file, filename_custom=custom_filename, user_id=token_payload["id"]
         )
-        file_response = await audio_file_service.save_db(
-            file_info=AudioFileCreateRequestDTO(
-                filepath=localfile.filepath,
-                filename_unique=localfile.filename_unique,
-                user_id=token_payload["id"],
-                filename_original=custom_filename,
-            )
-        )
     except InternalException:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -176,15 +291,107 @@ async def upload_audio_file(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail={"msg": "Unsupported media type"},
         )
+    except PayloadTooLargeException:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"msg": "File too large"},
+        )
+
+    return file_response
+
+
+@user_router.put("/audio")
+async def upload_audio_file_raw(
+    request: Request,
+    filename: str,
+    custom_filename: str,
+    content_type: Annotated[str, Header()],
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+    content_length: Annotated[int | None, Header()] = None,
+    x_content_sha256: Annotated[str | None, Header()] = None,
+) -> AudioFileCreateResponseDTO:
+    try:
+        file_response = await audio_file_service.save_stream(
+            stream=request.stream(),
+            filename=filename,
+            content_type=content_type,
+            filename_custom=custom_filename,
+            user_id=token_payload["id"],
+            content_length=content_length,
+            checksum_sha256=x_content_sha256,
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except ConflictException:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"msg": "Filename already exists"},
+        )
+    except BadRequestException:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"msg": "Checksum mismatch"},
+        )
+    except BadMediaType:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail={"msg": "Unsupported media type"},
+        )
+    except PayloadTooLargeException:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"msg": "File too large"},
+        )
 
     return file_response
 
 
+@user_router.post("/audio/batch")
+async def upload_audio_files_batch(
+    files: list[UploadFile],
+    custom_filenames: Annotated[list[str], Form()],
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+) -> AudioFilesBatchCreateResponseDTO:
+    if len(files) != len(custom_filenames):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"msg": "Each file needs a custom filename"},
+        )
+    if len(files) > config.AUDIO_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"msg": f"At most {config.AUDIO_BATCH_MAX_FILES} files per batch"},
+        )
+
+    try:
+        batch_response = await audio_file_service.save_batch(
+            files=files, filenames_custom=custom_filenames, user_id=token_payload["id"]
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+
+    return batch_response
+
+
 @user_router.get("/audio/{user_id}")
 async def get_user_audio_files(
     user_id: int,
     token_payload: TokenPayloadDep,
     audio_file_service: AudioFileServiceDep,
+    limit: Annotated[
+        int, Query(ge=1, le=config.AUDIO_FILES_PAGE_SIZE_MAX)
+    ] = config.AUDIO_FILES_PAGE_SIZE_DEFAULT,
+    cursor: str | None = None,
+    filename_prefix: str | None = None,
+    order: Literal["asc", "desc"] = "desc",
 ) -> AudioFilesGetResponseDTO:
     if not token_payload["is_superuser"]:
         raise HTTPException(
@@ -193,13 +400,284 @@ async def get_user_audio_files(
         )
 
     try:
-        audio_files_response = await audio_file_service.get_all_by_user_id(
-            user_id=user_id
+        audio_files_response = await audio_file_service.get_page_by_user_id(
+            user_id=user_id,
+            limit=limit,
+            cursor=cursor,
+            filename_prefix=filename_prefix,
+            order=order,
         )
     except InternalException:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail={"msg": "Internal server error"},
         )
+    except BadRequestException:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"msg": "Invalid cursor"},
+        )
 
     return audio_files_response
+
+
+@user_router.get("/audio/{user_id}/export")
+async def export_user_audio_files(
+    user_id: int,
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+    format: Literal["ndjson", "csv"] = "ndjson",
+) -> StreamingResponse:
+    if not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        audio_file_service.export_by_user_id(user_id=user_id, format=format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="audio_files_{user_id}.{format}"'
+            )
+        },
+    )
+
+
+@user_router.get("/audio/{id}/content")
+async def get_audio_file_content(
+    id: int,
+    request: Request,
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+) -> Response:
+    try:
+        audio_file = await audio_file_service.get_one_by_id(id=id)
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Audio file not found"},
+        )
+
+    if audio_file.user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    if audio_file.filepath is None:
+        return RedirectResponse(
+            url=audio_file.url, status_code=status.HTTP_307_TEMPORARY_REDIRECT
+        )
+
+    return await build_file_response(
+        request=request,
+        path=audio_file.filepath,
+        etag=audio_file.sha256,
+        filename=get_download_filename(
+            filename_original=audio_file.filename_original,
+            filename_unique=audio_file.filename_unique,
+        ),
+    )
+
+
+@user_router.get("/audio/{id}/renditions/{format}")
+async def get_audio_file_rendition(
+    id: int,
+    format: str,
+    request: Request,
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+    audio_rendition_service: AudioRenditionServiceDep,
+    bitrate: int = 128,
+) -> Response:
+    if (
+        format not in RENDITION_FORMATS
+        or bitrate not in config.AUDIO_RENDITION_BITRATES
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"msg": "Unsupported rendition"},
+        )
+
+    try:
+        audio_file = await audio_file_service.get_one_by_id(id=id)
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Audio file not found"},
+        )
+
+    if audio_file.user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    try:
+        rendition = await audio_rendition_service.get_rendition(
+            sha256=audio_file.sha256, format=format, bitrate=bitrate
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+
+    if rendition.filepath is None:
+        return RedirectResponse(
+            url=rendition.url, status_code=status.HTTP_307_TEMPORARY_REDIRECT
+        )
+
+    return await build_file_response(
+        request=request,
+        path=rendition.filepath,
+        media_type=rendition.media_type,
+        etag=f"{rendition.sha256}-{rendition.bitrate}k-{rendition.format}",
+        filename=get_download_filename(
+            filename_original=audio_file.filename_original,
+            filename_unique=f"{audio_file.id}{rendition.extension}",
+        ),
+    )
+
+
+@user_router.get("/audio/{id}/metadata")
+async def get_audio_file_metadata(
+    id: int,
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+) -> AudioFileMetadataResponseDTO:
+    try:
+        metadata = await audio_file_service.get_metadata_by_id(id=id)
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Audio file not found"},
+        )
+
+    if metadata.user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    return metadata
+
+
+@user_router.get("/audio/{id}/peaks")
+async def get_audio_file_peaks(
+    id: int,
+    request: Request,
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+    resolution: int = config.AUDIO_PEAKS_RESOLUTIONS[0],
+) -> Response:
+    if resolution not in config.AUDIO_PEAKS_RESOLUTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "msg": f"Resolution must be one of {config.AUDIO_PEAKS_RESOLUTIONS}"
+            },
+        )
+
+    try:
+        audio_file = await audio_file_service.get_one_by_id(id=id)
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Audio file not found"},
+        )
+
+    if audio_file.user_id != token_payload["id"] and not token_payload["is_superuser"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"msg": "Not enough permissions to perform this action"},
+        )
+
+    # peaks never change for a given content hash, so revalidation needs no read
+    headers = Headers(
+        {
+            "etag": f'"{audio_file.sha256}-{resolution}"',
+            "cache-control": f"private, max-age={config.AUDIO_CACHE_MAX_AGE}",
+        }
+    )
+    if is_not_modified(request_headers=request.headers, response_headers=headers):
+        return build_not_modified_response(response_headers=headers)
+
+    try:
+        peaks = await audio_file_service.get_peaks(
+            sha256=audio_file.sha256, resolution=resolution
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Peaks not available yet"},
+        )
+    except BadRequestException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Peaks not available at this resolution"},
+        )
+
+    return Response(
+        content=peaks.data,
+        media_type="application/octet-stream",
+        headers={
+            **headers,
+            "X-Peaks-Sample-Rate": str(peaks.sample_rate),
+            "X-Peaks-Resolution": str(peaks.resolution),
+            "X-Peaks-Count": str(peaks.count),
+        },
+    )
+
+
+@user_router.delete("/audio/{id}")
+async def delete_audio_file(
+    id: int,
+    token_payload: TokenPayloadDep,
+    audio_file_service: AudioFileServiceDep,
+) -> AudioFileDeleteResponseDTO:
+    try:
+        audio_file_response = await audio_file_service.delete_one_by_id(
+            id=id,
+            user_id=None if token_payload["is_superuser"] else token_payload["id"],
+        )
+    except InternalException:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"msg": "Internal server error"},
+        )
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"msg": "Audio file not found"},
+        )
+
+    return audio_file_response
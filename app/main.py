@@ -3,17 +3,46 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.database.db import close_pool, create_tables, drop_tables
+from app.database.replicas import replica_router
 from app.http.routers.routers import routers
+from app.oauth.yandex import create_yandex_client
+from app.settings.config import config
+from app.storage.storage import close_storage
+from app.workers.audio_job import audio_job_worker
+from app.workers.audio_upload_reaper import audio_upload_reaper
+from app.workers.pool import process_pool
+from app.workers.refresh_session_reaper import refresh_session_reaper
+from app.workers.token_revocation import token_revocation_listener
 
 
 @asynccontextmanager
 async def lifrespawn(app: FastAPI):
+    # built inside the running loop, shared by every request of the app
+    app.state.yandex_client = create_yandex_client()
     await create_tables()
+    await replica_router.start()
+    await refresh_session_reaper.prepare()
+    if config.REFRESH_SESSION_REAPER_ENABLED:
+        refresh_session_reaper.start()
+    if config.AUDIO_JOB_WORKER_ENABLED:
+        audio_job_worker.start()
+    if config.AUDIO_UPLOAD_REAPER_ENABLED:
+        audio_upload_reaper.start()
+    if config.TOKEN_REVOCATION_LISTENER_ENABLED:
+        token_revocation_listener.start()
 
     yield
 
+    await token_revocation_listener.stop()
+    await audio_upload_reaper.stop()
+    await audio_job_worker.stop()
+    await refresh_session_reaper.stop()
+    process_pool.shutdown()
     await drop_tables()
+    await replica_router.stop()
     await close_pool()
+    await close_storage()
+    await app.state.yandex_client.close()
 
 
 app = FastAPI(root_path="/api", lifespan=lifrespawn)
@@ -0,0 +1,134 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable
+from threading import Lock
+
+# a minimal in-process registry rendered in the prometheus text format,
+# values are per worker process
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, *, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.lock = Lock()
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        pass
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *, name: str, help: str):
+        super().__init__(name=name, help=help)
+        self.values: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        with self.lock:
+            values = list(self.values.items())
+        return [(self.name, dict(key), value) for key, value in values]
+
+
+class Gauge(Metric):
+    # read at scrape time, so the value never goes stale
+    type = "gauge"
+
+    def __init__(self, *, name: str, help: str, callback: Callable[[], float]):
+        super().__init__(name=name, help=help)
+        self.callback = callback
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        return [(self.name, {}, self.callback())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *, name: str, help: str, buckets: list[float]):
+        super().__init__(name=name, help=help)
+        self.buckets = sorted(buckets) + [float("inf")]
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+
+        samples = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, counts):
+            cumulative += count
+            samples.append(
+                (f"{self.name}_bucket", {"le": _format_value(bucket)}, cumulative)
+            )
+        samples.append((f"{self.name}_sum", {}, total))
+        samples.append((f"{self.name}_count", {}, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        # re-registering a name replaces it, so module reloads stay harmless
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *, name: str, help: str) -> Counter:
+        return self.register(Counter(name=name, help=help))
+
+    def gauge(self, *, name: str, help: str, callback: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name=name, help=help, callback=callback))
+
+    def histogram(self, *, name: str, help: str, buckets: list[float]) -> Histogram:
+        return self.register(Histogram(name=name, help=help, buckets=buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+from sqlalchemy import BigInteger, Float, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database.base import Base
+
+
+# database model
+class AudioBlobModel(Base):
+    __tablename__ = "audio_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    ref_count: Mapped[int] = mapped_column(Integer, default=1)
+
+    # sniffed from the leading bytes on upload, the rest is filled in by the
+    # metadata job
+    format: Mapped[str | None] = mapped_column(String, nullable=True)
+    codec: Mapped[str | None] = mapped_column(String, nullable=True)
+    duration: Mapped[float | None] = mapped_column(Float, nullable=True)
+    bitrate: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    sample_rate: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    channels: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+# dto models
+class AudioBlobCreateDTO(BaseModel):
+    sha256: str
+    size: int
+    format: str | None = None
+
+
+class AudioMetadataDTO(BaseModel):
+    format: str
+    codec: str
+    duration: float
+    bitrate: int | None
+    sample_rate: int | None
+    channels: int | None
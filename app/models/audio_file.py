@@ -1,5 +1,8 @@
+from datetime import datetime
+from typing import Literal
+
 from pydantic import BaseModel
-from sqlalchemy import Integer, ForeignKey, String
+from sqlalchemy import Index, Integer, ForeignKey, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database.base import Base
@@ -8,35 +11,112 @@ from app.database.base import Base
 # database model
 class AudioFileModel(Base):
     __tablename__ = "audio_files"
+    __table_args__ = (
+        Index("ix_audio_files_user_id_created_at_id", "user_id", "created_at", "id"),
+        # enforces one filename per user and also serves prefix searches
+        Index(
+            "ix_audio_files_user_id_filename_original",
+            "user_id",
+            "filename_original",
+            unique=True,
+            postgresql_ops={"filename_original": "text_pattern_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     filename_original: Mapped[str] = mapped_column(String)
     filename_unique: Mapped[str] = mapped_column(String, unique=True)
-    filepath: Mapped[str] = mapped_column(String)
+    blob_sha256: Mapped[str] = mapped_column(
+        String(64), ForeignKey("audio_blobs.sha256"), index=True
+    )
 
 
 # dto models
 class AudioFileSaveLocalDTO(BaseModel):
-    filepath: str
+    staging_key: str
     filename_unique: str
+    size: int
+    sha256: str
+    format: str
 
 
-class AudioFileCreateRequestDTO(AudioFileSaveLocalDTO):
+class AudioFileCreateRequestDTO(BaseModel):
     user_id: int
     filename_original: str
+    filename_unique: str
+    blob_sha256: str
 
 
 class AudioFileCreateResponseDTO(BaseModel):
+    id: int
     filename_original: str
     filename_unique: str
+    size: int
+    sha256: str
+    format: str
+
+
+class AudioFileBatchItemDTO(BaseModel):
+    custom_filename: str
+    status: Literal[
+        "created",
+        "conflict",
+        "unsupported_media_type",
+        "too_large",
+        "bad_request",
+        "error",
+    ]
+    file: AudioFileCreateResponseDTO | None = None
+
+
+class AudioFilesBatchCreateResponseDTO(BaseModel):
+    items: list[AudioFileBatchItemDTO]
+
+
+class AudioFileContentDTO(BaseModel):
+    id: int
+    user_id: int
+    filepath: str | None
+    url: str | None
+    filename_original: str
+    filename_unique: str
+    sha256: str
+
+
+class AudioFileMetadataResponseDTO(BaseModel):
+    id: int
+    user_id: int
+    sha256: str
+    size: int
+    ready: bool
+    format: str | None
+    codec: str | None
+    duration: float | None
+    bitrate: int | None
+    sample_rate: int | None
+    channels: int | None
+
+
+class AudioFilePeaksDTO(BaseModel):
+    sample_rate: int
+    resolution: int
+    count: int
+    data: bytes
+
+
+class AudioFileDeleteResponseDTO(BaseModel):
+    id: int
 
 
 class AudioFileGetDTO(BaseModel):
-    filepath: str
+    id: int
     filename_original: str
+    filename_unique: str
+    created_at: datetime
 
 
 class AudioFilesGetResponseDTO(BaseModel):
     user_id: int
     files: list[AudioFileGetDTO]
+    next_cursor: str | None
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database.base import Base
+
+AudioJobKind = Literal["metadata", "peaks"]
+
+
+# database model
+class AudioJobModel(Base):
+    __tablename__ = "audio_jobs"
+    __table_args__ = (Index("ix_audio_jobs_status_run_after", "status", "run_after"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    blob_sha256: Mapped[str] = mapped_column(
+        String(64), ForeignKey("audio_blobs.sha256", ondelete="CASCADE"), index=True
+    )
+    kind: Mapped[str] = mapped_column(String)
+    status: Mapped[str] = mapped_column(String, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_after: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    locked_until: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+
+# dto models
+class AudioJobCreateDTO(BaseModel):
+    blob_sha256: str
+    kind: AudioJobKind
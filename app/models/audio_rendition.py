@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database.base import Base
+
+
+# database model
+class AudioRenditionModel(Base):
+    __tablename__ = "audio_renditions"
+    __table_args__ = (
+        Index("ix_audio_renditions_last_accessed_at", "last_accessed_at"),
+    )
+
+    blob_sha256: Mapped[str] = mapped_column(
+        String(64),
+        ForeignKey("audio_blobs.sha256", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    format: Mapped[str] = mapped_column(String, primary_key=True)
+    bitrate: Mapped[int] = mapped_column(Integer, primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    last_accessed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+# dto models
+class AudioRenditionCreateDTO(BaseModel):
+    blob_sha256: str
+    format: str
+    bitrate: int
+    size: int
+
+
+class AudioRenditionContentDTO(BaseModel):
+    sha256: str
+    format: str
+    bitrate: int
+    filepath: str | None
+    url: str | None
+    extension: str
+    media_type: str
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database.base import Base
+
+
+# database model
+class AudioUploadModel(Base):
+    __tablename__ = "audio_uploads"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
+    filename_original: Mapped[str] = mapped_column(String)
+    file_extension: Mapped[str] = mapped_column(String)
+    upload_length: Mapped[int] = mapped_column(BigInteger)
+    upload_offset: Mapped[int] = mapped_column(BigInteger, default=0)
+    expire_in: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # held by the PATCH streaming a chunk, without a transaction open
+    lease_token: Mapped[str | None] = mapped_column(String, nullable=True)
+    locked_until: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+# dto models
+class AudioUploadCreateRequestDTO(BaseModel):
+    filename: str
+    custom_filename: str
+    length: int = Field(gt=0)
+
+
+class AudioUploadCreateDTO(BaseModel):
+    id: str
+    user_id: int
+    filename_original: str
+    file_extension: str
+    upload_length: int
+    expire_in: datetime
+
+
+class AudioUploadResponseDTO(BaseModel):
+    id: str
+    filename_original: str
+    upload_length: int
+    upload_offset: int
+    expire_in: datetime
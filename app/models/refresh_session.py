@@ -1,23 +1,40 @@
 from datetime import datetime
 
 from pydantic import BaseModel
-from sqlalchemy import DateTime, ForeignKey, String, Integer, text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, LargeBinary, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 
 from app.database.base import Base
+from app.settings.config import config
 
 
 class RefreshSessionModel(Base):
     __tablename__ = "refresh_sessions"
+    # range partitions on expire_in let the reaper drop whole days at once,
+    # postgres then requires the partition key in the primary key
+    __table_args__ = (
+        # equality lookups only, a hash index stores a 4-byte code per row
+        Index("ix_refresh_sessions_token_hash", "token_hash", postgresql_using="hash"),
+        {"postgresql_partition_by": "RANGE (expire_in)"}
+        if config.REFRESH_SESSION_PARTITIONED
+        else {},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
-    refresh_token: Mapped[str] = mapped_column(String, index=True)
+    # sha256 of the opaque token, or of the family id of signed rotating
+    # tokens, the cleartext is never stored
+    token_hash: Mapped[bytes] = mapped_column(LargeBinary(32))
+    generation: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     expire_in: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        server_default=text("(now() AT TIME ZONE 'utc') + interval '15 minutes'"),
-        onupdate=text("(now() AT TIME ZONE 'utc') + interval '15 minutes'"),
+        primary_key=config.REFRESH_SESSION_PARTITIONED,
+        # the repository sets it explicitly, these only cover raw sql writes
+        server_default=text(
+            "(now() AT TIME ZONE 'utc') + "
+            f"interval '{config.REFRESH_TOKEN_EXPIRE_MINUTES} minutes'"
+        ),
     )
 
 
@@ -28,7 +45,8 @@ class RefreshSessionRequestDTO(BaseModel):
 
 class RefreshSessionCreateDTO(BaseModel):
     user_id: int
-    refresh_token: str
+    token_hash: bytes
+    expire_in: datetime
 
 
 class RefreshSessionResponseDTO(BaseModel):
@@ -38,3 +56,23 @@ class RefreshSessionResponseDTO(BaseModel):
 
 class RefreshSessionUpdateDTO(BaseModel):
     refresh_token: str
+
+
+class RefreshSessionGetDTO(BaseModel):
+    id: int
+    created_at: datetime
+    expire_in: datetime
+
+
+class RefreshSessionsGetResponseDTO(BaseModel):
+    user_id: int
+    sessions: list[RefreshSessionGetDTO]
+
+
+class RefreshSessionDeleteResponseDTO(BaseModel):
+    id: int
+
+
+class RefreshSessionsRevokeResponseDTO(BaseModel):
+    user_id: int
+    sessions_revoked: int
@@ -0,0 +1,234 @@
+import asyncio
+import random
+import time
+from abc import ABC, abstractmethod
+from logging import getLogger
+
+import httpx
+
+from app.exceptions import AuthException, ServiceUnavailableException
+from app.metrics.metrics import registry
+from app.settings.config import config
+
+logger = getLogger(__name__)
+
+yandex_requests_total = registry.counter(
+    name="yandex_requests_total",
+    help="Requests to the Yandex OAuth and user info endpoints by outcome.",
+)
+
+# statuses worth another attempt, the rest are final answers
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    # closed: calls pass. open: calls fail fast until reset_seconds pass.
+    # half open: one trial call decides whether to close or open again
+    def __init__(self, *, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def release_trial(self) -> None:
+        # a trial that ended without an answer, e.g. cancelled, lets the next
+        # caller try instead of keeping the circuit half open for good
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Yandex circuit opened after %s failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+class BaseYandexOAuthClient(ABC):
+    @abstractmethod
+    async def get_access_token(self, *, code: str) -> str:
+        pass
+
+    @abstractmethod
+    async def get_user_info(self, *, access_token: str) -> dict:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+
+class YandexOAuthClient(BaseYandexOAuthClient):
+    def __init__(
+        self,
+        *,
+        token_url: str,
+        userinfo_url: str,
+        client_id: str,
+        client_secret: str,
+        max_connections: int,
+        http2: bool,
+        timeout: httpx.Timeout,
+        retry_attempts: int,
+        retry_backoff_seconds: float,
+        breaker: CircuitBreaker,
+    ):
+        self.token_url = token_url
+        self.userinfo_url = userinfo_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.retry_attempts = retry_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.breaker = breaker
+        # kept for the app lifetime so logins reuse warm TLS connections
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if not self.breaker.allow():
+            yandex_requests_total.inc(outcome="rejected")
+            raise ServiceUnavailableException
+
+        # only the caller that took the half open trial may hand it back
+        trial = self.breaker.trial_running
+        try:
+            for attempt in range(1, self.retry_attempts + 1):
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except (
+                    httpx.ConnectError,
+                    httpx.ConnectTimeout,
+                    httpx.PoolTimeout,
+                ) as e:
+                    error = str(e) or type(e).__name__
+                except httpx.HTTPError as e:
+                    # the request may have been processed, so it is not repeated
+                    yandex_requests_total.inc(outcome="error")
+                    self.breaker.record_failure()
+                    logger.error("Yandex request failed: %s", e)
+                    raise ServiceUnavailableException
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        yandex_requests_total.inc(outcome="ok")
+                        self.breaker.record_success()
+                        return response
+                    error = f"status {response.status_code}"
+
+                if attempt < self.retry_attempts:
+                    yandex_requests_total.inc(outcome="retry")
+                    # full jitter keeps a burst of logins from retrying in step
+                    backoff = self.retry_backoff_seconds * 2 ** (attempt - 1)
+                    await asyncio.sleep(random.uniform(0, backoff))
+
+            yandex_requests_total.inc(outcome="error")
+            self.breaker.record_failure()
+            logger.error("Yandex request failed after %s attempts: %s", attempt, error)
+            raise ServiceUnavailableException
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    async def get_access_token(self, *, code: str) -> str:
+        response = await self._request(
+            "POST",
+            self.token_url,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            },
+        )
+        # an expired or reused code is the caller's problem, not an outage
+        if response.status_code == httpx.codes.BAD_REQUEST:
+            raise AuthException
+        try:
+            response.raise_for_status()
+            access_token = response.json()["access_token"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.error("Yandex token response invalid: %s", e)
+            raise AuthException
+        if not access_token:
+            raise AuthException
+
+        return access_token
+
+    async def get_user_info(self, *, access_token: str) -> dict:
+        response = await self._request(
+            "GET",
+            self.userinfo_url,
+            headers={"Authorization": f"OAuth {access_token}"},
+        )
+        try:
+            response.raise_for_status()
+            user_info = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error("Yandex user info response invalid: %s", e)
+            raise AuthException
+
+        return user_info
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+# process wide, so the circuit state outlives any single client
+yandex_breaker = CircuitBreaker(
+    failure_threshold=config.YANDEX_BREAKER_FAILURES,
+    reset_seconds=config.YANDEX_BREAKER_RESET_SECONDS,
+)
+
+registry.gauge(
+    name="yandex_circuit_open",
+    help="1 while the Yandex circuit breaker rejects calls.",
+    callback=lambda: int(yandex_breaker.state == "open"),
+)
+
+
+def create_yandex_client() -> YandexOAuthClient:
+    return YandexOAuthClient(
+        token_url=config.YANDEX_OAUTH_TOKEN_URL,
+        userinfo_url=config.YANDEX_API_USERINFO_URL,
+        client_id=config.YANDEX_CLIENT_ID,
+        client_secret=config.YANDEX_CLIENT_SECRET,
+        max_connections=config.YANDEX_HTTP_MAX_CONNECTIONS,
+        http2=config.YANDEX_HTTP2,
+        timeout=httpx.Timeout(
+            connect=config.YANDEX_CONNECT_TIMEOUT_SECONDS,
+            read=config.YANDEX_READ_TIMEOUT_SECONDS,
+            write=config.YANDEX_WRITE_TIMEOUT_SECONDS,
+            pool=config.YANDEX_POOL_TIMEOUT_SECONDS,
+        ),
+        retry_attempts=config.YANDEX_RETRY_ATTEMPTS,
+        retry_backoff_seconds=config.YANDEX_RETRY_BACKOFF_SECONDS,
+        breaker=yandex_breaker,
+    )
@@ -0,0 +1,166 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+from logging import getLogger
+
+from sqlalchemy import and_, delete, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.exceptions import InternalException
+from app.models.audio_blob import (
+    AudioBlobCreateDTO,
+    AudioBlobModel,
+    AudioMetadataDTO,
+)
+
+logger = getLogger(__name__)
+
+# advisory lock class of per-blob locks, "blob"
+BLOBS_LOCK_CLASS = 0x626C6F62
+
+
+class BaseAudioBlobRepository(ABC):
+    @abstractmethod
+    def __init__(self, *, session: AsyncSession):
+        pass
+
+    @abstractmethod
+    async def lock_one(self, *, sha256: str) -> None:
+        pass
+
+    @abstractmethod
+    async def acquire_one(self, *, blob_info: AudioBlobCreateDTO) -> bool:
+        pass
+
+    @abstractmethod
+    async def acquire_many(self, *, blobs_info: list[AudioBlobCreateDTO]) -> set[str]:
+        pass
+
+    @abstractmethod
+    async def get_one_by_sha256(self, *, sha256: str) -> AudioBlobModel | None:
+        pass
+
+    @abstractmethod
+    async def update_metadata_by_sha256(
+        self, *, sha256: str, metadata: AudioMetadataDTO
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def release_one(self, *, sha256: str) -> bool:
+        pass
+
+
+class AudioBlobRepository(BaseAudioBlobRepository):
+    model = AudioBlobModel
+
+    def __init__(self, *, session: AsyncSession):
+        self.session = session
+
+    async def lock_one(self, *, sha256: str) -> None:
+        # held until the transaction ends, orders creating a blob against
+        # removing the files of one whose last reference was released
+        statement = select(
+            func.pg_advisory_xact_lock(BLOBS_LOCK_CLASS, func.hashtext(sha256))
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database lock error: %s", e)
+            raise InternalException from e
+
+    async def acquire_one(self, *, blob_info: AudioBlobCreateDTO) -> bool:
+        # returns True when the blob row was created by this statement
+        await self.lock_one(sha256=blob_info.sha256)
+        statement = (
+            insert(self.model)
+            .values(blob_info.model_dump())
+            .on_conflict_do_update(
+                index_elements=[self.model.sha256],
+                set_={"ref_count": self.model.ref_count + 1},
+            )
+            .returning(literal_column("xmax = 0"))
+        )
+        try:
+            inserted = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database upsert error: %s", e)
+            raise InternalException from e
+
+        return bool(inserted)
+
+    async def acquire_many(self, *, blobs_info: list[AudioBlobCreateDTO]) -> set[str]:
+        # one multi-row upsert, a hash may appear only once per statement so
+        # repeated content is folded into its reference count first
+        ref_counts = Counter(blob_info.sha256 for blob_info in blobs_info)
+        # sorted, so concurrent batches take the locks in the same order
+        for sha256 in sorted(ref_counts):
+            await self.lock_one(sha256=sha256)
+        blobs_by_sha256 = {blob_info.sha256: blob_info for blob_info in blobs_info}
+        statement = insert(self.model).values(
+            [
+                {**blobs_by_sha256[sha256].model_dump(), "ref_count": ref_count}
+                for sha256, ref_count in ref_counts.items()
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[self.model.sha256],
+            set_={"ref_count": self.model.ref_count + statement.excluded.ref_count},
+        ).returning(self.model.sha256, literal_column("xmax = 0"))
+        try:
+            result = await self.session.execute(statement)
+            rows = result.all()
+        except Exception as e:
+            logger.error("Database upsert error: %s", e)
+            raise InternalException from e
+
+        return {sha256 for sha256, inserted in rows if inserted}
+
+    async def get_one_by_sha256(self, *, sha256: str) -> AudioBlobModel | None:
+        statement = select(self.model).where(self.model.sha256 == sha256)
+        try:
+            blob = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return blob
+
+    async def update_metadata_by_sha256(
+        self, *, sha256: str, metadata: AudioMetadataDTO
+    ) -> None:
+        statement = (
+            update(self.model)
+            .where(self.model.sha256 == sha256)
+            .values(metadata.model_dump())
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+    async def release_one(self, *, sha256: str) -> bool:
+        # returns True when the last reference was dropped and the row deleted
+        statement_update = (
+            update(self.model)
+            .where(self.model.sha256 == sha256)
+            .values(ref_count=self.model.ref_count - 1)
+            .returning(self.model.ref_count)
+        )
+        statement_delete = (
+            delete(self.model)
+            .where(and_(self.model.sha256 == sha256, self.model.ref_count <= 0))
+            .returning(self.model.sha256)
+        )
+        try:
+            ref_count = await self.session.scalar(statement_update)
+            if ref_count is None or ref_count > 0:
+                return False
+
+            sha256_deleted = await self.session.scalar(statement_delete)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+        return sha256_deleted is not None
@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from datetime import datetime
 from logging import getLogger
+from typing import Literal
 
-from sqlalchemy import and_, insert, select
+from sqlalchemy import Row, and_, delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.exceptions import InternalException
@@ -19,7 +23,23 @@ class BaseAudioFileRepository(ABC):
     @abstractmethod
     async def create_one(
         self, *, audio_file_info: AudioFileCreateRequestDTO
-    ) -> AudioFileModel:
+    ) -> AudioFileModel | None:
+        pass
+
+    @abstractmethod
+    async def create_many(
+        self, *, audio_files_info: list[AudioFileCreateRequestDTO]
+    ) -> list[AudioFileModel]:
+        pass
+
+    @abstractmethod
+    async def get_one_by_id(self, *, id: int) -> AudioFileModel | None:
+        pass
+
+    @abstractmethod
+    async def get_filenames_by_user_id(
+        self, *, user_id: int, filenames_original: list[str]
+    ) -> set[str]:
         pass
 
     @abstractmethod
@@ -29,7 +49,25 @@ class BaseAudioFileRepository(ABC):
         pass
 
     @abstractmethod
-    async def get_all_by_user_id(self, *, user_id: int) -> list[AudioFileModel]:
+    async def get_page_by_user_id(
+        self,
+        *,
+        user_id: int,
+        limit: int,
+        cursor: tuple[datetime, int] | None = None,
+        filename_prefix: str | None = None,
+        order: Literal["asc", "desc"] = "desc",
+    ) -> list[AudioFileModel]:
+        pass
+
+    @abstractmethod
+    def stream_all_by_user_id(
+        self, *, user_id: int, batch_size: int
+    ) -> AsyncIterator[Row]:
+        pass
+
+    @abstractmethod
+    async def delete_one_by_id(self, *, id: int, user_id: int | None) -> str | None:
         pass
 
 
@@ -41,18 +79,54 @@ class AudioFileRepository(BaseAudioFileRepository):
 
     async def create_one(
         self, *, audio_file_info: AudioFileCreateRequestDTO
-    ) -> AudioFileModel:
+    ) -> AudioFileModel | None:
+        # a taken filename yields no row instead of an integrity error
         statement = (
             insert(self.model)
             .values(audio_file_info.model_dump())
+            .on_conflict_do_nothing(
+                index_elements=[self.model.user_id, self.model.filename_original]
+            )
             .returning(self.model)
         )
         try:
             result = await self.session.execute(statement)
-            audio_file = result.scalar_one()
+            audio_file = result.scalar_one_or_none()
+        except Exception as e:
+            logger.error("Database insert error: %s", e)
+            raise InternalException from e
+
+        return audio_file
+
+    async def create_many(
+        self, *, audio_files_info: list[AudioFileCreateRequestDTO]
+    ) -> list[AudioFileModel]:
+        statement = (
+            insert(self.model)
+            .values(
+                [audio_file_info.model_dump() for audio_file_info in audio_files_info]
+            )
+            .on_conflict_do_nothing(
+                index_elements=[self.model.user_id, self.model.filename_original]
+            )
+            .returning(self.model)
+        )
+        try:
+            result = await self.session.scalars(statement)
+            audio_files = list(result.all())
         except Exception as e:
             logger.error("Database insert error: %s", e)
-            raise InternalException
+            raise InternalException from e
+
+        return audio_files
+
+    async def get_one_by_id(self, *, id: int) -> AudioFileModel | None:
+        statement = select(self.model).where(self.model.id == id)
+        try:
+            audio_file = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
 
         return audio_file
 
@@ -73,17 +147,103 @@ class AudioFileRepository(BaseAudioFileRepository):
             audio_file = await self.session.scalar(statement)
         except Exception as e:
             logger.error("Database select error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return audio_file
 
-    async def get_all_by_user_id(self, *, user_id: int) -> list[AudioFileModel]:
+    async def get_filenames_by_user_id(
+        self, *, user_id: int, filenames_original: list[str]
+    ) -> set[str]:
+        statement = select(self.model.filename_original).where(
+            and_(
+                self.model.user_id == user_id,
+                self.model.filename_original.in_(filenames_original),
+            )
+        )
+        try:
+            result = await self.session.scalars(statement)
+            filenames = set(result.all())
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return filenames
+
+    async def get_page_by_user_id(
+        self,
+        *,
+        user_id: int,
+        limit: int,
+        cursor: tuple[datetime, int] | None = None,
+        filename_prefix: str | None = None,
+        order: Literal["asc", "desc"] = "desc",
+    ) -> list[AudioFileModel]:
+        # keyset pagination over (created_at, id), served by the
+        # (user_id, created_at, id) index without an OFFSET scan
+        sort_key = tuple_(self.model.created_at, self.model.id)
         statement = select(self.model).where(self.model.user_id == user_id)
+        if filename_prefix:
+            prefix_escaped = (
+                filename_prefix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+            )
+            statement = statement.where(
+                self.model.filename_original.like(f"{prefix_escaped}%", escape="/")
+            )
+        if order == "desc":
+            if cursor:
+                statement = statement.where(sort_key < tuple_(*cursor))
+            statement = statement.order_by(
+                self.model.created_at.desc(), self.model.id.desc()
+            )
+        else:
+            if cursor:
+                statement = statement.where(sort_key > tuple_(*cursor))
+            statement = statement.order_by(
+                self.model.created_at.asc(), self.model.id.asc()
+            )
+        statement = statement.limit(limit)
         try:
             result = await self.session.scalars(statement)
             audio_files = list(result.all())
         except Exception as e:
             logger.error("Database select error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return audio_files
+
+    async def stream_all_by_user_id(
+        self, *, user_id: int, batch_size: int
+    ) -> AsyncIterator[Row]:
+        # plain column rows are fetched through a server-side cursor, they
+        # are not kept in the session identity map so memory stays flat
+        statement = (
+            select(
+                self.model.id,
+                self.model.filename_original,
+                self.model.filename_unique,
+                self.model.created_at,
+            )
+            .where(self.model.user_id == user_id)
+            .order_by(self.model.created_at, self.model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        try:
+            result = await self.session.stream(statement)
+            async for row in result:
+                yield row
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+    async def delete_one_by_id(self, *, id: int, user_id: int | None) -> str | None:
+        statement = delete(self.model).where(self.model.id == id)
+        if user_id is not None:
+            statement = statement.where(self.model.user_id == user_id)
+        statement = statement.returning(self.model.blob_sha256)
+        try:
+            blob_sha256 = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+        return blob_sha256
@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from logging import getLogger
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.exceptions import InternalException
+from app.models.audio_job import AudioJobCreateDTO, AudioJobModel
+
+logger = getLogger(__name__)
+
+
+class BaseAudioJobRepository(ABC):
+    @abstractmethod
+    def __init__(self, *, session: AsyncSession):
+        pass
+
+    @abstractmethod
+    async def create_many(self, *, jobs_info: list[AudioJobCreateDTO]) -> None:
+        pass
+
+    @abstractmethod
+    async def claim_many(
+        self, *, limit: int, lease_seconds: int
+    ) -> list[AudioJobModel]:
+        pass
+
+    @abstractmethod
+    async def complete_one_by_id(self, *, id: int) -> None:
+        pass
+
+    @abstractmethod
+    async def fail_one_by_id(
+        self, *, id: int, error: str, retry_in_seconds: int | None
+    ) -> None:
+        pass
+
+
+class AudioJobRepository(BaseAudioJobRepository):
+    model = AudioJobModel
+
+    def __init__(self, *, session: AsyncSession):
+        self.session = session
+
+    async def create_many(self, *, jobs_info: list[AudioJobCreateDTO]) -> None:
+        if not jobs_info:
+            return
+
+        statement = insert(self.model).values(
+            [job_info.model_dump() for job_info in jobs_info]
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database insert error: %s", e)
+            raise InternalException from e
+
+    async def claim_many(
+        self, *, limit: int, lease_seconds: int
+    ) -> list[AudioJobModel]:
+        # SKIP LOCKED lets workers on every node poll the same table, running
+        # jobs whose lease ran out are picked up again; times come from the
+        # database clock so nodes never disagree about leases
+        now = func.now()
+        subquery = (
+            select(self.model.id)
+            .where(
+                or_(
+                    and_(self.model.status == "pending", self.model.run_after <= now),
+                    and_(self.model.status == "running", self.model.locked_until < now),
+                )
+            )
+            .order_by(self.model.run_after, self.model.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        statement = (
+            update(self.model)
+            .where(self.model.id.in_(subquery.scalar_subquery()))
+            .values(
+                status="running",
+                attempts=self.model.attempts + 1,
+                locked_until=now + timedelta(seconds=lease_seconds),
+            )
+            .returning(self.model)
+        )
+        try:
+            result = await self.session.scalars(statement)
+            jobs = list(result.all())
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+        return jobs
+
+    async def complete_one_by_id(self, *, id: int) -> None:
+        statement = delete(self.model).where(self.model.id == id)
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+    async def fail_one_by_id(
+        self, *, id: int, error: str, retry_in_seconds: int | None
+    ) -> None:
+        values = {"last_error": error, "locked_until": None}
+        if retry_in_seconds is None:
+            values["status"] = "failed"
+        else:
+            values["status"] = "pending"
+            values["run_after"] = func.now() + timedelta(seconds=retry_in_seconds)
+
+        statement = update(self.model).where(self.model.id == id).values(**values)
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
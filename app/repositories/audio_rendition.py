@@ -0,0 +1,174 @@
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from logging import getLogger
+
+from sqlalchemy import and_, delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.exceptions import InternalException
+from app.models.audio_rendition import AudioRenditionCreateDTO, AudioRenditionModel
+
+logger = getLogger(__name__)
+
+
+class BaseAudioRenditionRepository(ABC):
+    @abstractmethod
+    def __init__(self, *, session: AsyncSession):
+        pass
+
+    @abstractmethod
+    async def upsert_one(self, *, rendition_info: AudioRenditionCreateDTO) -> None:
+        pass
+
+    @abstractmethod
+    async def get_one(
+        self, *, blob_sha256: str, format: str, bitrate: int
+    ) -> AudioRenditionModel | None:
+        pass
+
+    @abstractmethod
+    async def get_many_by_blob_sha256(
+        self, *, blob_sha256: str
+    ) -> list[AudioRenditionModel]:
+        pass
+
+    @abstractmethod
+    async def touch_one(
+        self, *, blob_sha256: str, format: str, bitrate: int, interval_seconds: int
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def get_total_size(self) -> int:
+        pass
+
+    @abstractmethod
+    async def get_least_recent_many(self, *, limit: int) -> list[AudioRenditionModel]:
+        pass
+
+    @abstractmethod
+    async def delete_many(self, *, renditions: list[AudioRenditionModel]) -> None:
+        pass
+
+
+class AudioRenditionRepository(BaseAudioRenditionRepository):
+    model = AudioRenditionModel
+
+    def __init__(self, *, session: AsyncSession):
+        self.session = session
+
+    async def upsert_one(self, *, rendition_info: AudioRenditionCreateDTO) -> None:
+        statement = insert(self.model).values(rendition_info.model_dump())
+        statement = statement.on_conflict_do_update(
+            index_elements=[
+                self.model.blob_sha256,
+                self.model.format,
+                self.model.bitrate,
+            ],
+            set_={"size": statement.excluded.size, "last_accessed_at": func.now()},
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database upsert error: %s", e)
+            raise InternalException from e
+
+    async def get_one(
+        self, *, blob_sha256: str, format: str, bitrate: int
+    ) -> AudioRenditionModel | None:
+        statement = select(self.model).where(
+            and_(
+                self.model.blob_sha256 == blob_sha256,
+                self.model.format == format,
+                self.model.bitrate == bitrate,
+            )
+        )
+        try:
+            rendition = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return rendition
+
+    async def get_many_by_blob_sha256(
+        self, *, blob_sha256: str
+    ) -> list[AudioRenditionModel]:
+        statement = select(self.model).where(self.model.blob_sha256 == blob_sha256)
+        try:
+            result = await self.session.scalars(statement)
+            renditions = list(result.all())
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return renditions
+
+    async def touch_one(
+        self, *, blob_sha256: str, format: str, bitrate: int, interval_seconds: int
+    ) -> None:
+        # recency only needs to be coarse, so hot renditions are not
+        # rewritten on every request
+        statement = (
+            update(self.model)
+            .where(
+                and_(
+                    self.model.blob_sha256 == blob_sha256,
+                    self.model.format == format,
+                    self.model.bitrate == bitrate,
+                    self.model.last_accessed_at
+                    < func.now() - timedelta(seconds=interval_seconds),
+                )
+            )
+            .values(last_accessed_at=func.now())
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+    async def get_total_size(self) -> int:
+        statement = select(func.coalesce(func.sum(self.model.size), 0))
+        try:
+            total_size = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return int(total_size)
+
+    async def get_least_recent_many(self, *, limit: int) -> list[AudioRenditionModel]:
+        statement = (
+            select(self.model)
+            .order_by(self.model.last_accessed_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        try:
+            result = await self.session.scalars(statement)
+            renditions = list(result.all())
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return renditions
+
+    async def delete_many(self, *, renditions: list[AudioRenditionModel]) -> None:
+        if not renditions:
+            return
+
+        statement = delete(self.model).where(
+            tuple_(self.model.blob_sha256, self.model.format, self.model.bitrate).in_(
+                [
+                    (rendition.blob_sha256, rendition.format, rendition.bitrate)
+                    for rendition in renditions
+                ]
+            )
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
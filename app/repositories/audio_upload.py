@@ -0,0 +1,215 @@
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from logging import getLogger
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.exceptions import InternalException
+from app.models.audio_upload import AudioUploadCreateDTO, AudioUploadModel
+
+logger = getLogger(__name__)
+
+
+class BaseAudioUploadRepository(ABC):
+    @abstractmethod
+    def __init__(self, *, session: AsyncSession):
+        pass
+
+    @abstractmethod
+    async def create_one(
+        self, *, upload_info: AudioUploadCreateDTO
+    ) -> AudioUploadModel:
+        pass
+
+    @abstractmethod
+    async def get_one_by_id(
+        self, *, id: str, for_update: bool = False
+    ) -> AudioUploadModel | None:
+        pass
+
+    @abstractmethod
+    async def lease_one_by_id(
+        self, *, id: str, offset: int, lease_token: str, lease_seconds: int
+    ) -> bool:
+        pass
+
+    @abstractmethod
+    async def renew_lease_by_id(
+        self, *, id: str, lease_token: str, lease_seconds: int
+    ) -> bool:
+        pass
+
+    @abstractmethod
+    async def release_lease_by_id(self, *, id: str, lease_token: str) -> None:
+        pass
+
+    @abstractmethod
+    async def update_offset_by_id(
+        self, *, id: str, lease_token: str, offset_expected: int, offset_new: int
+    ) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete_one_by_id(self, *, id: str) -> None:
+        pass
+
+    @abstractmethod
+    async def delete_expired_many(self, *, limit: int) -> list[str]:
+        pass
+
+
+class AudioUploadRepository(BaseAudioUploadRepository):
+    model = AudioUploadModel
+
+    def __init__(self, *, session: AsyncSession):
+        self.session = session
+
+    async def create_one(
+        self, *, upload_info: AudioUploadCreateDTO
+    ) -> AudioUploadModel:
+        statement = (
+            insert(self.model).values(upload_info.model_dump()).returning(self.model)
+        )
+        try:
+            result = await self.session.execute(statement)
+            upload = result.scalar_one()
+        except Exception as e:
+            logger.error("Database insert error: %s", e)
+            raise InternalException from e
+
+        return upload
+
+    async def get_one_by_id(
+        self, *, id: str, for_update: bool = False
+    ) -> AudioUploadModel | None:
+        statement = select(self.model).where(self.model.id == id)
+        if for_update:
+            statement = statement.with_for_update()
+        try:
+            upload = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return upload
+
+    async def lease_one_by_id(
+        self, *, id: str, offset: int, lease_token: str, lease_seconds: int
+    ) -> bool:
+        # only one PATCH at the current offset gets the lease, times come
+        # from the database clock so nodes never disagree about leases
+        now = func.now()
+        statement = (
+            update(self.model)
+            .where(
+                and_(
+                    self.model.id == id,
+                    self.model.upload_offset == offset,
+                    or_(
+                        self.model.locked_until.is_(None),
+                        self.model.locked_until < now,
+                    ),
+                )
+            )
+            .values(
+                lease_token=lease_token,
+                locked_until=now + timedelta(seconds=lease_seconds),
+            )
+            .returning(self.model.id)
+        )
+        try:
+            id_leased = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+        return id_leased is not None
+
+    async def renew_lease_by_id(
+        self, *, id: str, lease_token: str, lease_seconds: int
+    ) -> bool:
+        statement = (
+            update(self.model)
+            .where(and_(self.model.id == id, self.model.lease_token == lease_token))
+            .values(locked_until=func.now() + timedelta(seconds=lease_seconds))
+            .returning(self.model.id)
+        )
+        try:
+            id_renewed = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+        return id_renewed is not None
+
+    async def release_lease_by_id(self, *, id: str, lease_token: str) -> None:
+        statement = (
+            update(self.model)
+            .where(and_(self.model.id == id, self.model.lease_token == lease_token))
+            .values(lease_token=None, locked_until=None)
+        )
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+    async def update_offset_by_id(
+        self, *, id: str, lease_token: str, offset_expected: int, offset_new: int
+    ) -> bool:
+        # compare and set, it fails if the lease was lost while streaming
+        statement = (
+            update(self.model)
+            .where(
+                and_(
+                    self.model.id == id,
+                    self.model.lease_token == lease_token,
+                    self.model.upload_offset == offset_expected,
+                )
+            )
+            .values(upload_offset=offset_new, lease_token=None, locked_until=None)
+            .returning(self.model.id)
+        )
+        try:
+            id_updated = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database update error: %s", e)
+            raise InternalException from e
+
+        return id_updated is not None
+
+    async def delete_one_by_id(self, *, id: str) -> None:
+        statement = delete(self.model).where(self.model.id == id)
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+    async def delete_expired_many(self, *, limit: int) -> list[str]:
+        # an upload still streaming a chunk is left until its lease ends,
+        # SKIP LOCKED passes over one being finalized
+        now = func.now()
+        subquery = (
+            select(self.model.id)
+            .where(
+                self.model.expire_in < now,
+                or_(self.model.locked_until.is_(None), self.model.locked_until < now),
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        statement = (
+            delete(self.model)
+            .where(self.model.id.in_(subquery.scalar_subquery()))
+            .returning(self.model.id)
+        )
+        try:
+            result = await self.session.scalars(statement)
+            ids = list(result.all())
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+        return ids
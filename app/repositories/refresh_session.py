@@ -1,14 +1,25 @@
 from abc import ABC, abstractmethod
+from contextlib import suppress
+from datetime import UTC, date, datetime, timedelta
 from logging import getLogger
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import Executable, Row, delete, func, insert, select, text, update
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.exceptions import InternalException
 from app.models.refresh_session import RefreshSessionCreateDTO, RefreshSessionModel
+from app.models.user import UserModel
+from app.settings.config import config
 
 logger = getLogger(__name__)
 
+# advisory lock key for partition maintenance, "refresh" in ascii
+PARTITIONS_LOCK_KEY = 0x72656672657368
+# check_violation, raised for a row no partition accepts
+NO_PARTITION_SQLSTATE = "23514"
+
 
 class BaseRefreshSessionRepository(ABC):
     @abstractmethod
@@ -20,11 +31,63 @@ class BaseRefreshSessionRepository(ABC):
         pass
 
     @abstractmethod
-    async def get_one(self, *, refresh_token: str) -> RefreshSessionModel | None:
+    async def get_one(self, *, token_hash: bytes) -> RefreshSessionModel | None:
+        pass
+
+    @abstractmethod
+    async def get_many_by_user_id(self, *, user_id: int) -> list[RefreshSessionModel]:
+        pass
+
+    @abstractmethod
+    async def update_one_by_id(
+        self, *, id: int, token_hash: bytes, expire_in: datetime
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def delete_one_by_id(self, *, id: int, user_id: int) -> int | None:
+        pass
+
+    @abstractmethod
+    async def delete_many_by_user_id(self, *, user_id: int) -> int:
+        pass
+
+    @abstractmethod
+    async def rotate_one(
+        self, *, token_hash: bytes, generation: int, expire_in: datetime
+    ) -> Row | None:
+        pass
+
+    @abstractmethod
+    async def delete_one_by_token_hash(self, *, token_hash: bytes) -> None:
+        pass
+
+    @abstractmethod
+    async def delete_expired_many(self, *, limit: int, grace_seconds: int) -> int:
+        pass
+
+    @abstractmethod
+    async def try_lock_partitions(self) -> bool:
         pass
 
     @abstractmethod
-    async def update_one_by_id(self, *, id: int, refresh_token: str) -> None:
+    async def get_partition_days(self) -> list[date]:
+        pass
+
+    @abstractmethod
+    async def create_partitions(self, *, days: list[date]) -> None:
+        pass
+
+    @abstractmethod
+    async def unlock_partitions(self) -> None:
+        pass
+
+    @abstractmethod
+    async def detach_partition(self, *, day: date) -> None:
+        pass
+
+    @abstractmethod
+    async def drop_partition(self, *, day: date) -> None:
         pass
 
 
@@ -34,32 +97,248 @@ class RefreshSessionRepository(BaseRefreshSessionRepository):
     def __init__(self, *, session: AsyncSession):
         self.session = session
 
+    async def _execute_routed(
+        self, statement: Executable, *, expire_in: datetime
+    ) -> Result:
+        # runs a write that routes a row by its expiry. maintenance keeps the
+        # partitions ahead, but when it has been down long enough for the
+        # day to be missing the write creates it and goes again
+        if not config.REFRESH_SESSION_PARTITIONED:
+            return await self.session.execute(statement)
+
+        try:
+            async with self.session.begin_nested():
+                return await self.session.execute(statement)
+        except IntegrityError as e:
+            if getattr(e.orig, "sqlstate", None) != NO_PARTITION_SQLSTATE:
+                raise
+
+        logger.warning("Refresh session partition for %s missing", expire_in.date())
+        # a concurrent write may have created it first
+        with suppress(InternalException):
+            async with self.session.begin_nested():
+                await self.create_partitions(days=[expire_in.date()])
+        return await self.session.execute(statement)
+
     async def create_one(self, *, session_info: RefreshSessionCreateDTO) -> None:
         statement = insert(self.model).values(session_info.model_dump())
         try:
-            await self.session.execute(statement)
+            await self._execute_routed(statement, expire_in=session_info.expire_in)
         except Exception as e:
             logger.error("Database error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
-    async def get_one(self, *, refresh_token: str) -> RefreshSessionModel | None:
-        statement = select(self.model).where(self.model.refresh_token == refresh_token)
+    async def get_one(self, *, token_hash: bytes) -> RefreshSessionModel | None:
+        statement = select(self.model).where(self.model.token_hash == token_hash)
         try:
             session = await self.session.scalar(statement)
         except Exception as e:
             logger.error("Database error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return session
 
-    async def update_one_by_id(self, *, id: int, refresh_token: str) -> None:
+    async def get_many_by_user_id(self, *, user_id: int) -> list[RefreshSessionModel]:
+        statement = (
+            select(self.model)
+            .where(self.model.user_id == user_id, self.model.expire_in > func.now())
+            .order_by(self.model.expire_in.desc())
+        )
+        try:
+            result = await self.session.scalars(statement)
+            sessions = list(result.all())
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return sessions
+
+    async def update_one_by_id(
+        self, *, id: int, token_hash: bytes, expire_in: datetime
+    ) -> None:
         statement = (
             update(self.model)
             .where(self.model.id == id)
-            .values(refresh_token=refresh_token)
+            .values(token_hash=token_hash, expire_in=expire_in)
         )
+        try:
+            await self._execute_routed(statement, expire_in=expire_in)
+        except Exception as e:
+            logger.error("Database error: %s", e)
+            raise InternalException from e
+
+    async def rotate_one(
+        self, *, token_hash: bytes, generation: int, expire_in: datetime
+    ) -> Row | None:
+        # advances the generation only if the presented one is current, and
+        # reads the user flags in the same statement. the new expiry is the
+        # one signed into the next token
+        statement = (
+            update(self.model)
+            .where(
+                self.model.token_hash == token_hash,
+                self.model.generation == generation,
+                # the app clock, the one the token exp was checked against
+                self.model.expire_in > datetime.now(tz=UTC),
+                self.model.user_id == UserModel.id,
+            )
+            .values(generation=self.model.generation + 1, expire_in=expire_in)
+            .returning(self.model.user_id, UserModel.is_superuser)
+        )
+        try:
+            result = await self._execute_routed(statement, expire_in=expire_in)
+            rotated = result.one_or_none()
+        except Exception as e:
+            logger.error("Database error: %s", e)
+            raise InternalException from e
+
+        return rotated
+
+    async def delete_one_by_id(self, *, id: int, user_id: int) -> int | None:
+        statement = (
+            delete(self.model)
+            .where(self.model.id == id, self.model.user_id == user_id)
+            .returning(self.model.id)
+        )
+        try:
+            id_deleted = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+        return id_deleted
+
+    async def delete_many_by_user_id(self, *, user_id: int) -> int:
+        statement = delete(self.model).where(self.model.user_id == user_id)
+        try:
+            result = await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+        return result.rowcount
+
+    async def delete_one_by_token_hash(self, *, token_hash: bytes) -> None:
+        statement = delete(self.model).where(self.model.token_hash == token_hash)
         try:
             await self.session.execute(statement)
         except Exception as e:
             logger.error("Database error: %s", e)
-            raise InternalException
+            raise InternalException from e
+
+    async def delete_expired_many(self, *, limit: int, grace_seconds: int) -> int:
+        # bounded batches keep each transaction short, SKIP LOCKED lets
+        # reapers on several nodes split the backlog instead of queueing
+        subquery = (
+            select(self.model.id)
+            .where(self.model.expire_in < func.now() - timedelta(seconds=grace_seconds))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        statement = delete(self.model).where(
+            self.model.id.in_(subquery.scalar_subquery())
+        )
+        try:
+            result = await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database delete error: %s", e)
+            raise InternalException from e
+
+        return result.rowcount
+
+    async def try_lock_partitions(self) -> bool:
+        # a session lock, maintenance runs outside a transaction. held until
+        # unlock_partitions, one node maintains partitions
+        statement = select(func.pg_try_advisory_lock(PARTITIONS_LOCK_KEY))
+        try:
+            locked = await self.session.scalar(statement)
+        except Exception as e:
+            logger.error("Database lock error: %s", e)
+            raise InternalException from e
+
+        return locked
+
+    async def unlock_partitions(self) -> None:
+        statement = select(func.pg_advisory_unlock(PARTITIONS_LOCK_KEY))
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database lock error: %s", e)
+            raise InternalException from e
+
+    async def get_partition_days(self) -> list[date]:
+        # by name rather than from pg_inherits, so a partition detached by a
+        # run that stopped before the drop is still found
+        statement = text(
+            "SELECT relname FROM pg_class"
+            " WHERE relkind = 'r' AND pg_table_is_visible(oid)"
+            " AND relname ~ ('^' || :table || '_p[0-9]{8}$')"
+        ).bindparams(table=self.model.__tablename__)
+        try:
+            result = await self.session.scalars(statement)
+            names = list(result.all())
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        prefix = f"{self.model.__tablename__}_p"
+        days = []
+        for name in names:
+            if name.startswith(prefix):
+                days.append(
+                    datetime.strptime(name.removeprefix(prefix), "%Y%m%d").date()
+                )
+        return sorted(days)
+
+    def _get_partition_name(self, *, day: date) -> str:
+        return f"{self.model.__tablename__}_p{day:%Y%m%d}"
+
+    async def create_partitions(self, *, days: list[date]) -> None:
+        table = self.model.__tablename__
+        # no default partition, it would rule out detaching concurrently
+        statements = []
+        for day in days:
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {self._get_partition_name(day=day)}"
+                f" PARTITION OF {table} FOR VALUES"
+                f" FROM ('{day.isoformat()} 00:00:00+00')"
+                f" TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+            )
+        try:
+            for statement in statements:
+                await self.session.execute(text(statement))
+        except Exception as e:
+            logger.error("Database partition create error: %s", e)
+            raise InternalException from e
+
+    async def detach_partition(self, *, day: date) -> None:
+        # concurrently only takes SHARE UPDATE EXCLUSIVE on the parent, so
+        # logins keep inserting. it refuses to run in a transaction block
+        table = self.model.__tablename__
+        partition = self._get_partition_name(day=day)
+        statement = text(
+            "SELECT inhdetachpending FROM pg_inherits"
+            " WHERE inhrelid = to_regclass(:partition)"
+            " AND inhparent = to_regclass(:table)"
+        ).bindparams(partition=partition, table=table)
+        try:
+            pending = (await self.session.execute(statement)).scalar_one_or_none()
+            if pending is None:
+                return
+            # an interrupted concurrent detach has to be finished instead
+            mode = "FINALIZE" if pending else "CONCURRENTLY"
+            await self.session.execute(
+                text(f"ALTER TABLE {table} DETACH PARTITION {partition} {mode}")
+            )
+        except Exception as e:
+            logger.error("Database partition detach error: %s", e)
+            raise InternalException from e
+
+    async def drop_partition(self, *, day: date) -> None:
+        # only ever run on a detached partition, the parent is not locked
+        statement = text(f"DROP TABLE IF EXISTS {self._get_partition_name(day=day)}")
+        try:
+            await self.session.execute(statement)
+        except Exception as e:
+            logger.error("Database partition drop error: %s", e)
+            raise InternalException from e
@@ -0,0 +1,78 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from logging import getLogger
+
+from sqlalchemy import Row, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.exceptions import InternalException
+from app.models.token_revocation import TokenRevocationModel
+
+logger = getLogger(__name__)
+
+TOKEN_REVOCATIONS_CHANNEL = "token_revocations"
+
+
+class BaseTokenRevocationRepository(ABC):
+    @abstractmethod
+    def __init__(self, *, session: AsyncSession):
+        pass
+
+    @abstractmethod
+    async def upsert_one(self, *, user_id: int, revoked_at: datetime) -> datetime:
+        pass
+
+    @abstractmethod
+    async def get_many_since(self, *, since: datetime) -> list[Row]:
+        pass
+
+
+class TokenRevocationRepository(BaseTokenRevocationRepository):
+    model = TokenRevocationModel
+
+    def __init__(self, *, session: AsyncSession):
+        self.session = session
+
+    async def upsert_one(self, *, user_id: int, revoked_at: datetime) -> datetime:
+        # moves the watermark forward and tells every listening worker, the
+        # notification is only delivered if the transaction commits. the
+        # time comes from the app clock that stamps iat, never from now()
+        statement = insert(self.model).values(user_id=user_id, revoked_at=revoked_at)
+        upsert = statement.on_conflict_do_update(
+            index_elements=[self.model.user_id],
+            # a node with a clock behind must not move it back
+            set_={
+                "revoked_at": func.greatest(
+                    self.model.revoked_at, statement.excluded.revoked_at
+                )
+            },
+        ).returning(self.model.revoked_at)
+        try:
+            revoked_at = await self.session.scalar(upsert)
+            await self.session.execute(
+                select(
+                    func.pg_notify(
+                        TOKEN_REVOCATIONS_CHANNEL,
+                        f"{user_id}:{revoked_at.timestamp()}",
+                    )
+                )
+            )
+        except Exception as e:
+            logger.error("Database upsert error: %s", e)
+            raise InternalException from e
+
+        return revoked_at
+
+    async def get_many_since(self, *, since: datetime) -> list[Row]:
+        statement = select(self.model.user_id, self.model.revoked_at).where(
+            self.model.revoked_at > since
+        )
+        try:
+            result = await self.session.execute(statement)
+            revocations = list(result.all())
+        except Exception as e:
+            logger.error("Database select error: %s", e)
+            raise InternalException from e
+
+        return revocations
@@ -3,13 +3,31 @@ from typing import Self
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.exceptions import InternalException
+
+from app.repositories.audio_blob import AudioBlobRepository, BaseAudioBlobRepository
 from app.repositories.audio_file import AudioFileRepository, BaseAudioFileRepository
+from app.repositories.audio_job import AudioJobRepository, BaseAudioJobRepository
+from app.repositories.audio_rendition import (
+    AudioRenditionRepository,
+    BaseAudioRenditionRepository,
+)
+from app.repositories.audio_upload import (
+    AudioUploadRepository,
+    BaseAudioUploadRepository,
+)
 from app.repositories.refresh_session import (
     BaseRefreshSessionRepository,
     RefreshSessionRepository,
 )
+from app.repositories.token_revocation import (
+    BaseTokenRevocationRepository,
+    TokenRevocationRepository,
+)
 from app.repositories.user import BaseUserRepository, UserRepository
-from app.database.db import session_factory
+from app.database.db import autocommit_session_factory, session_factory
+from app.database.replicas import replica_router
+from app.settings.config import config
 
 
 class BaseUnitOfWork(ABC):
@@ -20,6 +38,14 @@ class BaseUnitOfWork(ABC):
     async def __aexit__(self, *args) -> None:
         pass
 
+    @abstractmethod
+    def readonly(self, *, autocommit: bool | None = None) -> Self:
+        pass
+
+    @abstractmethod
+    def autocommit(self) -> Self:
+        pass
+
     @abstractmethod
     def get_user_repo(self) -> BaseUserRepository:
         pass
@@ -32,33 +58,125 @@ class BaseUnitOfWork(ABC):
     def get_audio_file_repo(self) -> BaseAudioFileRepository:
         pass
 
+    @abstractmethod
+    def get_audio_upload_repo(self) -> BaseAudioUploadRepository:
+        pass
+
+    @abstractmethod
+    def get_audio_blob_repo(self) -> BaseAudioBlobRepository:
+        pass
+
+    @abstractmethod
+    def get_audio_job_repo(self) -> BaseAudioJobRepository:
+        pass
+
+    @abstractmethod
+    def get_audio_rendition_repo(self) -> BaseAudioRenditionRepository:
+        pass
+
+    @abstractmethod
+    def get_token_revocation_repo(self) -> BaseTokenRevocationRepository:
+        pass
+
     @abstractmethod
     async def commit(self) -> None:
         pass
 
 
 class UnitOfWork(BaseUnitOfWork):
-    async def __aenter__(self) -> Self:
-        self.session: AsyncSession = session_factory()
+    # re-entrant: nested blocks join the outermost one, share its session and
+    # leave the commit to it, so services can share one instance per request
+    def __init__(self):
+        self.depth = 0
+        self.is_readonly = False
+        self.is_autocommit = False
+        self.session_readonly = False
 
-        self.user_repo = UserRepository(session=self.session)
-        self.refresh_session = RefreshSessionRepository(session=self.session)
-        self.audio_file_repo = AudioFileRepository(session=self.session)
+    async def __aenter__(self) -> Self:
+        readonly, autocommit = self.is_readonly, self.is_autocommit
+        self.is_readonly = self.is_autocommit = False
+        self.depth += 1
+        if self.depth > 1:
+            return self
+
+        # sessions only take a connection on their first statement, and
+        # repositories are built on first use
+        self.session_readonly = readonly
+        if readonly:
+            session_factory_readonly = replica_router.get_session_factory(
+                autocommit=autocommit
+            )
+            self.session: AsyncSession = session_factory_readonly()
+        elif autocommit:
+            self.session: AsyncSession = autocommit_session_factory()
+        else:
+            self.session: AsyncSession = session_factory()
+        self.repos = {}
 
         return self
 
     async def __aexit__(self, *args) -> None:
-        await self.session.rollback()
+        self.depth -= 1
+        if self.depth:
+            return
+
+        # closing releases the connection, which only sends a ROLLBACK when
+        # a transaction was begun and not committed
         await self.session.close()
 
+    def readonly(self, *, autocommit: bool | None = None) -> Self:
+        # the next block may run on a replica, so it must not write and may
+        # see data up to DB_REPLICA_MAX_LAG_SECONDS old. autocommit skips
+        # BEGIN and ROLLBACK, but each statement then sees its own snapshot
+        # and server-side cursors are unavailable. inside another block it
+        # has no effect
+        self.is_readonly = True
+        self.is_autocommit = (
+            config.DB_READONLY_AUTOCOMMIT if autocommit is None else autocommit
+        )
+        return self
+
+    def autocommit(self) -> Self:
+        # the next block runs on the primary outside a transaction, every
+        # statement commits on its own. for the few statements postgres
+        # refuses in a transaction block. inside another block it has no
+        # effect
+        self.is_autocommit = True
+        return self
+
+    def _get_repo(self, repo_class):
+        repo = self.repos.get(repo_class)
+        if repo is None:
+            repo = self.repos[repo_class] = repo_class(session=self.session)
+        return repo
+
     def get_user_repo(self) -> BaseUserRepository:
-        return self.user_repo
+        return self._get_repo(UserRepository)
 
     def get_refresh_session_repo(self) -> BaseRefreshSessionRepository:
-        return self.refresh_session
+        return self._get_repo(RefreshSessionRepository)
 
     def get_audio_file_repo(self) -> BaseAudioFileRepository:
-        return self.audio_file_repo
+        return self._get_repo(AudioFileRepository)
+
+    def get_audio_upload_repo(self) -> BaseAudioUploadRepository:
+        return self._get_repo(AudioUploadRepository)
+
+    def get_audio_blob_repo(self) -> BaseAudioBlobRepository:
+        return self._get_repo(AudioBlobRepository)
+
+    def get_audio_job_repo(self) -> BaseAudioJobRepository:
+        return self._get_repo(AudioJobRepository)
+
+    def get_audio_rendition_repo(self) -> BaseAudioRenditionRepository:
+        return self._get_repo(AudioRenditionRepository)
+
+    def get_token_revocation_repo(self) -> BaseTokenRevocationRepository:
+        return self._get_repo(TokenRevocationRepository)
 
     async def commit(self) -> None:
+        if self.session_readonly:
+            raise InternalException
+        if self.depth > 1:
+            return
         await self.session.commit()
@@ -1,14 +1,14 @@
 from abc import ABC, abstractmethod
 from logging import getLogger
 
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import delete, exists, select, tuple_, union_all, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.exceptions import InternalException
 from app.models.user import (
     UserCreateDTO,
     UserModel,
-    UserUpdateDTO,
     UserUpdateRequestDTO,
 )
 
@@ -21,7 +21,7 @@ class BaseUserRepository(ABC):
         pass
 
     @abstractmethod
-    async def create_one(self, *, user: UserCreateDTO) -> UserModel:
+    async def upsert_one_by_yandex_id(self, *, user: UserCreateDTO) -> UserModel | None:
         pass
 
     @abstractmethod
@@ -32,10 +32,6 @@ class BaseUserRepository(ABC):
     async def get_one_by_id(self, *, id: int) -> UserModel | None:
         pass
 
-    @abstractmethod
-    async def update_one_by_yandex_id(self, *, user: UserUpdateDTO) -> UserModel:
-        pass
-
     @abstractmethod
     async def update_one_by_id(self, *, user: UserUpdateRequestDTO) -> UserModel | None:
         pass
@@ -51,16 +47,41 @@ class UserRepository(BaseUserRepository):
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def create_one(self, *, user: UserCreateDTO) -> UserModel:
-        statement = insert(self.model).values(user.model_dump()).returning(self.model)
+    async def upsert_one_by_yandex_id(self, *, user: UserCreateDTO) -> UserModel | None:
+        # one statement: the insert, the update when the profile changed, or
+        # the existing row untouched, so unchanged logins leave no dead tuple
+        # python-side column defaults are not applied inside a cte
+        excluded = insert(self.model).excluded
+        upsert = (
+            insert(self.model)
+            .values(**user.model_dump(), is_superuser=False)
+            .on_conflict_do_update(
+                index_elements=[self.model.yandex_id],
+                set_={
+                    "username": excluded.username,
+                    "phone_number": excluded.phone_number,
+                },
+                where=tuple_(
+                    self.model.username, self.model.phone_number
+                ).is_distinct_from(tuple_(excluded.username, excluded.phone_number)),
+            )
+            .returning(*self.model.__table__.columns)
+            .cte("upserted")
+        )
+        unchanged = select(self.model.__table__).where(
+            self.model.yandex_id == user.yandex_id,
+            ~exists(select(upsert.c.id)),
+        )
+        statement = select(self.model).from_statement(
+            union_all(select(upsert), unchanged)
+        )
         try:
-            result = await self.session.execute(statement)
-            user_created = result.scalar_one()
+            user_upserted = await self.session.scalar(statement)
         except Exception as e:
-            logger.error("Database Error %s", e)
-            raise InternalException
+            logger.error("Database upsert error: %s", e)
+            raise InternalException from e
 
-        return user_created
+        return user_upserted
 
     async def get_one_by_yandex_id(self, *, yandex_id: str) -> UserModel | None:
         statement = select(self.model).where(self.model.yandex_id == yandex_id)
@@ -68,7 +89,7 @@ class UserRepository(BaseUserRepository):
             user = await self.session.scalar(statement)
         except Exception as e:
             logger.error("Database Error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return user
 
@@ -78,26 +99,10 @@ class UserRepository(BaseUserRepository):
             user = await self.session.scalar(statement)
         except Exception as e:
             logger.error("Database select error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return user
 
-    async def update_one_by_yandex_id(self, *, user: UserUpdateDTO) -> UserModel:
-        statement = (
-            update(self.model)
-            .where(self.model.yandex_id == user.yandex_id)
-            .values(user.model_dump(exclude={"yandex_id"}))
-            .returning(self.model)
-        )
-        try:
-            result = await self.session.execute(statement)
-            user_updated = result.scalar_one()
-        except Exception as e:
-            logger.error("Database Error: %s", e)
-            raise InternalException
-
-        return user_updated
-
     async def update_one_by_id(self, *, user: UserUpdateRequestDTO) -> UserModel | None:
         statement = (
             update(self.model)
@@ -109,7 +114,7 @@ class UserRepository(BaseUserRepository):
             user_updated = await self.session.scalar(statement)
         except Exception as e:
             logger.error("Database update error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return user_updated
 
@@ -121,6 +126,6 @@ class UserRepository(BaseUserRepository):
             id_deleted = await self.session.scalar(statement)
         except Exception as e:
             logger.error("Database error: %s", e)
-            raise InternalException
+            raise InternalException from e
 
         return id_deleted
@@ -0,0 +1,96 @@
+from logging import getLogger
+from uuid import uuid4
+
+from app.models.audio_job import AudioJobCreateDTO, AudioJobKind
+from app.repositories.uow import BaseUnitOfWork
+from app.settings.config import config
+from app.storage.base import BaseStorageBackend
+
+logger = getLogger(__name__)
+
+BLOB_JOB_KINDS: tuple[AudioJobKind, ...] = ("metadata", "peaks")
+
+
+# blobs are stored once per content hash, the backend decides the layout
+def get_blob_key(*, sha256: str) -> str:
+    return sha256
+
+
+# derived data lives next to its blob and shares its shard
+def get_peaks_key(*, sha256: str) -> str:
+    return f"{sha256}.peaks"
+
+
+def get_rendition_key(*, sha256: str, format: str, bitrate: int) -> str:
+    return f"{sha256}.{bitrate}k.{format}"
+
+
+def get_staging_key() -> str:
+    return f"staging/{uuid4().hex}"
+
+
+async def get_blob_location(
+    *, storage: BaseStorageBackend, sha256: str
+) -> tuple[str | None, str | None]:
+    # worker processes open local blobs by path and remote ones by a
+    # presigned url, exactly one of the two is returned
+    blob_key = get_blob_key(sha256=sha256)
+    path = storage.get_local_path(key=blob_key)
+    if path:
+        return path, None
+
+    url = await storage.presign(
+        key=blob_key, expires_in=config.STORAGE_PRESIGN_EXPIRE_SECONDS
+    )
+    return None, url
+
+
+async def place_blob(
+    *, storage: BaseStorageBackend, sha256: str, staging_key: str, inserted: bool
+) -> bool:
+    blob_key = get_blob_key(sha256=sha256)
+    if not inserted and await storage.stat(key=blob_key) is not None:
+        return False
+
+    await storage.move(source_key=staging_key, key=blob_key)
+    return True
+
+
+async def remove_blob(*, storage: BaseStorageBackend, sha256: str) -> None:
+    await storage.delete(key=get_blob_key(sha256=sha256))
+    await storage.delete(key=get_peaks_key(sha256=sha256))
+
+
+async def remove_unreferenced_blob(
+    *,
+    uow: BaseUnitOfWork,
+    storage: BaseStorageBackend,
+    sha256: str,
+    keys: list[str] | None = None,
+) -> None:
+    # runs once the row is gone for good, files of content that was uploaded
+    # again meanwhile are kept. a failure leaves orphaned files, never a row
+    # without its file
+    try:
+        async with uow:
+            blob_repo = uow.get_audio_blob_repo()
+            await blob_repo.lock_one(sha256=sha256)
+            if await blob_repo.get_one_by_sha256(sha256=sha256) is None:
+                await remove_blob(storage=storage, sha256=sha256)
+                for key in keys or []:
+                    await storage.delete(key=key)
+            await uow.commit()
+    except Exception:
+        logger.exception("Blob %s files left orphaned", sha256)
+
+
+async def enqueue_blob_jobs(*, uow: BaseUnitOfWork, sha256s: list[str]) -> None:
+    # newly stored content gets its processing jobs in the same transaction
+    job_repo = uow.get_audio_job_repo()
+    await job_repo.create_many(
+        jobs_info=[
+            AudioJobCreateDTO(blob_sha256=sha256, kind=kind)
+            for sha256 in sha256s
+            for kind in BLOB_JOB_KINDS
+        ]
+    )
@@ -1,55 +1,131 @@
 from abc import ABC, abstractmethod
+import asyncio
+import base64
+from collections.abc import AsyncIterator
+import csv
+from datetime import datetime
+import hashlib
+import io
+import json
 import os
+from typing import Literal
 from uuid import uuid4
 from logging import getLogger
 
 from fastapi import UploadFile
 
+from app.audio.peaks import PEAKS_INDEX_MAX_SIZE, parse_peaks_index
+from app.audio.sniff import AUDIO_FORMAT_EXTENSIONS, sniff_stream
 from app.exceptions import (
     BadMediaType,
     BadRequestException,
     ConflictException,
     InternalException,
+    NotFoundException,
+    PayloadTooLargeException,
 )
+from app.models.audio_blob import AudioBlobCreateDTO
 from app.models.audio_file import (
+    AudioFileBatchItemDTO,
+    AudioFileContentDTO,
     AudioFileCreateRequestDTO,
     AudioFileCreateResponseDTO,
+    AudioFileDeleteResponseDTO,
     AudioFileGetDTO,
+    AudioFileMetadataResponseDTO,
+    AudioFilePeaksDTO,
     AudioFileSaveLocalDTO,
+    AudioFilesBatchCreateResponseDTO,
     AudioFilesGetResponseDTO,
 )
 from app.repositories.uow import BaseUnitOfWork
+from app.services.audio_blob import (
+    enqueue_blob_jobs,
+    get_blob_key,
+    get_peaks_key,
+    get_rendition_key,
+    get_staging_key,
+    place_blob,
+    remove_unreferenced_blob,
+)
 from app.settings.config import config
-import aiofiles
+from app.storage.base import BaseStorageBackend
 
 logger = getLogger(__name__)
 
 
 class BaseAudioFileService(ABC):
     @abstractmethod
-    def __init__(self, *, uow: BaseUnitOfWork):
+    def __init__(self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend):
         pass
 
     @abstractmethod
-    async def save_local(
+    async def save_file(
         self, *, file: UploadFile, filename_custom: str, user_id: int
-    ) -> AudioFileSaveLocalDTO:
+    ) -> AudioFileCreateResponseDTO:
         pass
 
     @abstractmethod
-    async def save_db(
-        self, *, file_info: AudioFileCreateRequestDTO
+    async def save_stream(
+        self,
+        *,
+        stream: AsyncIterator[bytes],
+        filename: str,
+        content_type: str,
+        filename_custom: str,
+        user_id: int,
+        content_length: int | None = None,
+        checksum_sha256: str | None = None,
     ) -> AudioFileCreateResponseDTO:
         pass
 
     @abstractmethod
-    async def get_all_by_user_id(self, *, user_id) -> AudioFilesGetResponseDTO:
+    async def save_batch(
+        self, *, files: list[UploadFile], filenames_custom: list[str], user_id: int
+    ) -> AudioFilesBatchCreateResponseDTO:
+        pass
+
+    @abstractmethod
+    async def get_page_by_user_id(
+        self,
+        *,
+        user_id: int,
+        limit: int,
+        cursor: str | None = None,
+        filename_prefix: str | None = None,
+        order: Literal["asc", "desc"] = "desc",
+    ) -> AudioFilesGetResponseDTO:
+        pass
+
+    @abstractmethod
+    def export_by_user_id(
+        self, *, user_id: int, format: Literal["ndjson", "csv"]
+    ) -> AsyncIterator[str]:
+        pass
+
+    @abstractmethod
+    async def get_one_by_id(self, *, id: int) -> AudioFileContentDTO:
+        pass
+
+    @abstractmethod
+    async def get_metadata_by_id(self, *, id: int) -> AudioFileMetadataResponseDTO:
+        pass
+
+    @abstractmethod
+    async def get_peaks(self, *, sha256: str, resolution: int) -> AudioFilePeaksDTO:
+        pass
+
+    @abstractmethod
+    async def delete_one_by_id(
+        self, *, id: int, user_id: int | None
+    ) -> AudioFileDeleteResponseDTO:
         pass
 
 
 class AudioFileService(BaseAudioFileService):
-    def __init__(self, *, uow: BaseUnitOfWork):
+    def __init__(self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend):
         self.uow = uow
+        self.storage = storage
 
     @staticmethod
     def _get_file_extension(*, filename: str) -> str:
@@ -63,68 +139,558 @@ class AudioFileService(BaseAudioFileService):
         ) or file_extension not in config.ALLOWED_AUDIO_EXTENSIONS:
             raise BadMediaType
 
-    async def save_local(
-        self, *, file: UploadFile, filename_custom: str, user_id: int
+    @staticmethod
+    async def _iter_upload_file(*, file: UploadFile) -> AsyncIterator[bytes]:
+        while content := await file.read(1024 * 1024):
+            yield content
+
+    async def _write_stream(
+        self,
+        *,
+        stream: AsyncIterator[bytes],
+        checksum_sha256: str | None = None,
     ) -> AudioFileSaveLocalDTO:
-        async with self.uow:
-            audio_repo = self.uow.get_audio_file_repo()
-            audio_file = await audio_repo.get_one_by_user_id_and_filename(
-                user_id=user_id, filename_original=filename_custom
-            )
-            if audio_file:
-                raise ConflictException
+        # the first bytes decide the format before anything is written, the
+        # rest of the body is hashed and size-checked while it is written
+        audio_format, stream = await sniff_stream(stream)
+        if audio_format is None:
+            raise BadMediaType
 
-        filename = file.filename
-        if not filename:
-            raise BadRequestException
+        staging_key = get_staging_key()
+        file_hash = hashlib.sha256()
+        file_size = 0
+        try:
+            async with await self.storage.open_write(key=staging_key) as writer:
+                async for content in stream:
+                    file_size += len(content)
+                    if file_size > config.AUDIO_MAX_SIZE:
+                        raise PayloadTooLargeException
 
-        file_content_type = file.content_type
-        file_extension = self._get_file_extension(filename=filename)
-        self._validate_file(
-            file_extension=file_extension, file_content_type=file_content_type
-        )
+                    file_hash.update(content)
+                    await writer.write(content)
 
-        filename_unique = f"{uuid4()}{file_extension}"
-        filepath = config.AUDIO_STORAGE_PATH_ABSOLUTE / filename_unique
+                file_sha256 = file_hash.hexdigest()
+                if checksum_sha256 and checksum_sha256.lower() != file_sha256:
+                    raise BadRequestException
+        except (PayloadTooLargeException, BadRequestException):
+            raise
+        except Exception as e:
+            logger.error("File save failed: %s", e)
+            raise InternalException from e
+
+        return AudioFileSaveLocalDTO(
+            staging_key=staging_key,
+            filename_unique=f"{uuid4()}{AUDIO_FORMAT_EXTENSIONS[audio_format]}",
+            size=file_size,
+            sha256=file_sha256,
+            format=audio_format,
+        )
 
+    async def _save_db(
+        self, *, localfile: AudioFileSaveLocalDTO, user_id: int, filename_original: str
+    ) -> AudioFileCreateResponseDTO:
+        # the unique (user_id, filename_original) index decides conflicts, so
+        # the whole upload needs a single transaction after the write
+        placed = False
         try:
-            async with aiofiles.open(filepath, "wb") as localfile:
-                while content := await file.read(1024 * 1024):
-                    await localfile.write(content)
+            async with self.uow:
+                blob_repo = self.uow.get_audio_blob_repo()
+                inserted = await blob_repo.acquire_one(
+                    blob_info=AudioBlobCreateDTO(
+                        sha256=localfile.sha256,
+                        size=localfile.size,
+                        format=localfile.format,
+                    )
+                )
+
+                audio_repo = self.uow.get_audio_file_repo()
+                audio_file = await audio_repo.create_one(
+                    audio_file_info=AudioFileCreateRequestDTO(
+                        user_id=user_id,
+                        filename_original=filename_original,
+                        filename_unique=localfile.filename_unique,
+                        blob_sha256=localfile.sha256,
+                    )
+                )
+                if not audio_file:
+                    raise ConflictException
+                if inserted:
+                    await enqueue_blob_jobs(uow=self.uow, sha256s=[localfile.sha256])
+
+                # identical content is already stored, the staged copy is dropped
+                placed = await place_blob(
+                    storage=self.storage,
+                    sha256=localfile.sha256,
+                    staging_key=localfile.staging_key,
+                    inserted=inserted,
+                )
+                await self.uow.commit()
         except Exception as e:
+            if placed:
+                await remove_unreferenced_blob(
+                    uow=self.uow, storage=self.storage, sha256=localfile.sha256
+                )
+            else:
+                await self.storage.delete(key=localfile.staging_key)
+
+            if isinstance(e, (InternalException, ConflictException)):
+                raise
             logger.error("File save failed: %s", e)
-            if filepath.exists():
-                os.remove(filepath)
+            raise InternalException from e
 
-            raise InternalException
+        if not placed:
+            await self.storage.delete(key=localfile.staging_key)
+
+        return AudioFileCreateResponseDTO(
+            id=audio_file.id,
+            filename_original=audio_file.filename_original,
+            filename_unique=audio_file.filename_unique,
+            size=localfile.size,
+            sha256=localfile.sha256,
+            format=localfile.format,
+        )
+
+    async def save_file(
+        self, *, file: UploadFile, filename_custom: str, user_id: int
+    ) -> AudioFileCreateResponseDTO:
+        try:
+            filename = file.filename
+            if not filename:
+                raise BadRequestException
+
+            file_content_type = file.content_type
+            file_extension = self._get_file_extension(filename=filename)
+            self._validate_file(
+                file_extension=file_extension, file_content_type=file_content_type
+            )
+
+            localfile = await self._write_stream(
+                stream=self._iter_upload_file(file=file)
+            )
         finally:
             await file.close()
 
-        return AudioFileSaveLocalDTO(
-            filepath=str(filepath), filename_unique=filename_unique
+        return await self._save_db(
+            localfile=localfile,
+            user_id=user_id,
+            filename_original=filename_custom,
         )
 
-    async def save_db(
-        self, *, file_info: AudioFileCreateRequestDTO
+    async def save_stream(
+        self,
+        *,
+        stream: AsyncIterator[bytes],
+        filename: str,
+        content_type: str,
+        filename_custom: str,
+        user_id: int,
+        content_length: int | None = None,
+        checksum_sha256: str | None = None,
     ) -> AudioFileCreateResponseDTO:
-        async with self.uow:
-            audio_repo = self.uow.get_audio_file_repo()
-            audio_file = await audio_repo.create_one(audio_file_info=file_info)
-            await self.uow.commit()
+        file_extension = self._get_file_extension(filename=filename)
+        self._validate_file(
+            file_extension=file_extension, file_content_type=content_type
+        )
+        if content_length is not None and content_length > config.AUDIO_MAX_SIZE:
+            raise PayloadTooLargeException
 
-        return AudioFileCreateResponseDTO.model_validate(
-            audio_file, from_attributes=True
+        localfile = await self._write_stream(
+            stream=stream, checksum_sha256=checksum_sha256
         )
 
-    async def get_all_by_user_id(self, *, user_id) -> AudioFilesGetResponseDTO:
-        async with self.uow:
+        return await self._save_db(
+            localfile=localfile,
+            user_id=user_id,
+            filename_original=filename_custom,
+        )
+
+    async def _write_batch_item(
+        self,
+        *,
+        file: UploadFile,
+        item: AudioFileBatchItemDTO,
+        semaphore: asyncio.Semaphore,
+    ) -> AudioFileSaveLocalDTO | None:
+        async with semaphore:
+            try:
+                return await self._write_stream(
+                    stream=self._iter_upload_file(file=file)
+                )
+            except BadMediaType:
+                item.status = "unsupported_media_type"
+                return None
+            except PayloadTooLargeException:
+                item.status = "too_large"
+                return None
+            except InternalException:
+                item.status = "error"
+                return None
+
+    async def save_batch(
+        self, *, files: list[UploadFile], filenames_custom: list[str], user_id: int
+    ) -> AudioFilesBatchCreateResponseDTO:
+        items = [
+            AudioFileBatchItemDTO(custom_filename=filename_custom, status="created")
+            for filename_custom in filenames_custom
+        ]
+        try:
+            async with self.uow:
+                audio_repo = self.uow.get_audio_file_repo()
+                filenames_taken = await audio_repo.get_filenames_by_user_id(
+                    user_id=user_id, filenames_original=list(set(filenames_custom))
+                )
+
+            # repeated names inside the batch conflict with their first occurrence
+            writes = []
+            for file, item in zip(files, items):
+                if item.custom_filename in filenames_taken:
+                    item.status = "conflict"
+                    continue
+                filenames_taken.add(item.custom_filename)
+
+                if not file.filename:
+                    item.status = "bad_request"
+                    continue
+
+                file_extension = self._get_file_extension(filename=file.filename)
+                try:
+                    self._validate_file(
+                        file_extension=file_extension,
+                        file_content_type=file.content_type,
+                    )
+                except BadMediaType:
+                    item.status = "unsupported_media_type"
+                    continue
+
+                writes.append((file, item))
+
+            semaphore = asyncio.Semaphore(config.AUDIO_BATCH_CONCURRENCY)
+            localfiles = await asyncio.gather(
+                *(
+                    self._write_batch_item(
+                        file=file,
+                        item=item,
+                        semaphore=semaphore,
+                    )
+                    for file, item in writes
+                )
+            )
+        finally:
+            for file in files:
+                await file.close()
+
+        saved = [
+            (item, localfile)
+            for (_, item), localfile in zip(writes, localfiles)
+            if localfile is not None
+        ]
+        if not saved:
+            return AudioFilesBatchCreateResponseDTO(items=items)
+
+        # one staged copy per distinct content becomes the blob, the rest are
+        # dropped once the transaction is settled
+        staging_keys = {}
+        for _, localfile in saved:
+            staging_keys.setdefault(localfile.sha256, localfile.staging_key)
+        placed: list[str] = []
+        try:
+            async with self.uow:
+                blob_repo = self.uow.get_audio_blob_repo()
+                inserted = await blob_repo.acquire_many(
+                    blobs_info=[
+                        AudioBlobCreateDTO(
+                            sha256=localfile.sha256,
+                            size=localfile.size,
+                            format=localfile.format,
+                        )
+                        for _, localfile in saved
+                    ]
+                )
+
+                audio_repo = self.uow.get_audio_file_repo()
+                audio_files = await audio_repo.create_many(
+                    audio_files_info=[
+                        AudioFileCreateRequestDTO(
+                            user_id=user_id,
+                            filename_original=item.custom_filename,
+                            filename_unique=localfile.filename_unique,
+                            blob_sha256=localfile.sha256,
+                        )
+                        for item, localfile in saved
+                    ]
+                )
+
+                # names taken by a concurrent upload since the check above come
+                # back without a row, their blob references are given back
+                filenames_created = {
+                    audio_file.filename_unique for audio_file in audio_files
+                }
+                for item, localfile in saved:
+                    if localfile.filename_unique not in filenames_created:
+                        item.status = "conflict"
+                        await blob_repo.release_one(sha256=localfile.sha256)
+
+                sha256s_created = {
+                    localfile.sha256
+                    for item, localfile in saved
+                    if item.status == "created"
+                }
+                await enqueue_blob_jobs(
+                    uow=self.uow, sha256s=sorted(sha256s_created & inserted)
+                )
+
+                for sha256, staging_key in staging_keys.items():
+                    if sha256 not in sha256s_created:
+                        continue
+                    if await place_blob(
+                        storage=self.storage,
+                        sha256=sha256,
+                        staging_key=staging_key,
+                        inserted=sha256 in inserted,
+                    ):
+                        placed.append(sha256)
+                await self.uow.commit()
+        except Exception as e:
+            for sha256 in placed:
+                await remove_unreferenced_blob(
+                    uow=self.uow, storage=self.storage, sha256=sha256
+                )
+            await self._delete_staged(
+                saved=saved, staging_keys=staging_keys, placed=placed
+            )
+
+            if isinstance(e, InternalException):
+                raise
+            logger.error("File batch save failed: %s", e)
+            raise InternalException from e
+
+        await self._delete_staged(saved=saved, staging_keys=staging_keys, placed=placed)
+
+        audio_files_by_name = {
+            audio_file.filename_unique: audio_file for audio_file in audio_files
+        }
+        for item, localfile in saved:
+            audio_file = audio_files_by_name.get(localfile.filename_unique)
+            if not audio_file:
+                continue
+            item.file = AudioFileCreateResponseDTO(
+                id=audio_file.id,
+                filename_original=audio_file.filename_original,
+                filename_unique=audio_file.filename_unique,
+                size=localfile.size,
+                sha256=localfile.sha256,
+                format=localfile.format,
+            )
+
+        return AudioFilesBatchCreateResponseDTO(items=items)
+
+    async def _delete_staged(
+        self,
+        *,
+        saved: list[tuple[AudioFileBatchItemDTO, AudioFileSaveLocalDTO]],
+        staging_keys: dict[str, str],
+        placed: list[str],
+    ):
+        keys_moved = {staging_keys[sha256] for sha256 in placed}
+        for _, localfile in saved:
+            if localfile.staging_key not in keys_moved:
+                await self.storage.delete(key=localfile.staging_key)
+
+    @staticmethod
+    def _encode_cursor(*, audio_file: AudioFileGetDTO) -> str:
+        cursor = json.dumps([audio_file.created_at.isoformat(), audio_file.id])
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(*, cursor: str) -> tuple[datetime, int]:
+        try:
+            created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(created_at), int(id)
+        except (ValueError, TypeError):
+            raise BadRequestException
+
+    async def get_page_by_user_id(
+        self,
+        *,
+        user_id: int,
+        limit: int,
+        cursor: str | None = None,
+        filename_prefix: str | None = None,
+        order: Literal["asc", "desc"] = "desc",
+    ) -> AudioFilesGetResponseDTO:
+        cursor_decoded = self._decode_cursor(cursor=cursor) if cursor else None
+
+        # one extra row tells whether another page follows
+        async with self.uow.readonly():
             audio_file_repo = self.uow.get_audio_file_repo()
-            audio_files = await audio_file_repo.get_all_by_user_id(user_id=user_id)
+            audio_files = await audio_file_repo.get_page_by_user_id(
+                user_id=user_id,
+                limit=limit + 1,
+                cursor=cursor_decoded,
+                filename_prefix=filename_prefix,
+                order=order,
+            )
 
         audio_files_response: list[AudioFileGetDTO] = []
-        for audio_file in audio_files:
+        for audio_file in audio_files[:limit]:
             audio_files_response.append(
                 AudioFileGetDTO.model_validate(audio_file, from_attributes=True)
             )
 
-        return AudioFilesGetResponseDTO(user_id=user_id, files=audio_files_response)
+        next_cursor = None
+        if len(audio_files) > limit:
+            next_cursor = self._encode_cursor(audio_file=audio_files_response[-1])
+
+        return AudioFilesGetResponseDTO(
+            user_id=user_id, files=audio_files_response, next_cursor=next_cursor
+        )
+
+    async def export_by_user_id(
+        self, *, user_id: int, format: Literal["ndjson", "csv"]
+    ) -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(AudioFileGetDTO.model_fields)
+            yield buffer.getvalue()
+
+        # server-side cursors need a transaction
+        async with self.uow.readonly(autocommit=False):
+            audio_file_repo = self.uow.get_audio_file_repo()
+            async for row in audio_file_repo.stream_all_by_user_id(
+                user_id=user_id, batch_size=config.AUDIO_EXPORT_BATCH_SIZE
+            ):
+                audio_file = AudioFileGetDTO.model_validate(row, from_attributes=True)
+                if format == "ndjson":
+                    yield f"{audio_file.model_dump_json()}\n"
+                    continue
+
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(audio_file.model_dump(mode="json").values())
+                yield buffer.getvalue()
+
+    async def get_one_by_id(self, *, id: int) -> AudioFileContentDTO:
+        async with self.uow:
+            audio_file_repo = self.uow.get_audio_file_repo()
+            audio_file = await audio_file_repo.get_one_by_id(id=id)
+
+        if not audio_file:
+            raise NotFoundException
+
+        # local backends are served from disk, remote ones through a
+        # presigned url that handles range requests itself
+        blob_key = get_blob_key(sha256=audio_file.blob_sha256)
+        filepath = self.storage.get_local_path(key=blob_key)
+        url = None
+        if filepath is None:
+            url = await self.storage.presign(
+                key=blob_key, expires_in=config.STORAGE_PRESIGN_EXPIRE_SECONDS
+            )
+
+        return AudioFileContentDTO(
+            id=audio_file.id,
+            user_id=audio_file.user_id,
+            filepath=filepath,
+            url=url,
+            filename_original=audio_file.filename_original,
+            filename_unique=audio_file.filename_unique,
+            sha256=audio_file.blob_sha256,
+        )
+
+    async def get_metadata_by_id(self, *, id: int) -> AudioFileMetadataResponseDTO:
+        async with self.uow.readonly():
+            audio_file_repo = self.uow.get_audio_file_repo()
+            audio_file = await audio_file_repo.get_one_by_id(id=id)
+            if not audio_file:
+                raise NotFoundException
+
+            blob_repo = self.uow.get_audio_blob_repo()
+            blob = await blob_repo.get_one_by_sha256(sha256=audio_file.blob_sha256)
+            # a blob removed while the file row was read
+            if not blob:
+                raise NotFoundException
+
+        return AudioFileMetadataResponseDTO(
+            id=audio_file.id,
+            user_id=audio_file.user_id,
+            sha256=blob.sha256,
+            size=blob.size,
+            ready=blob.duration is not None,
+            format=blob.format,
+            codec=blob.codec,
+            duration=blob.duration,
+            bitrate=blob.bitrate,
+            sample_rate=blob.sample_rate,
+            channels=blob.channels,
+        )
+
+    async def _read_range(self, *, key: str, start: int, end: int) -> bytes:
+        return b"".join(
+            [
+                content
+                async for content in self.storage.open_read_range(
+                    key=key, start=start, end=end
+                )
+            ]
+        )
+
+    async def get_peaks(self, *, sha256: str, resolution: int) -> AudioFilePeaksDTO:
+        # only the index and the requested level are read from storage
+        key = get_peaks_key(sha256=sha256)
+        try:
+            if await self.storage.stat(key=key) is None:
+                raise NotFoundException
+
+            index = await self._read_range(key=key, start=0, end=PEAKS_INDEX_MAX_SIZE)
+            sample_rate, levels = parse_peaks_index(index)
+            if resolution not in levels:
+                raise BadRequestException
+
+            offset, count = levels[resolution]
+            data = await self._read_range(key=key, start=offset, end=offset + count * 2)
+        except (NotFoundException, BadRequestException):
+            raise
+        except Exception as e:
+            logger.error("Peaks read failed: %s", e)
+            raise InternalException from e
+
+        return AudioFilePeaksDTO(
+            sample_rate=sample_rate, resolution=resolution, count=count, data=data
+        )
+
+    async def delete_one_by_id(
+        self, *, id: int, user_id: int | None
+    ) -> AudioFileDeleteResponseDTO:
+        async with self.uow:
+            audio_repo = self.uow.get_audio_file_repo()
+            blob_sha256 = await audio_repo.delete_one_by_id(id=id, user_id=user_id)
+            if not blob_sha256:
+                raise NotFoundException
+
+            # rendition rows cascade with the blob, their keys are read first
+            rendition_repo = self.uow.get_audio_rendition_repo()
+            renditions = await rendition_repo.get_many_by_blob_sha256(
+                blob_sha256=blob_sha256
+            )
+            blob_repo = self.uow.get_audio_blob_repo()
+            released = await blob_repo.release_one(sha256=blob_sha256)
+            await self.uow.commit()
+
+        # files go only once the release is committed
+        if released:
+            await remove_unreferenced_blob(
+                uow=self.uow,
+                storage=self.storage,
+                sha256=blob_sha256,
+                keys=[
+                    get_rendition_key(
+                        sha256=blob_sha256,
+                        format=rendition.format,
+                        bitrate=rendition.bitrate,
+                    )
+                    for rendition in renditions
+                ],
+            )
+
+        return AudioFileDeleteResponseDTO(id=id)
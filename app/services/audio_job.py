@@ -0,0 +1,122 @@
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from functools import partial
+from logging import getLogger
+
+from app.audio.metadata import AudioMetadataError, extract_metadata
+from app.audio.peaks import AudioPeaksError, compute_peaks
+from app.models.audio_blob import AudioMetadataDTO
+from app.models.audio_job import AudioJobModel
+from app.repositories.uow import BaseUnitOfWork
+from app.services.audio_blob import get_blob_location, get_peaks_key
+from app.settings.config import config
+from app.storage.base import BaseStorageBackend
+
+logger = getLogger(__name__)
+
+
+class BaseAudioJobService(ABC):
+    @abstractmethod
+    def __init__(
+        self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend, executor: Executor
+    ):
+        pass
+
+    @abstractmethod
+    async def run_once(self) -> int:
+        pass
+
+
+class AudioJobService(BaseAudioJobService):
+    def __init__(
+        self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend, executor: Executor
+    ):
+        self.uow = uow
+        self.storage = storage
+        self.executor = executor
+
+    async def _process_job(self, *, job: AudioJobModel) -> AudioMetadataDTO | None:
+        # heavy work runs in the process pool, metadata is returned to be
+        # stored with the batch while peaks are written next to the blob
+        path, url = await get_blob_location(
+            storage=self.storage, sha256=job.blob_sha256
+        )
+        loop = asyncio.get_running_loop()
+        if job.kind == "metadata":
+            return await loop.run_in_executor(
+                self.executor, partial(extract_metadata, path=path, url=url)
+            )
+
+        peaks = await loop.run_in_executor(
+            self.executor,
+            partial(
+                compute_peaks,
+                path=path,
+                url=url,
+                sample_rate=config.AUDIO_PEAKS_SAMPLE_RATE,
+                resolutions=config.AUDIO_PEAKS_RESOLUTIONS,
+            ),
+        )
+        key = get_peaks_key(sha256=job.blob_sha256)
+        async with await self.storage.open_write(key=key) as writer:
+            await writer.write(peaks)
+        return None
+
+    @staticmethod
+    def _get_retry_in_seconds(
+        *, job: AudioJobModel, error: BaseException
+    ) -> int | None:
+        if isinstance(error, (AudioMetadataError, AudioPeaksError)):
+            return None
+        if job.attempts >= config.AUDIO_JOB_MAX_ATTEMPTS:
+            return None
+
+        return min(config.AUDIO_JOB_RETRY_SECONDS * 2 ** (job.attempts - 1), 3600)
+
+    async def run_once(self) -> int:
+        async with self.uow:
+            job_repo = self.uow.get_audio_job_repo()
+            jobs = await job_repo.claim_many(
+                limit=config.AUDIO_JOB_BATCH_SIZE,
+                lease_seconds=config.AUDIO_JOB_LEASE_SECONDS,
+            )
+            await self.uow.commit()
+
+        if not jobs:
+            return 0
+
+        # results are stored in one transaction
+        results = await asyncio.gather(
+            *(self._process_job(job=job) for job in jobs), return_exceptions=True
+        )
+
+        async with self.uow:
+            job_repo = self.uow.get_audio_job_repo()
+            blob_repo = self.uow.get_audio_blob_repo()
+            for job, result in zip(jobs, results):
+                if isinstance(result, BaseException):
+                    logger.warning(
+                        "Audio job %s for %s failed: %s",
+                        job.id,
+                        job.blob_sha256,
+                        result,
+                    )
+                    await job_repo.fail_one_by_id(
+                        id=job.id,
+                        error=str(result),
+                        retry_in_seconds=self._get_retry_in_seconds(
+                            job=job, error=result
+                        ),
+                    )
+                    continue
+
+                if result is not None:
+                    await blob_repo.update_metadata_by_sha256(
+                        sha256=job.blob_sha256, metadata=result
+                    )
+                await job_repo.complete_one_by_id(id=job.id)
+
+            await self.uow.commit()
+
+        return len(jobs)
@@ -0,0 +1,175 @@
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from functools import partial
+from logging import getLogger
+from uuid import uuid4
+
+from app.audio.transcode import RENDITION_FORMATS, transcode
+from app.exceptions import InternalException
+from app.models.audio_rendition import (
+    AudioRenditionContentDTO,
+    AudioRenditionCreateDTO,
+)
+from app.repositories.uow import BaseUnitOfWork, UnitOfWork
+from app.services.audio_blob import get_blob_location, get_rendition_key
+from app.settings.config import config
+from app.storage.base import BaseStorageBackend
+
+logger = getLogger(__name__)
+
+# generations in flight in this process, keyed by storage key, so concurrent
+# first requests for the same rendition share a single encode
+renditions_in_flight: dict[str, asyncio.Task] = {}
+
+
+class BaseAudioRenditionService(ABC):
+    @abstractmethod
+    def __init__(
+        self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend, executor: Executor
+    ):
+        pass
+
+    @abstractmethod
+    async def get_rendition(
+        self, *, sha256: str, format: str, bitrate: int
+    ) -> AudioRenditionContentDTO:
+        pass
+
+
+class AudioRenditionService(BaseAudioRenditionService):
+    def __init__(
+        self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend, executor: Executor
+    ):
+        self.uow = uow
+        self.storage = storage
+        self.executor = executor
+
+    async def _evict(self) -> None:
+        evicted = []
+        async with self.uow:
+            rendition_repo = self.uow.get_audio_rendition_repo()
+            excess = (
+                await rendition_repo.get_total_size()
+                - config.AUDIO_RENDITION_CACHE_MAX_SIZE
+            )
+            if excess <= 0:
+                return
+
+            renditions = await rendition_repo.get_least_recent_many(
+                limit=config.AUDIO_RENDITION_EVICT_BATCH_SIZE
+            )
+            for rendition in renditions:
+                if excess <= 0:
+                    break
+                evicted.append(rendition)
+                excess -= rendition.size
+
+            await rendition_repo.delete_many(renditions=evicted)
+            await self.uow.commit()
+
+        for rendition in evicted:
+            await self.storage.delete(
+                key=get_rendition_key(
+                    sha256=rendition.blob_sha256,
+                    format=rendition.format,
+                    bitrate=rendition.bitrate,
+                )
+            )
+
+    async def _generate(self, *, sha256: str, format: str, bitrate: int) -> None:
+        key = get_rendition_key(sha256=sha256, format=format, bitrate=bitrate)
+        path, url = await get_blob_location(storage=self.storage, sha256=sha256)
+        # ffmpeg needs a seekable local file, the backend takes it over
+        target_path = str(
+            config.AUDIO_UPLOADS_PATH_ABSOLUTE
+            / f"rendition-{uuid4().hex}{RENDITION_FORMATS[format]['extension']}"
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(
+                self.executor,
+                partial(
+                    transcode,
+                    path=path,
+                    url=url,
+                    target_path=target_path,
+                    format=format,
+                    bitrate=bitrate,
+                ),
+            )
+            await self.storage.move_file(key=key, path=target_path)
+        except Exception as e:
+            logger.error("Rendition %s failed: %s", key, e)
+            raise InternalException from e
+
+        try:
+            async with self.uow:
+                rendition_repo = self.uow.get_audio_rendition_repo()
+                await rendition_repo.upsert_one(
+                    rendition_info=AudioRenditionCreateDTO(
+                        blob_sha256=sha256, format=format, bitrate=bitrate, size=size
+                    )
+                )
+                await self.uow.commit()
+        except InternalException:
+            await self.storage.delete(key=key)
+            raise
+
+        await self._evict()
+
+    async def _generate_once(self, *, sha256: str, format: str, bitrate: int) -> None:
+        key = get_rendition_key(sha256=sha256, format=format, bitrate=bitrate)
+        task = renditions_in_flight.get(key)
+        if task is None:
+            # the task outlives this request and is awaited by others, so it
+            # gets a unit of work of its own instead of the request's
+            generator = AudioRenditionService(
+                uow=UnitOfWork(), storage=self.storage, executor=self.executor
+            )
+            task = asyncio.create_task(
+                generator._generate(sha256=sha256, format=format, bitrate=bitrate)
+            )
+            renditions_in_flight[key] = task
+            task.add_done_callback(lambda _: renditions_in_flight.pop(key, None))
+
+        # a client going away must not cancel an encode others are waiting on
+        await asyncio.shield(task)
+
+    async def get_rendition(
+        self, *, sha256: str, format: str, bitrate: int
+    ) -> AudioRenditionContentDTO:
+        async with self.uow:
+            rendition_repo = self.uow.get_audio_rendition_repo()
+            rendition = await rendition_repo.get_one(
+                blob_sha256=sha256, format=format, bitrate=bitrate
+            )
+            if rendition:
+                await rendition_repo.touch_one(
+                    blob_sha256=sha256,
+                    format=format,
+                    bitrate=bitrate,
+                    interval_seconds=config.AUDIO_RENDITION_TOUCH_SECONDS,
+                )
+                await self.uow.commit()
+
+        if not rendition:
+            await self._generate_once(sha256=sha256, format=format, bitrate=bitrate)
+
+        key = get_rendition_key(sha256=sha256, format=format, bitrate=bitrate)
+        filepath = self.storage.get_local_path(key=key)
+        url = None
+        if filepath is None:
+            url = await self.storage.presign(
+                key=key, expires_in=config.STORAGE_PRESIGN_EXPIRE_SECONDS
+            )
+
+        return AudioRenditionContentDTO(
+            sha256=sha256,
+            format=format,
+            bitrate=bitrate,
+            filepath=filepath,
+            url=url,
+            extension=RENDITION_FORMATS[format]["extension"],
+            media_type=RENDITION_FORMATS[format]["media_type"],
+        )
@@ -0,0 +1,392 @@
+import hashlib
+import os
+import time
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+from logging import getLogger
+from uuid import uuid4
+
+from starlette.requests import ClientDisconnect
+
+from app.audio.sniff import (
+    AUDIO_FORMAT_EXTENSIONS,
+    SNIFF_SIZE,
+    sniff_format,
+    sniff_stream,
+)
+from app.exceptions import (
+    BadMediaType,
+    BadRequestException,
+    ConflictException,
+    InternalException,
+    NotFoundException,
+    PayloadTooLargeException,
+)
+from app.models.audio_blob import AudioBlobCreateDTO
+from app.models.audio_file import AudioFileCreateRequestDTO, AudioFileCreateResponseDTO
+from app.models.audio_upload import (
+    AudioUploadCreateDTO,
+    AudioUploadCreateRequestDTO,
+    AudioUploadModel,
+    AudioUploadResponseDTO,
+)
+from app.repositories.uow import BaseUnitOfWork
+from app.services.audio_blob import (
+    enqueue_blob_jobs,
+    get_blob_key,
+    remove_unreferenced_blob,
+)
+from app.settings.config import config
+from app.storage.base import BaseStorageBackend
+
+logger = getLogger(__name__)
+
+
+class BaseAudioUploadService(ABC):
+    @abstractmethod
+    def __init__(self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend):
+        pass
+
+    @abstractmethod
+    async def create_upload(
+        self, *, upload_info: AudioUploadCreateRequestDTO, user_id: int
+    ) -> AudioUploadResponseDTO:
+        pass
+
+    @abstractmethod
+    async def get_upload(self, *, id: str, user_id: int) -> AudioUploadResponseDTO:
+        pass
+
+    @abstractmethod
+    async def append_chunk(
+        self, *, id: str, user_id: int, offset: int, stream: AsyncIterator[bytes]
+    ) -> int:
+        pass
+
+    @abstractmethod
+    async def finalize_upload(
+        self, *, id: str, user_id: int
+    ) -> AudioFileCreateResponseDTO:
+        pass
+
+    @abstractmethod
+    async def delete_expired(self) -> int:
+        pass
+
+
+class AudioUploadService(BaseAudioUploadService):
+    def __init__(self, *, uow: BaseUnitOfWork, storage: BaseStorageBackend):
+        self.uow = uow
+        self.storage = storage
+
+    @staticmethod
+    def _get_upload_key(*, id: str) -> str:
+        return f"staging/{id}"
+
+    @staticmethod
+    def _check_upload(
+        *, upload: AudioUploadModel | None, user_id: int
+    ) -> AudioUploadModel:
+        if (
+            not upload
+            or upload.user_id != user_id
+            or upload.expire_in < datetime.now(tz=UTC)
+        ):
+            raise NotFoundException
+
+        return upload
+
+    async def _hash_object(self, *, key: str) -> tuple[str, bytes, int]:
+        file_hash = hashlib.sha256()
+        header = b""
+        size = 0
+        async for content in self.storage.open_read_range(key=key):
+            if len(header) < SNIFF_SIZE:
+                header += content[: SNIFF_SIZE - len(header)]
+            file_hash.update(content)
+            size += len(content)
+
+        return file_hash.hexdigest(), header, size
+
+    @staticmethod
+    async def _limit_stream(
+        *, id: str, stream: AsyncIterator[bytes], position: int, length: int
+    ) -> AsyncIterator[bytes]:
+        # a client going away ends the chunk, whatever arrived is kept
+        try:
+            async for chunk in stream:
+                if position + len(chunk) > length:
+                    raise PayloadTooLargeException
+
+                position += len(chunk)
+                yield chunk
+        except ClientDisconnect:
+            logger.info("Upload %s interrupted at offset %s", id, position)
+
+    async def _hold_lease(
+        self, *, id: str, lease_token: str, stream: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        # a chunk slower than the lease renews it between reads, each renewal
+        # is its own short transaction
+        renew_at = time.monotonic() + config.AUDIO_UPLOAD_LEASE_SECONDS / 2
+        async for chunk in stream:
+            if time.monotonic() >= renew_at:
+                async with self.uow:
+                    upload_repo = self.uow.get_audio_upload_repo()
+                    renewed = await upload_repo.renew_lease_by_id(
+                        id=id,
+                        lease_token=lease_token,
+                        lease_seconds=config.AUDIO_UPLOAD_LEASE_SECONDS,
+                    )
+                    await self.uow.commit()
+                if not renewed:
+                    raise ConflictException
+                renew_at = time.monotonic() + config.AUDIO_UPLOAD_LEASE_SECONDS / 2
+
+            yield chunk
+
+    async def _release_lease(self, *, id: str, lease_token: str) -> None:
+        async with self.uow:
+            upload_repo = self.uow.get_audio_upload_repo()
+            await upload_repo.release_lease_by_id(id=id, lease_token=lease_token)
+            await self.uow.commit()
+
+    async def _discard_upload(self, *, id: str) -> None:
+        # staged content that can never be finalized, the client starts over
+        async with self.uow:
+            upload_repo = self.uow.get_audio_upload_repo()
+            await upload_repo.delete_one_by_id(id=id)
+            await self.uow.commit()
+
+        await self.storage.discard(key=self._get_upload_key(id=id))
+
+    async def create_upload(
+        self, *, upload_info: AudioUploadCreateRequestDTO, user_id: int
+    ) -> AudioUploadResponseDTO:
+        file_extension = os.path.splitext(upload_info.filename)[1].lower()
+        if file_extension not in config.ALLOWED_AUDIO_EXTENSIONS:
+            raise BadMediaType
+
+        if upload_info.length > config.AUDIO_MAX_SIZE:
+            raise PayloadTooLargeException
+
+        # the staged object is created by the first chunk
+        id = uuid4().hex
+        async with self.uow:
+            audio_repo = self.uow.get_audio_file_repo()
+            audio_file = await audio_repo.get_one_by_user_id_and_filename(
+                user_id=user_id, filename_original=upload_info.custom_filename
+            )
+            if audio_file:
+                raise ConflictException
+
+            upload_repo = self.uow.get_audio_upload_repo()
+            upload = await upload_repo.create_one(
+                upload_info=AudioUploadCreateDTO(
+                    id=id,
+                    user_id=user_id,
+                    filename_original=upload_info.custom_filename,
+                    file_extension=file_extension,
+                    upload_length=upload_info.length,
+                    expire_in=datetime.now(tz=UTC)
+                    + timedelta(hours=config.AUDIO_UPLOAD_EXPIRE_HOURS),
+                )
+            )
+            await self.uow.commit()
+
+        return AudioUploadResponseDTO.model_validate(upload, from_attributes=True)
+
+    async def get_upload(self, *, id: str, user_id: int) -> AudioUploadResponseDTO:
+        async with self.uow:
+            upload_repo = self.uow.get_audio_upload_repo()
+            upload = await upload_repo.get_one_by_id(id=id)
+
+        upload = self._check_upload(upload=upload, user_id=user_id)
+        return AudioUploadResponseDTO.model_validate(upload, from_attributes=True)
+
+    async def append_chunk(
+        self, *, id: str, user_id: int, offset: int, stream: AsyncIterator[bytes]
+    ) -> int:
+        # a lease at the current offset, not a row lock, guards the write, so
+        # no connection is held while a slow client sends its chunk
+        lease_token = uuid4().hex
+        async with self.uow:
+            upload_repo = self.uow.get_audio_upload_repo()
+            upload = await upload_repo.get_one_by_id(id=id)
+            upload = self._check_upload(upload=upload, user_id=user_id)
+            if upload.upload_offset != offset:
+                raise ConflictException
+
+            # a concurrent PATCH holding the lease is rejected before writing
+            leased = await upload_repo.lease_one_by_id(
+                id=id,
+                offset=offset,
+                lease_token=lease_token,
+                lease_seconds=config.AUDIO_UPLOAD_LEASE_SECONDS,
+            )
+            if not leased:
+                raise ConflictException
+            await self.uow.commit()
+
+        try:
+            stream = self._limit_stream(
+                id=id, stream=stream, position=offset, length=upload.upload_length
+            )
+            stream = self._hold_lease(id=id, lease_token=lease_token, stream=stream)
+            # the first chunk is sniffed before anything is stored
+            if offset == 0:
+                audio_format, stream = await sniff_stream(stream)
+                if audio_format is None:
+                    raise BadMediaType
+
+            try:
+                written = await self.storage.append(
+                    key=self._get_upload_key(id=id), offset=offset, stream=stream
+                )
+            except (PayloadTooLargeException, ConflictException, InternalException):
+                raise
+            except FileNotFoundError:
+                raise NotFoundException
+            except Exception as e:
+                logger.error("Upload chunk write failed: %s", e)
+                raise InternalException from e
+        except Exception:
+            # the next PATCH at this offset overwrites whatever got stored
+            await self._release_lease(id=id, lease_token=lease_token)
+            raise
+
+        position = offset + written
+        async with self.uow:
+            upload_repo = self.uow.get_audio_upload_repo()
+            updated = await upload_repo.update_offset_by_id(
+                id=id,
+                lease_token=lease_token,
+                offset_expected=offset,
+                offset_new=position,
+            )
+            await self.uow.commit()
+        if not updated:
+            logger.error("Upload %s lost its lease at offset %s", id, offset)
+            raise ConflictException
+
+        return position
+
+    async def finalize_upload(
+        self, *, id: str, user_id: int
+    ) -> AudioFileCreateResponseDTO:
+        upload_key = self._get_upload_key(id=id)
+
+        async with self.uow:
+            upload_repo = self.uow.get_audio_upload_repo()
+            upload = await upload_repo.get_one_by_id(id=id)
+
+        upload = self._check_upload(upload=upload, user_id=user_id)
+        if upload.upload_offset != upload.upload_length:
+            raise BadRequestException
+
+        # the content hash is computed before the session row gets locked
+        try:
+            await self.storage.seal(key=upload_key)
+            file_sha256, header, size = await self._hash_object(key=upload_key)
+        except Exception as e:
+            logger.error("Upload hash failed: %s", e)
+            raise InternalException from e
+        if size != upload.upload_length:
+            logger.error(
+                "Upload %s holds %s of %s bytes", id, size, upload.upload_length
+            )
+            await self._discard_upload(id=id)
+            raise InternalException
+
+        audio_format = sniff_format(header)
+        if audio_format is None:
+            await self._discard_upload(id=id)
+            raise BadMediaType
+
+        placed = False
+        try:
+            async with self.uow:
+                upload_repo = self.uow.get_audio_upload_repo()
+                upload = await upload_repo.get_one_by_id(id=id, for_update=True)
+                upload = self._check_upload(upload=upload, user_id=user_id)
+
+                blob_repo = self.uow.get_audio_blob_repo()
+                inserted = await blob_repo.acquire_one(
+                    blob_info=AudioBlobCreateDTO(
+                        sha256=file_sha256,
+                        size=upload.upload_length,
+                        format=audio_format,
+                    )
+                )
+                audio_repo = self.uow.get_audio_file_repo()
+                audio_file = await audio_repo.create_one(
+                    audio_file_info=AudioFileCreateRequestDTO(
+                        user_id=user_id,
+                        filename_original=upload.filename_original,
+                        filename_unique=(
+                            f"{uuid4()}{AUDIO_FORMAT_EXTENSIONS[audio_format]}"
+                        ),
+                        blob_sha256=file_sha256,
+                    )
+                )
+                if not audio_file:
+                    raise ConflictException
+                if inserted:
+                    await enqueue_blob_jobs(uow=self.uow, sha256s=[file_sha256])
+
+                await upload_repo.delete_one_by_id(id=id)
+
+                # the staged object stays in place until the transaction
+                # commits, so a failed finalize can be retried
+                blob_key = get_blob_key(sha256=file_sha256)
+                if inserted or await self.storage.stat(key=blob_key) is None:
+                    await self.storage.copy(source_key=upload_key, key=blob_key)
+                    placed = True
+
+                await self.uow.commit()
+        except Exception as e:
+            if placed:
+                await remove_unreferenced_blob(
+                    uow=self.uow, storage=self.storage, sha256=file_sha256
+                )
+
+            if isinstance(e, (NotFoundException, ConflictException, InternalException)):
+                raise
+            logger.error("Upload finalize failed: %s", e)
+            raise InternalException from e
+
+        await self.storage.delete(key=upload_key)
+
+        return AudioFileCreateResponseDTO(
+            id=audio_file.id,
+            filename_original=audio_file.filename_original,
+            filename_unique=audio_file.filename_unique,
+            size=upload.upload_length,
+            sha256=file_sha256,
+            format=audio_format,
+        )
+
+    async def delete_expired(self) -> int:
+        # rows go first, a staged object without its row is never written
+        # to again, so removing it after the commit cannot race a PATCH
+        deleted = 0
+        for _ in range(config.AUDIO_UPLOAD_REAPER_MAX_BATCHES):
+            async with self.uow:
+                upload_repo = self.uow.get_audio_upload_repo()
+                ids = await upload_repo.delete_expired_many(
+                    limit=config.AUDIO_UPLOAD_REAPER_BATCH_SIZE
+                )
+                await self.uow.commit()
+
+            for id in ids:
+                try:
+                    await self.storage.discard(key=self._get_upload_key(id=id))
+                except Exception:
+                    logger.exception("Upload %s staged object left orphaned", id)
+
+            deleted += len(ids)
+            if len(ids) < config.AUDIO_UPLOAD_REAPER_BATCH_SIZE:
+                break
+
+        return deleted
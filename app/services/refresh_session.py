@@ -1,15 +1,30 @@
 from abc import ABC, abstractmethod
-from datetime import datetime, timezone
+from datetime import UTC, datetime
+from uuid import uuid4
 
-from app.exceptions import AuthException
+from app.exceptions import AuthException, NotFoundException
 from app.models.refresh_session import (
     RefreshSessionCreateDTO,
+    RefreshSessionDeleteResponseDTO,
+    RefreshSessionGetDTO,
     RefreshSessionRequestDTO,
     RefreshSessionResponseDTO,
+    RefreshSessionsGetResponseDTO,
+    RefreshSessionsRevokeResponseDTO,
     RefreshSessionUpdateDTO,
 )
 from app.repositories.uow import BaseUnitOfWork
-from app.tokens.tokens import create_access_token, create_refresh_token
+from app.settings.config import config
+from app.tokens.revocations import revocation_set
+from app.tokens.tokens import (
+    create_access_token,
+    create_refresh_token,
+    create_signed_refresh_token,
+    get_refresh_token_expire_in,
+    hash_refresh_token,
+    is_signed_refresh_token,
+    validate_signed_refresh_token,
+)
 
 
 class BaseRefreshSessionService(ABC):
@@ -29,6 +44,24 @@ class BaseRefreshSessionService(ABC):
     ) -> RefreshSessionResponseDTO:
         pass
 
+    @abstractmethod
+    async def get_many_by_user_id(
+        self, *, user_id: int
+    ) -> RefreshSessionsGetResponseDTO:
+        pass
+
+    @abstractmethod
+    async def delete_one_by_id(
+        self, *, id: int, user_id: int
+    ) -> RefreshSessionDeleteResponseDTO:
+        pass
+
+    @abstractmethod
+    async def revoke_many_by_user_id(
+        self, *, user_id: int
+    ) -> RefreshSessionsRevokeResponseDTO:
+        pass
+
 
 class RefreshSessionService(BaseRefreshSessionService):
     def __init__(self, *, uow: BaseUnitOfWork):
@@ -37,14 +70,23 @@ class RefreshSessionService(BaseRefreshSessionService):
     async def create_tokens(
         self, *, user_info: RefreshSessionRequestDTO
     ) -> RefreshSessionResponseDTO:
-        refresh_token = create_refresh_token()
+        expire_in = get_refresh_token_expire_in()
+        if config.REFRESH_TOKEN_SIGNED:
+            # the row keeps the family id hash, the token adds the generation
+            session_key = uuid4().hex
+            refresh_token = create_signed_refresh_token(
+                family=session_key, generation=0, expire_in=expire_in
+            )
+        else:
+            session_key = refresh_token = create_refresh_token()
 
         async with self.uow:
             session_repo = self.uow.get_refresh_session_repo()
             await session_repo.create_one(
                 session_info=RefreshSessionCreateDTO(
                     user_id=user_info.user_id,
-                    refresh_token=refresh_token,
+                    token_hash=hash_refresh_token(token=session_key),
+                    expire_in=expire_in,
                 )
             )
             await self.uow.commit()
@@ -59,23 +101,58 @@ class RefreshSessionService(BaseRefreshSessionService):
             refresh_token=refresh_token,
         )
 
+    async def _rotate_signed_tokens(self, *, token: str) -> RefreshSessionResponseDTO:
+        family, generation = validate_signed_refresh_token(token=token)
+        family_hash = hash_refresh_token(token=family)
+        expire_in = get_refresh_token_expire_in()
+
+        async with self.uow:
+            session_repo = self.uow.get_refresh_session_repo()
+            rotated = await session_repo.rotate_one(
+                token_hash=family_hash, generation=generation, expire_in=expire_in
+            )
+            if not rotated:
+                # an authentic token that is no longer current was used
+                # before, so the whole family is revoked
+                await session_repo.delete_one_by_token_hash(token_hash=family_hash)
+                await self.uow.commit()
+                raise AuthException
+
+            await self.uow.commit()
+
+        return RefreshSessionResponseDTO(
+            access_token=create_access_token(
+                user_id=rotated.user_id, is_superuser=rotated.is_superuser
+            ),
+            refresh_token=create_signed_refresh_token(
+                family=family, generation=generation + 1, expire_in=expire_in
+            ),
+        )
+
     async def update_tokens(
         self, *, request: RefreshSessionUpdateDTO
     ) -> RefreshSessionResponseDTO:
+        if is_signed_refresh_token(token=request.refresh_token):
+            return await self._rotate_signed_tokens(token=request.refresh_token)
+
         async with self.uow:
             session_repo = self.uow.get_refresh_session_repo()
-            session = await session_repo.get_one(refresh_token=request.refresh_token)
-            if not session or session.expire_in < datetime.now(tz=timezone.utc):
+            session = await session_repo.get_one(
+                token_hash=hash_refresh_token(token=request.refresh_token)
+            )
+            if not session or session.expire_in < datetime.now(tz=UTC):
                 raise AuthException
 
             user_repo = self.uow.get_user_repo()
-            user = await user_repo.get_by_id(id=session.user_id)
+            user = await user_repo.get_one_by_id(id=session.user_id)
             if not user:
                 raise AuthException
 
             refresh_token_new = create_refresh_token()
             await session_repo.update_one_by_id(
-                id=session.id, refresh_token=refresh_token_new
+                id=session.id,
+                token_hash=hash_refresh_token(token=refresh_token_new),
+                expire_in=get_refresh_token_expire_in(),
             )
 
             access_token = create_access_token(
@@ -86,3 +163,60 @@ class RefreshSessionService(BaseRefreshSessionService):
         return RefreshSessionResponseDTO(
             access_token=access_token, refresh_token=refresh_token_new
         )
+
+    async def get_many_by_user_id(
+        self, *, user_id: int
+    ) -> RefreshSessionsGetResponseDTO:
+        async with self.uow:
+            session_repo = self.uow.get_refresh_session_repo()
+            sessions = await session_repo.get_many_by_user_id(user_id=user_id)
+
+        return RefreshSessionsGetResponseDTO(
+            user_id=user_id,
+            sessions=[
+                RefreshSessionGetDTO(
+                    id=session.id,
+                    created_at=session.created_at,
+                    expire_in=session.expire_in,
+                )
+                for session in sessions
+            ],
+        )
+
+    async def delete_one_by_id(
+        self, *, id: int, user_id: int
+    ) -> RefreshSessionDeleteResponseDTO:
+        # access tokens carry no session id, the ones already issued for this
+        # session stay valid until they expire
+        async with self.uow:
+            session_repo = self.uow.get_refresh_session_repo()
+            id_deleted = await session_repo.delete_one_by_id(id=id, user_id=user_id)
+            await self.uow.commit()
+
+        if not id_deleted:
+            raise NotFoundException
+
+        return RefreshSessionDeleteResponseDTO(id=id_deleted)
+
+    async def revoke_many_by_user_id(
+        self, *, user_id: int
+    ) -> RefreshSessionsRevokeResponseDTO:
+        # deleting the sessions stops refreshes, the watermark rejects the
+        # access tokens issued before it on every worker
+        async with self.uow:
+            session_repo = self.uow.get_refresh_session_repo()
+            sessions_revoked = await session_repo.delete_many_by_user_id(
+                user_id=user_id
+            )
+            revocation_repo = self.uow.get_token_revocation_repo()
+            revoked_at = await revocation_repo.upsert_one(
+                user_id=user_id, revoked_at=datetime.now(tz=UTC)
+            )
+            await self.uow.commit()
+
+        # this worker does not wait for its own notification
+        revocation_set.add(user_id=user_id, revoked_at=revoked_at.timestamp())
+
+        return RefreshSessionsRevokeResponseDTO(
+            user_id=user_id, sessions_revoked=sessions_revoked
+        )
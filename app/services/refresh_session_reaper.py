@@ -0,0 +1,111 @@
+from abc import ABC, abstractmethod
+from datetime import UTC, datetime, timedelta
+from logging import getLogger
+
+from app.metrics.metrics import registry
+from app.repositories.uow import BaseUnitOfWork
+from app.settings.config import config
+
+logger = getLogger(__name__)
+
+reaped_sessions_total = registry.counter(
+    name="refresh_sessions_reaped_total",
+    help="Expired refresh sessions deleted by the reaper.",
+)
+reaper_batches_total = registry.counter(
+    name="refresh_session_reaper_batches_total",
+    help="Delete batches run by the refresh session reaper.",
+)
+dropped_partitions_total = registry.counter(
+    name="refresh_session_partitions_dropped_total",
+    help="Expired refresh session partitions dropped.",
+)
+reaper_run_seconds = registry.histogram(
+    name="refresh_session_reaper_run_seconds",
+    help="Duration of one refresh session reaper run.",
+    buckets=[0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60],
+)
+
+
+class BaseRefreshSessionReaperService(ABC):
+    @abstractmethod
+    def __init__(self, *, uow: BaseUnitOfWork):
+        pass
+
+    @abstractmethod
+    async def maintain_partitions(self) -> int:
+        pass
+
+    @abstractmethod
+    async def delete_expired(self) -> int:
+        pass
+
+
+class RefreshSessionReaperService(BaseRefreshSessionReaperService):
+    def __init__(self, *, uow: BaseUnitOfWork):
+        self.uow = uow
+
+    async def maintain_partitions(self) -> int:
+        # creates the upcoming daily partitions and drops the ones whose whole
+        # range expired, returns how many were dropped
+        today = datetime.now(tz=UTC).date()
+        # without a default partition every expiry a login can get needs one,
+        # writes only create a missing day themselves as a fallback
+        last_day = (
+            datetime.now(tz=UTC)
+            + timedelta(minutes=config.REFRESH_TOKEN_EXPIRE_MINUTES)
+        ).date() + timedelta(days=config.REFRESH_SESSION_PARTITIONS_AHEAD_DAYS)
+        days = [
+            today + timedelta(days=offset)
+            for offset in range((last_day - today).days + 1)
+        ]
+        expired_before = datetime.now(tz=UTC) - timedelta(
+            seconds=config.REFRESH_SESSION_REAPER_GRACE_SECONDS
+        )
+
+        dropped = 0
+        # a partition is detached concurrently, which cannot run in a
+        # transaction, then dropped once nothing routes rows to it
+        async with self.uow.autocommit():
+            session_repo = self.uow.get_refresh_session_repo()
+            if not await session_repo.try_lock_partitions():
+                return 0
+
+            try:
+                await session_repo.create_partitions(days=days)
+                for day in await session_repo.get_partition_days():
+                    day_end = datetime(
+                        day.year, day.month, day.day, tzinfo=UTC
+                    ) + timedelta(days=1)
+                    if day_end <= expired_before:
+                        await session_repo.detach_partition(day=day)
+                        await session_repo.drop_partition(day=day)
+                        dropped += 1
+            finally:
+                # the connection goes back to the pool, the lock must not
+                await session_repo.unlock_partitions()
+
+        if dropped:
+            dropped_partitions_total.inc(dropped)
+            logger.info("Dropped %s expired refresh session partitions", dropped)
+        return dropped
+
+    async def delete_expired(self) -> int:
+        # one transaction per batch, so row locks are held only briefly
+        deleted = 0
+        for _ in range(config.REFRESH_SESSION_REAPER_MAX_BATCHES):
+            async with self.uow:
+                session_repo = self.uow.get_refresh_session_repo()
+                batch_deleted = await session_repo.delete_expired_many(
+                    limit=config.REFRESH_SESSION_REAPER_BATCH_SIZE,
+                    grace_seconds=config.REFRESH_SESSION_REAPER_GRACE_SECONDS,
+                )
+                await self.uow.commit()
+
+            reaper_batches_total.inc()
+            reaped_sessions_total.inc(batch_deleted)
+            deleted += batch_deleted
+            if batch_deleted < config.REFRESH_SESSION_REAPER_BATCH_SIZE:
+                break
+
+        return deleted
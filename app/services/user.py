@@ -1,27 +1,26 @@
 from abc import ABC, abstractmethod
+from datetime import UTC, datetime
 from logging import getLogger
 
-import httpx
-
-from app.exceptions import InternalException, NotFoundException
+from app.exceptions import AuthException, InternalException, NotFoundException
 from app.models.user import (
     UserAuthenticatedResponseDTO,
     UserCreateDTO,
     UserDeleteResponseDTO,
     UserGetResponseDTO,
-    UserUpdateDTO,
     UserUpdateRequestDTO,
     UserUpdateResponseDTO,
 )
+from app.oauth.yandex import BaseYandexOAuthClient
 from app.repositories.uow import BaseUnitOfWork
-from app.settings.config import config
+from app.tokens.revocations import revocation_set
 
 logger = getLogger(__name__)
 
 
 class BaseUserService(ABC):
     @abstractmethod
-    def __init__(self, uow: BaseUnitOfWork):
+    def __init__(self, uow: BaseUnitOfWork, *, oauth_client: BaseYandexOAuthClient):
         pass
 
     @abstractmethod
@@ -46,89 +45,47 @@ class BaseUserService(ABC):
 
 
 class UserService:
-    def __init__(self, uow: BaseUnitOfWork):
+    def __init__(self, uow: BaseUnitOfWork, *, oauth_client: BaseYandexOAuthClient):
         self.uow = uow
+        self.oauth_client = oauth_client
 
     async def authenticate_with_yandex(
         self, *, code: str
     ) -> UserAuthenticatedResponseDTO:
-        data_token_request = {
-            "grant_type": "authorization_code",
-            "code": code,
-            "client_id": config.YANDEX_CLIENT_ID,
-            "client_secret": config.YANDEX_CLIENT_SECRET,
-        }
-
+        access_token_yandex = await self.oauth_client.get_access_token(code=code)
+        user_info = await self.oauth_client.get_user_info(
+            access_token=access_token_yandex
+        )
         try:
-            # get tokens
-            async with httpx.AsyncClient() as client:
-                tokens_response = await client.post(
-                    url=config.YANDEX_OAUTH_TOKEN_URL, data=data_token_request
-                )
-                tokens_response.raise_for_status()
-                tokens = tokens_response.json()
-                access_token_yandex = tokens["access_token"]
-
-                if not access_token_yandex:
-                    InternalException()
-
-                # get user info
-                headers = {"Authorization": f"OAuth {access_token_yandex}"}
-                user_info_response = await client.get(
-                    config.YANDEX_API_USERINFO_URL, headers=headers
-                )
-                user_info_response.raise_for_status()
-
-                user_info = user_info_response.json()
-                username = user_info["login"]
-                phone_number = user_info["default_phone"]["number"]
-                yandex_id = user_info["id"]
+            username = user_info["login"]
+            phone_number = user_info["default_phone"]["number"]
+            yandex_id = user_info["id"]
+        except (KeyError, TypeError) as e:
+            logger.error("Yandex user info incomplete: %s", e)
+            raise AuthException
 
-        except httpx.HTTPError as e:
-            logger.error("Internal error: %s", e)
-            raise InternalException()
-
-        # check user in storage
         async with self.uow:
             user_repo = self.uow.get_user_repo()
-            user_result = await user_repo.get_one_by_yandex_id(yandex_id=yandex_id)
-
-            if user_result:
-                if (
-                    username != user_result.username
-                    or phone_number != user_result.phone_number
-                ):
-                    user_updated = await user_repo.update_one_by_yandex_id(
-                        user=UserUpdateDTO(
-                            username=username,
-                            phone_number=phone_number,
-                            yandex_id=yandex_id,
-                        )
-                    )
-                    return UserAuthenticatedResponseDTO.model_validate(
-                        user_updated, from_attributes=True
-                    )
-                else:
-                    await self.uow.commit()
-                    return UserAuthenticatedResponseDTO.model_validate(
-                        user_result, from_attributes=True
-                    )
-
-            user_created = await user_repo.create_one(
+            user = await user_repo.upsert_one_by_yandex_id(
                 user=UserCreateDTO(
                     username=username,
                     phone_number=phone_number,
                     yandex_id=yandex_id,
                 )
             )
+            # a concurrent first login committed after this statement's
+            # snapshot was taken, the row is visible to a new statement
+            if not user:
+                user = await user_repo.get_one_by_yandex_id(yandex_id=yandex_id)
+            if not user:
+                raise InternalException
 
             await self.uow.commit()
-            return UserAuthenticatedResponseDTO.model_validate(
-                user_created, from_attributes=True
-            )
+
+        return UserAuthenticatedResponseDTO.model_validate(user, from_attributes=True)
 
     async def get_one_by_id(self, *, id: int) -> UserGetResponseDTO:
-        async with self.uow:
+        async with self.uow.readonly():
             user_repo = self.uow.get_user_repo()
             user = await user_repo.get_one_by_id(id=id)
 
@@ -152,11 +109,20 @@ class UserService:
 
     async def delete_one_by_id(self, *, id: int) -> UserDeleteResponseDTO:
         async with self.uow:
+            # the user's sessions and live access tokens go with it
+            session_repo = self.uow.get_refresh_session_repo()
+            await session_repo.delete_many_by_user_id(user_id=id)
             user_repo = self.uow.get_user_repo()
             id_deleted = await user_repo.delete_one_by_id(id=id)
+            if not id_deleted:
+                raise NotFoundException
+
+            revocation_repo = self.uow.get_token_revocation_repo()
+            revoked_at = await revocation_repo.upsert_one(
+                user_id=id, revoked_at=datetime.now(tz=UTC)
+            )
             await self.uow.commit()
 
-        if not id_deleted:
-            raise NotFoundException
+        revocation_set.add(user_id=id, revoked_at=revoked_at.timestamp())
 
         return UserDeleteResponseDTO(id=id_deleted)
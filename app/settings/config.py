@@ -1,4 +1,6 @@
 from pathlib import Path
+from typing import Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -10,6 +12,28 @@ class Config(BaseSettings):
     DB_USER: str = Field(default=...)
     DB_DATABASE: str = Field(default=...)
     DB_PASSWORD: str = Field(default=...)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # transaction pooling in pgbouncer cannot keep named prepared statements
+    # across transactions, so statement caches are disabled in this mode
+    DB_PGBOUNCER: bool = False
+    # read replicas as "host" or "host:port", credentials match the primary
+    DB_REPLICA_HOSTS: list[str] = []
+    # read-only units of work run without BEGIN/ROLLBACK unless they opt out
+    DB_READONLY_AUTOCOMMIT: bool = True
+    DB_REPLICA_POOL_SIZE: int = 10
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_CHECK_SECONDS: float = 5.0
+    DB_REPLICA_CHECK_TIMEOUT_SECONDS: float = 2.0
+
+    # metrics, off by default since /metrics is served on the public app.
+    # with a token set, scrapers have to send it as a bearer token
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: str = ""
 
     # yandex
     YANDEX_CLIENT_ID: str = Field(default=...)
@@ -17,6 +41,16 @@ class Config(BaseSettings):
     YANDEX_OAUTH_TOKEN_URL: str = "https://oauth.yandex.ru/token"
     YANDEX_OAUTH_AUTHORIZE_URL: str = "https://oauth.yandex.ru/authorize"
     YANDEX_API_USERINFO_URL: str = "https://login.yandex.ru/info"
+    YANDEX_HTTP_MAX_CONNECTIONS: int = 20
+    YANDEX_HTTP2: bool = True
+    YANDEX_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    YANDEX_READ_TIMEOUT_SECONDS: float = 5.0
+    YANDEX_WRITE_TIMEOUT_SECONDS: float = 5.0
+    YANDEX_POOL_TIMEOUT_SECONDS: float = 2.0
+    YANDEX_RETRY_ATTEMPTS: int = 3
+    YANDEX_RETRY_BACKOFF_SECONDS: float = 0.2
+    YANDEX_BREAKER_FAILURES: int = 5
+    YANDEX_BREAKER_RESET_SECONDS: float = 30.0
 
     ALLOWED_AUDIO_CONTENT_TYPES: list[str] = [
         "audio/mpeg",
@@ -28,8 +62,93 @@ class Config(BaseSettings):
     ALLOWED_AUDIO_EXTENSIONS: list[str] = [".mp3", ".wav", ".ogg", ".aac", ".m4a"]
 
     AUDIO_STORAGE_PATH_RELATIVE: str = "./files/audio"
+    AUDIO_STREAM_CHUNK_SIZE: int = 256 * 1024
+    AUDIO_CACHE_MAX_AGE: int = 3600
+    AUDIO_MAX_SIZE: int = 1024 * 1024 * 1024
+    AUDIO_FILES_PAGE_SIZE_DEFAULT: int = 50
+    AUDIO_FILES_PAGE_SIZE_MAX: int = 200
+    AUDIO_EXPORT_BATCH_SIZE: int = 1000
+    AUDIO_BATCH_MAX_FILES: int = 20
+    AUDIO_BATCH_CONCURRENCY: int = 4
+
+    # background audio jobs
+    AUDIO_PROCESS_POOL_SIZE: int = 2
+    AUDIO_JOB_WORKER_ENABLED: bool = True
+    AUDIO_JOB_BATCH_SIZE: int = 8
+    AUDIO_JOB_POLL_SECONDS: float = 2.0
+    AUDIO_JOB_LEASE_SECONDS: int = 300
+    AUDIO_JOB_MAX_ATTEMPTS: int = 5
+    AUDIO_JOB_RETRY_SECONDS: int = 30
+    # peaks are min/max pairs per bucket of decoded mono samples, every
+    # resolution (samples per bucket) must be a multiple of the smallest
+    AUDIO_PEAKS_SAMPLE_RATE: int = 22050
+    AUDIO_PEAKS_RESOLUTIONS: list[int] = [256, 1024, 4096]
+
+    # transcoded renditions, generated on demand and evicted least recently
+    # used first once the cache grows past its size limit
+    AUDIO_RENDITION_BITRATES: list[int] = [64, 96, 128, 192, 256]
+    AUDIO_RENDITION_CACHE_MAX_SIZE: int = 10 * 1024 * 1024 * 1024
+    AUDIO_RENDITION_EVICT_BATCH_SIZE: int = 100
+    AUDIO_RENDITION_TOUCH_SECONDS: int = 60
+
+    # storage
+    STORAGE_BACKEND: Literal["local", "sharded", "s3"] = "sharded"
+    STORAGE_SHARD_DEPTH: int = 2
+    STORAGE_PRESIGN_EXPIRE_SECONDS: int = 900
+    S3_ENDPOINT_URL: str = "http://localhost:9000"
+    S3_BUCKET: str = "audio"
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONNECTIONS: int = 50
+    S3_TIMEOUT_SECONDS: float = 30.0
+
+    AUDIO_UPLOADS_PATH_RELATIVE: str = "./files/uploads"
+    AUDIO_UPLOAD_EXPIRE_HOURS: int = 24
+    AUDIO_UPLOAD_LEASE_SECONDS: int = 60
+    # expired resumable uploads are deleted with their staged objects
+    AUDIO_UPLOAD_REAPER_ENABLED: bool = True
+    AUDIO_UPLOAD_REAPER_INTERVAL_SECONDS: float = 300.0
+    AUDIO_UPLOAD_REAPER_BATCH_SIZE: int = 100
+    AUDIO_UPLOAD_REAPER_MAX_BATCHES: int = 10
 
     JWT_SECRET_KEY: str = Field(default=...)
+    # access tokens are signed with this Ed25519 or P-256 pem when set,
+    # HS256 and JWT_SECRET_KEY otherwise
+    JWT_SIGNING_KEY_PATH: str | None = None
+    # further keys published in the jwks and accepted, upcoming and retired
+    JWT_KEY_PATHS: list[str] = []
+    # keep accepting HS256 access tokens after switching to a signing key,
+    # turn off one access token lifetime after the switch
+    JWT_HS256_ACCEPTED: bool = True
+    JWKS_MAX_AGE_SECONDS: int = 300
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    # revocations reach other workers through LISTEN/NOTIFY, the listener
+    # needs a session level connection, so not a transaction pooled one
+    TOKEN_REVOCATION_LISTENER_ENABLED: bool = True
+    # postgres host for the listener when DB_HOST is a pgbouncer, defaults
+    # to DB_HOST
+    TOKEN_REVOCATION_LISTENER_HOST: str | None = None
+    TOKEN_REVOCATION_RECONNECT_SECONDS: float = 5.0
+    # signed refresh tokens carry a family id and generation, so forged or
+    # expired ones are rejected without a query and rotation is one update
+    REFRESH_TOKEN_SIGNED: bool = False
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 15
+    # expired refresh sessions are deleted in batches by every node, or by
+    # dropping daily partitions when the table is partitioned
+    REFRESH_SESSION_REAPER_ENABLED: bool = True
+    REFRESH_SESSION_REAPER_INTERVAL_SECONDS: float = 60.0
+    REFRESH_SESSION_REAPER_BATCH_SIZE: int = 1000
+    REFRESH_SESSION_REAPER_MAX_BATCHES: int = 50
+    REFRESH_SESSION_REAPER_GRACE_SECONDS: int = 60
+    REFRESH_SESSION_PARTITIONED: bool = False
+    REFRESH_SESSION_PARTITIONS_AHEAD_DAYS: int = 3
+    # verified access tokens are cached per process, disable to verify every
+    # request. the ttl caps how long a cached token outlives a revocation
+    JWT_CACHE_ENABLED: bool = True
+    JWT_CACHE_MAX_SIZE: int = 10000
+    JWT_CACHE_TTL_SECONDS: float = 60.0
 
     API_BASE_URL: str = Field(default=...)
 
@@ -41,9 +160,18 @@ class Config(BaseSettings):
     def DB_URL(self) -> str:
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}"
 
+    def get_db_url(self, *, host: str) -> str:
+        if ":" not in host:
+            host = f"{host}:{self.DB_PORT}"
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{host}/{self.DB_DATABASE}"
+
     @property
     def AUDIO_STORAGE_PATH_ABSOLUTE(self) -> Path:
         return Path(self.AUDIO_STORAGE_PATH_RELATIVE).resolve()
 
+    @property
+    def AUDIO_UPLOADS_PATH_ABSOLUTE(self) -> Path:
+        return Path(self.AUDIO_UPLOADS_PATH_RELATIVE).resolve()
+
 
 config = Config()
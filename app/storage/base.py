@@ -0,0 +1,111 @@
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from datetime import datetime
+from types import TracebackType
+from typing import Self
+
+import aiofiles.os
+from pydantic import BaseModel
+
+
+class StorageObjectStatDTO(BaseModel):
+    size: int
+    modified_at: datetime
+    etag: str | None = None
+
+
+class BaseStorageWriter(ABC):
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.abort()
+
+    @abstractmethod
+    async def write(self, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def abort(self) -> None:
+        pass
+
+
+class BaseStorageBackend(ABC):
+    @abstractmethod
+    async def open_write(self, *, key: str) -> BaseStorageWriter:
+        pass
+
+    @abstractmethod
+    def open_read_range(
+        self, *, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        pass
+
+    @abstractmethod
+    async def stat(self, *, key: str) -> StorageObjectStatDTO | None:
+        pass
+
+    @abstractmethod
+    async def delete(self, *, key: str) -> None:
+        pass
+
+    @abstractmethod
+    async def presign(self, *, key: str, expires_in: int) -> str | None:
+        pass
+
+    @abstractmethod
+    async def move(self, *, source_key: str, key: str) -> None:
+        pass
+
+    @abstractmethod
+    async def copy(self, *, source_key: str, key: str) -> None:
+        pass
+
+    @abstractmethod
+    async def put_file(self, *, key: str, path: str) -> None:
+        pass
+
+    @abstractmethod
+    async def append(
+        self, *, key: str, offset: int, stream: AsyncIterator[bytes]
+    ) -> int:
+        # writes the stream at offset, dropping whatever was stored past it,
+        # and returns the number of bytes written
+        pass
+
+    @abstractmethod
+    async def seal(self, *, key: str) -> None:
+        # makes an object built by appends readable as a whole
+        pass
+
+    @abstractmethod
+    async def discard(self, *, key: str) -> None:
+        # removes an object built by appends, sealed or not, if it exists
+        pass
+
+    async def move_file(self, *, key: str, path: str) -> None:
+        # places a local scratch file, which is removed even on failure
+        try:
+            await self.put_file(key=key, path=path)
+        finally:
+            with suppress(FileNotFoundError):
+                await aiofiles.os.remove(path)
+
+    def get_local_path(self, *, key: str) -> str | None:
+        return None
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import shutil
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from datetime import UTC, datetime
+from logging import getLogger
+from pathlib import Path, PurePosixPath
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+
+from app.storage.base import (
+    BaseStorageBackend,
+    BaseStorageWriter,
+    StorageObjectStatDTO,
+)
+
+logger = getLogger(__name__)
+
+
+class LocalStorageWriter(BaseStorageWriter):
+    def __init__(self, *, path: Path):
+        self.path = path
+        self.path_partial = path.with_name(f".{path.name}.{uuid4().hex}.partial")
+        self.file = None
+
+    async def open(self) -> None:
+        await aiofiles.os.makedirs(self.path.parent, exist_ok=True)
+        self.file = await aiofiles.open(self.path_partial, "wb")
+
+    async def write(self, data: bytes) -> None:
+        await self.file.write(data)
+
+    async def close(self) -> None:
+        await self.file.close()
+        await aiofiles.os.replace(self.path_partial, self.path)
+
+    async def abort(self) -> None:
+        await self.file.close()
+        try:
+            await aiofiles.os.remove(self.path_partial)
+        except FileNotFoundError:
+            pass
+
+
+class LocalStorageBackend(BaseStorageBackend):
+    def __init__(self, *, root: Path, chunk_size: int = 256 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def _get_path(self, *, key: str) -> Path:
+        key_path = PurePosixPath(key)
+        parts = key_path.parts
+        if not parts or key_path.is_absolute() or ".." in parts:
+            raise ValueError(f"Invalid storage key: {key!r}")
+
+        return self.root.joinpath(*parts)
+
+    def get_local_path(self, *, key: str) -> str | None:
+        return str(self._get_path(key=key))
+
+    async def open_write(self, *, key: str) -> BaseStorageWriter:
+        writer = LocalStorageWriter(path=self._get_path(key=key))
+        await writer.open()
+        return writer
+
+    async def open_read_range(
+        self, *, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        # end is exclusive, None reads to the end of the object
+        async with aiofiles.open(self._get_path(key=key), "rb") as file:
+            await file.seek(start)
+            position = start
+            while end is None or position < end:
+                size = self.chunk_size
+                if end is not None:
+                    size = min(size, end - position)
+
+                chunk = await file.read(size)
+                if not chunk:
+                    break
+
+                position += len(chunk)
+                yield chunk
+
+    async def stat(self, *, key: str) -> StorageObjectStatDTO | None:
+        try:
+            stat_result = await aiofiles.os.stat(self._get_path(key=key))
+        except FileNotFoundError:
+            return None
+
+        return StorageObjectStatDTO(
+            size=stat_result.st_size,
+            modified_at=datetime.fromtimestamp(stat_result.st_mtime, tz=UTC),
+        )
+
+    async def delete(self, *, key: str) -> None:
+        try:
+            await aiofiles.os.remove(self._get_path(key=key))
+        except FileNotFoundError:
+            logger.warning("Storage object %s already removed", key)
+
+    async def presign(self, *, key: str, expires_in: int) -> str | None:
+        return None
+
+    async def move(self, *, source_key: str, key: str) -> None:
+        path = self._get_path(key=key)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await aiofiles.os.replace(self._get_path(key=source_key), path)
+
+    async def copy(self, *, source_key: str, key: str) -> None:
+        await self.put_file(key=key, path=str(self._get_path(key=source_key)))
+
+    async def put_file(self, *, key: str, path: str) -> None:
+        # a hard link places the object without copying its bytes, the source
+        # file stays in place until the caller removes it
+        target = self._get_path(key=key)
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        target_partial = target.with_name(f".{target.name}.{uuid4().hex}.partial")
+        try:
+            await aiofiles.os.link(path, target_partial)
+        except OSError:
+            await aiofiles.os.wrap(shutil.copyfile)(path, target_partial)
+
+        await aiofiles.os.replace(target_partial, target)
+
+    @staticmethod
+    def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    async def append(
+        self, *, key: str, offset: int, stream: AsyncIterator[bytes]
+    ) -> int:
+        # written in place, so any worker sharing the storage root can
+        # continue an object another one started
+        path = self._get_path(key=key)
+        flags = os.O_WRONLY
+        if offset == 0:
+            await aiofiles.os.makedirs(path.parent, exist_ok=True)
+            flags |= os.O_CREAT
+        fd = await asyncio.to_thread(os.open, path, flags, 0o644)
+        position = offset
+        try:
+            await asyncio.to_thread(os.ftruncate, fd, offset)
+            async for chunk in stream:
+                await asyncio.to_thread(self._pwrite_all, fd, chunk, position)
+                position += len(chunk)
+            await asyncio.to_thread(os.fdatasync, fd)
+        finally:
+            os.close(fd)
+
+        return position - offset
+
+    async def seal(self, *, key: str) -> None:
+        pass
+
+    async def discard(self, *, key: str) -> None:
+        with suppress(FileNotFoundError):
+            await aiofiles.os.remove(self._get_path(key=key))
+
+
+class ShardedLocalStorageBackend(LocalStorageBackend):
+    # spreads objects over nested directories (ab/cd/abcd...) so no single
+    # directory grows to millions of entries
+    def __init__(self, *, root: Path, depth: int = 2, chunk_size: int = 256 * 1024):
+        super().__init__(root=root, chunk_size=chunk_size)
+        self.depth = depth
+
+    def _get_path(self, *, key: str) -> Path:
+        path = super()._get_path(key=key)
+        name = path.name
+        if len(name) < self.depth * 2:
+            raise ValueError(f"Storage key too short for sharding: {key!r}")
+
+        shards = [name[i * 2 : i * 2 + 2] for i in range(self.depth)]
+        return path.parent.joinpath(*shards, name)
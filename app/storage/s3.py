@@ -0,0 +1,471 @@
+import hashlib
+import hmac
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from logging import getLogger
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+import aiofiles
+import httpx
+
+from app.storage.base import (
+    BaseStorageBackend,
+    BaseStorageWriter,
+    StorageObjectStatDTO,
+)
+
+logger = getLogger(__name__)
+
+EMPTY_PAYLOAD_SHA256 = hashlib.sha256(b"").hexdigest()
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+S3_XML_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+# every part of a multipart upload but the last has to be at least this big
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def encode_query(*, query: dict[str, str]) -> str:
+    return "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+        for name, value in sorted(query.items())
+    )
+
+
+class S3Signer:
+    # AWS Signature Version 4, shared by S3 and compatible servers (MinIO etc.)
+    def __init__(self, *, access_key: str, secret_key: str, region: str):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+
+    def _get_signing_key(self, *, date: str) -> bytes:
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def _sign(
+        self,
+        *,
+        method: str,
+        url: str,
+        query: dict[str, str],
+        headers: dict[str, str],
+        payload_sha256: str,
+        timestamp: datetime,
+    ) -> tuple[str, str, str]:
+        url_parts = urlsplit(url)
+        date = timestamp.strftime("%Y%m%d")
+        scope = f"{date}/{self.region}/s3/aws4_request"
+
+        headers_canonical = {
+            name.lower(): " ".join(value.split()) for name, value in headers.items()
+        }
+        headers_signed = ";".join(sorted(headers_canonical))
+        query_canonical = encode_query(query=query)
+        request_canonical = "\n".join(
+            [
+                method,
+                url_parts.path or "/",
+                query_canonical,
+                "".join(
+                    f"{name}:{value}\n"
+                    for name, value in sorted(headers_canonical.items())
+                ),
+                headers_signed,
+                payload_sha256,
+            ]
+        )
+        string_to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                timestamp.strftime("%Y%m%dT%H%M%SZ"),
+                scope,
+                hashlib.sha256(request_canonical.encode()).hexdigest(),
+            ]
+        )
+        signature = hmac.new(
+            self._get_signing_key(date=date), string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+
+        return scope, headers_signed, signature
+
+    def sign_headers(
+        self,
+        *,
+        method: str,
+        url: str,
+        query: dict[str, str],
+        headers: dict[str, str],
+        payload_sha256: str,
+    ) -> dict[str, str]:
+        timestamp = datetime.now(tz=UTC)
+        headers = {
+            **headers,
+            "host": urlsplit(url).netloc,
+            "x-amz-date": timestamp.strftime("%Y%m%dT%H%M%SZ"),
+            "x-amz-content-sha256": payload_sha256,
+        }
+        scope, headers_signed, signature = self._sign(
+            method=method,
+            url=url,
+            query=query,
+            headers=headers,
+            payload_sha256=payload_sha256,
+            timestamp=timestamp,
+        )
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={headers_signed}, Signature={signature}"
+        )
+        return headers
+
+    def presign_url(self, *, method: str, url: str, expires_in: int) -> str:
+        timestamp = datetime.now(tz=UTC)
+        date = timestamp.strftime("%Y%m%d")
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": (
+                f"{self.access_key}/{date}/{self.region}/s3/aws4_request"
+            ),
+            "X-Amz-Date": timestamp.strftime("%Y%m%dT%H%M%SZ"),
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": "host",
+        }
+        _, _, signature = self._sign(
+            method=method,
+            url=url,
+            query=query,
+            headers={"host": urlsplit(url).netloc},
+            payload_sha256=UNSIGNED_PAYLOAD,
+            timestamp=timestamp,
+        )
+        query["X-Amz-Signature"] = signature
+        return f"{url}?{encode_query(query=query)}"
+
+
+class S3StorageWriter(BaseStorageWriter):
+    # small objects go out in a single PUT, anything larger than one part is
+    # sent as a multipart upload while the data is still streaming in
+    def __init__(self, *, backend: "S3StorageBackend", key: str):
+        self.backend = backend
+        self.key = key
+        self.buffer = bytearray()
+        self.upload_id: str | None = None
+        self.parts: list[tuple[int, str]] = []
+
+    async def _upload_part(
+        self, data: bytes | None = None, *, headers: dict[str, str] | None = None
+    ) -> None:
+        if self.upload_id is None:
+            response = await self.backend._request(
+                "POST", key=self.key, query={"uploads": ""}
+            )
+            root = ElementTree.fromstring(response.content)
+            self.upload_id = root.findtext(f"{S3_XML_NAMESPACE}UploadId") or (
+                root.findtext("UploadId")
+            )
+
+        part_number = len(self.parts) + 1
+        response = await self.backend._request(
+            "PUT",
+            key=self.key,
+            query={"partNumber": str(part_number), "uploadId": self.upload_id},
+            headers=headers,
+            content=data,
+        )
+        if data is None:
+            # a copied part reports its etag in the body
+            root = ElementTree.fromstring(response.content)
+            etag = root.findtext(f"{S3_XML_NAMESPACE}ETag") or root.findtext("ETag")
+        else:
+            etag = response.headers["etag"]
+        self.parts.append((part_number, etag))
+
+    async def _copy_part(self, *, source_key: str, start: int, end: int) -> None:
+        source = quote(f"/{self.backend.bucket}/{source_key}", safe="/-_.~")
+        await self._upload_part(
+            headers={
+                "x-amz-copy-source": source,
+                "x-amz-copy-source-range": f"bytes={start}-{end - 1}",
+            }
+        )
+
+    async def write(self, data: bytes) -> None:
+        self.buffer += data
+        while len(self.buffer) >= self.backend.part_size:
+            part = bytes(self.buffer[: self.backend.part_size])
+            del self.buffer[: self.backend.part_size]
+            await self._upload_part(part)
+
+    async def write_copy(self, *, source_key: str, size: int) -> None:
+        # appends a whole object. whatever can stand as a part of its own is
+        # copied server side, the rest is read through the buffer
+        start = 0
+        if self.buffer:
+            start = min(max(S3_MIN_PART_SIZE - len(self.buffer), 0), size)
+            if start:
+                async for chunk in self.backend.open_read_range(
+                    key=source_key, end=start
+                ):
+                    await self.write(chunk)
+            if len(self.buffer) >= S3_MIN_PART_SIZE:
+                await self._upload_part(bytes(self.buffer))
+                self.buffer.clear()
+
+        if self.buffer or size - start < S3_MIN_PART_SIZE:
+            if start < size:
+                async for chunk in self.backend.open_read_range(
+                    key=source_key, start=start
+                ):
+                    await self.write(chunk)
+            return
+
+        await self._copy_part(source_key=source_key, start=start, end=size)
+
+    async def close(self) -> None:
+        if self.upload_id is None:
+            await self.backend._request("PUT", key=self.key, content=bytes(self.buffer))
+            return
+
+        if self.buffer:
+            await self._upload_part(bytes(self.buffer))
+
+        parts_xml = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in self.parts
+        )
+        await self.backend._request(
+            "POST",
+            key=self.key,
+            query={"uploadId": self.upload_id},
+            content=(
+                f"<CompleteMultipartUpload>{parts_xml}</CompleteMultipartUpload>"
+            ).encode(),
+        )
+
+    async def abort(self) -> None:
+        if self.upload_id is None:
+            return
+
+        try:
+            await self.backend._request(
+                "DELETE", key=self.key, query={"uploadId": self.upload_id}
+            )
+        except httpx.HTTPError as e:
+            logger.error("Multipart upload abort failed: %s", e)
+
+
+class S3StorageBackend(BaseStorageBackend):
+    def __init__(
+        self,
+        *,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str,
+        part_size: int,
+        max_connections: int,
+        timeout: float,
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.part_size = part_size
+        self.signer = S3Signer(
+            access_key=access_key, secret_key=secret_key, region=region
+        )
+        # one pooled client for the whole process keeps connections alive
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+
+    def _get_url(self, *, key: str) -> str:
+        return f"{self.endpoint_url}/{self.bucket}/{quote(key, safe='/-_.~')}"
+
+    def _build_request(
+        self,
+        method: str,
+        *,
+        key: str,
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        content: bytes | None = None,
+    ) -> httpx.Request:
+        url = self._get_url(key=key)
+        query = query or {}
+        payload_sha256 = (
+            hashlib.sha256(content).hexdigest() if content else EMPTY_PAYLOAD_SHA256
+        )
+        headers_signed = self.signer.sign_headers(
+            method=method,
+            url=url,
+            query=query,
+            headers=headers or {},
+            payload_sha256=payload_sha256,
+        )
+        # the query string is sent exactly as it was signed
+        if query:
+            url = f"{url}?{encode_query(query=query)}"
+        return self.client.build_request(
+            method, url, headers=headers_signed, content=content
+        )
+
+    async def _request(
+        self,
+        method: str,
+        *,
+        key: str,
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        content: bytes | None = None,
+    ) -> httpx.Response:
+        request = self._build_request(
+            method, key=key, query=query, headers=headers, content=content
+        )
+        response = await self.client.send(request)
+        response.raise_for_status()
+        return response
+
+    async def open_write(self, *, key: str) -> BaseStorageWriter:
+        return S3StorageWriter(backend=self, key=key)
+
+    async def open_read_range(
+        self, *, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        # end is exclusive, None reads to the end of the object
+        headers = {}
+        if start or end is not None:
+            headers["range"] = f"bytes={start}-{'' if end is None else end - 1}"
+
+        request = self._build_request("GET", key=key, headers=headers)
+        response = await self.client.send(request, stream=True)
+        try:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def stat(self, *, key: str) -> StorageObjectStatDTO | None:
+        request = self._build_request("HEAD", key=key)
+        response = await self.client.send(request)
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        response.raise_for_status()
+
+        return StorageObjectStatDTO(
+            size=int(response.headers["content-length"]),
+            modified_at=parsedate_to_datetime(response.headers["last-modified"]),
+            etag=response.headers.get("etag"),
+        )
+
+    async def delete(self, *, key: str) -> None:
+        await self._request("DELETE", key=key)
+
+    async def presign(self, *, key: str, expires_in: int) -> str | None:
+        return self.signer.presign_url(
+            method="GET", url=self._get_url(key=key), expires_in=expires_in
+        )
+
+    async def copy(self, *, source_key: str, key: str) -> None:
+        # server side, the bytes never pass through this process
+        await self._request(
+            "PUT",
+            key=key,
+            headers={
+                "x-amz-copy-source": quote(f"/{self.bucket}/{source_key}", safe="/-_.~")
+            },
+        )
+
+    async def move(self, *, source_key: str, key: str) -> None:
+        await self.copy(source_key=source_key, key=key)
+        await self.delete(key=source_key)
+
+    async def put_file(self, *, key: str, path: str) -> None:
+        async with (
+            await self.open_write(key=key) as writer,
+            aiofiles.open(path, "rb") as file,
+        ):
+            while content := await file.read(self.part_size):
+                await writer.write(content)
+
+    @staticmethod
+    def _get_segment_prefix(*, key: str) -> str:
+        return f"{key}.segments/"
+
+    async def _list_objects(self, *, prefix: str) -> dict[str, int]:
+        # keys with their sizes
+        objects = {}
+        query = {"list-type": "2", "prefix": prefix}
+        while True:
+            response = await self._request("GET", key="", query=query)
+            root = ElementTree.fromstring(response.content)
+            for contents in root.iter(f"{S3_XML_NAMESPACE}Contents"):
+                objects[contents.findtext(f"{S3_XML_NAMESPACE}Key")] = int(
+                    contents.findtext(f"{S3_XML_NAMESPACE}Size")
+                )
+
+            token = root.findtext(f"{S3_XML_NAMESPACE}NextContinuationToken")
+            if root.findtext(f"{S3_XML_NAMESPACE}IsTruncated") != "true" or not token:
+                return objects
+            query = {**query, "continuation-token": token}
+
+    async def append(
+        self, *, key: str, offset: int, stream: AsyncIterator[bytes]
+    ) -> int:
+        # objects cannot be written in place, every append is a segment named
+        # by its offset. a retried append replaces the segment it started
+        segment_prefix = self._get_segment_prefix(key=key)
+        written = 0
+        async with await self.open_write(
+            key=f"{segment_prefix}{offset:020d}"
+        ) as writer:
+            async for chunk in stream:
+                await writer.write(chunk)
+                written += len(chunk)
+
+        return written
+
+    async def seal(self, *, key: str) -> None:
+        # assembles the segments into one object, sealing again only clears
+        # segments a previous seal left behind
+        segments = await self._list_objects(prefix=self._get_segment_prefix(key=key))
+        if not segments:
+            return
+
+        if await self.stat(key=key) is None:
+            segment_keys = sorted(segments)
+            if int(segment_keys[0].rpartition("/")[2]) != 0:
+                logger.error("Object %s has no segment at offset 0", key)
+                return
+
+            position = 0
+            async with await self.open_write(key=key) as writer:
+                for segment_key in segment_keys:
+                    # segments past the last contiguous one belong to appends
+                    # that were never committed
+                    if int(segment_key.rpartition("/")[2]) != position:
+                        break
+                    await writer.write_copy(
+                        source_key=segment_key, size=segments[segment_key]
+                    )
+                    position += segments[segment_key]
+
+        for segment_key in segments:
+            await self.delete(key=segment_key)
+
+    async def discard(self, *, key: str) -> None:
+        for segment_key in await self._list_objects(
+            prefix=self._get_segment_prefix(key=key)
+        ):
+            await self.delete(key=segment_key)
+        await self.delete(key=key)
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,37 @@
+from app.settings.config import config
+from app.storage.base import BaseStorageBackend
+from app.storage.local import LocalStorageBackend, ShardedLocalStorageBackend
+from app.storage.s3 import S3StorageBackend
+
+
+def create_storage_backend() -> BaseStorageBackend:
+    if config.STORAGE_BACKEND == "s3":
+        return S3StorageBackend(
+            endpoint_url=config.S3_ENDPOINT_URL,
+            bucket=config.S3_BUCKET,
+            access_key=config.S3_ACCESS_KEY,
+            secret_key=config.S3_SECRET_KEY,
+            region=config.S3_REGION,
+            part_size=config.S3_PART_SIZE,
+            max_connections=config.S3_MAX_CONNECTIONS,
+            timeout=config.S3_TIMEOUT_SECONDS,
+        )
+
+    if config.STORAGE_BACKEND == "sharded":
+        return ShardedLocalStorageBackend(
+            root=config.AUDIO_STORAGE_PATH_ABSOLUTE,
+            depth=config.STORAGE_SHARD_DEPTH,
+            chunk_size=config.AUDIO_STREAM_CHUNK_SIZE,
+        )
+
+    return LocalStorageBackend(
+        root=config.AUDIO_STORAGE_PATH_ABSOLUTE,
+        chunk_size=config.AUDIO_STREAM_CHUNK_SIZE,
+    )
+
+
+storage = create_storage_backend()
+
+
+async def close_storage():
+    await storage.close()
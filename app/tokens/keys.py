@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import json
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+
+from cryptography.hazmat.primitives.asymmetric.ec import (
+    SECP256R1,
+    EllipticCurvePrivateKey,
+    EllipticCurvePublicKey,
+)
+from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+    Ed25519PrivateKey,
+    Ed25519PublicKey,
+)
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key,
+    load_pem_public_key,
+)
+from jwt import PyJWK
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm
+
+from app.settings.config import config
+
+logger = getLogger(__name__)
+
+# members that identify a key in its rfc 7638 thumbprint
+THUMBPRINT_MEMBERS = {"EC": ("crv", "kty", "x", "y"), "OKP": ("crv", "kty", "x")}
+
+
+@dataclass
+class SigningKey:
+    kid: str
+    algorithm: str
+    # None for retired keys kept only to verify tokens they signed
+    private_key: Ed25519PrivateKey | EllipticCurvePrivateKey | None
+    # parsed once, so validation skips key preparation
+    public_jwk: PyJWK
+    jwk: dict
+
+
+def _get_algorithm(public_key: Ed25519PublicKey | EllipticCurvePublicKey) -> str:
+    if isinstance(public_key, Ed25519PublicKey):
+        return "EdDSA"
+    if isinstance(public_key, EllipticCurvePublicKey) and isinstance(
+        public_key.curve, SECP256R1
+    ):
+        return "ES256"
+    raise ValueError("Only Ed25519 and P-256 keys are supported")
+
+
+def _get_thumbprint(jwk: dict) -> str:
+    members = {name: jwk[name] for name in THUMBPRINT_MEMBERS[jwk["kty"]]}
+    canonical = json.dumps(members, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def load_signing_key(*, path: str) -> SigningKey:
+    data = Path(path).read_bytes()
+    if b"PRIVATE KEY" in data:
+        private_key = load_pem_private_key(data, password=None)
+        public_key = private_key.public_key()
+    else:
+        private_key = None
+        public_key = load_pem_public_key(data)
+
+    algorithm = _get_algorithm(public_key)
+    to_jwk = OKPAlgorithm.to_jwk if algorithm == "EdDSA" else ECAlgorithm.to_jwk
+    jwk = to_jwk(public_key, as_dict=True)
+    # the thumbprint keeps a kid stable across restarts and nodes
+    kid = _get_thumbprint(jwk)
+    jwk = {**jwk, "kid": kid, "alg": algorithm, "use": "sig"}
+
+    return SigningKey(
+        kid=kid,
+        algorithm=algorithm,
+        private_key=private_key,
+        public_jwk=PyJWK(jwk),
+        jwk=jwk,
+    )
+
+
+class KeyRing:
+    # every key in the ring is published and accepted, only the signing one
+    # issues tokens. a new key is published first, so edge caches have it
+    # before it signs, and the old one stays an access token lifetime after
+    def __init__(self, *, keys: list[SigningKey], signing_key: SigningKey | None):
+        self.keys = {key.kid: key for key in keys}
+        self.signing_key = signing_key
+        self.jwks = {"keys": [key.jwk for key in self.keys.values()]}
+
+    def get(self, *, kid: str) -> SigningKey | None:
+        return self.keys.get(kid)
+
+
+def load_key_ring() -> KeyRing:
+    keys = [load_signing_key(path=path) for path in config.JWT_KEY_PATHS]
+    signing_key = None
+    if config.JWT_SIGNING_KEY_PATH:
+        signing_key = load_signing_key(path=config.JWT_SIGNING_KEY_PATH)
+        if signing_key.private_key is None:
+            raise ValueError("JWT_SIGNING_KEY_PATH must hold a private key")
+        keys.insert(0, signing_key)
+
+    for key in keys:
+        logger.info("Loaded %s jwt key %s", key.algorithm, key.kid)
+    return KeyRing(keys=keys, signing_key=signing_key)
+
+
+key_ring = load_key_ring()
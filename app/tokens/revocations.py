@@ -0,0 +1,40 @@
+import time
+
+from app.settings.config import config
+
+
+class RevocationSet:
+    # per user watermarks, an access token issued before its user's
+    # watermark is revoked. watermarks older than the access token lifetime
+    # can no longer match a live token and are pruned as new ones come in,
+    # whether or not the listener is connected
+    def __init__(self, *, max_age_seconds: float, prune_seconds: float = 60.0):
+        self.max_age_seconds = max_age_seconds
+        self.prune_seconds = prune_seconds
+        self.pruned_at = time.monotonic()
+        self.watermarks: dict[int, float] = {}
+
+    def add(self, *, user_id: int, revoked_at: float) -> None:
+        if revoked_at > self.watermarks.get(user_id, 0):
+            self.watermarks[user_id] = revoked_at
+
+        # the set only grows here, a full pass is throttled so reloads stay
+        # linear
+        if time.monotonic() - self.pruned_at >= self.prune_seconds:
+            self.prune()
+
+    def is_revoked(self, *, user_id: int, issued_at: float) -> bool:
+        watermark = self.watermarks.get(user_id)
+        return watermark is not None and issued_at < watermark
+
+    def prune(self) -> None:
+        self.pruned_at = time.monotonic()
+        expired_before = time.time() - self.max_age_seconds
+        self.watermarks = {
+            user_id: revoked_at
+            for user_id, revoked_at in self.watermarks.items()
+            if revoked_at > expired_before
+        }
+
+
+revocation_set = RevocationSet(max_age_seconds=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
@@ -1,52 +1,201 @@
-from datetime import datetime, timedelta, timezone
+import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
 from logging import getLogger
 from typing import TypedDict
 from uuid import uuid4
 
-from jwt import decode, encode
+from jwt import decode, encode, get_unverified_header
 from jwt.exceptions import InvalidTokenError
 
 from app.exceptions import AuthException
+from app.metrics.metrics import registry
 from app.settings.config import config
+from app.tokens.keys import key_ring
 
 ALGORITHM = "HS256"
 
 logger = getLogger(__name__)
 
+token_cache_total = registry.counter(
+    name="auth_token_cache_total",
+    help="Access token validations by cache result.",
+)
+
 
 class TokenPayload(TypedDict):
     id: int
     is_superuser: bool
-    iat: datetime
-    exp: datetime
+    iat: float
+    exp: int
 
 
 def create_refresh_token() -> str:
     return str(uuid4())
 
 
+def hash_refresh_token(*, token: str) -> bytes:
+    # tokens carry 122 random bits, so a plain unkeyed digest is enough and
+    # matches sha256(convert_to(token, 'UTF8')) for backfills in sql
+    return hashlib.sha256(token.encode()).digest()
+
+
+SIGNED_REFRESH_TOKEN_PREFIX = "rt1"
+
+
+def _sign_refresh_token(payload: str) -> str:
+    # a key of its own, so an access token signature never verifies here
+    key = hashlib.sha256(f"refresh-token:{config.JWT_SECRET_KEY}".encode()).digest()
+    signature = hmac.new(key, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(signature).rstrip(b"=").decode()
+
+
+def get_refresh_token_expire_in() -> datetime:
+    # whole seconds, so the token exp and the session row expire together
+    expire_in = datetime.now(tz=UTC) + timedelta(
+        minutes=config.REFRESH_TOKEN_EXPIRE_MINUTES
+    )
+    return expire_in.replace(microsecond=0)
+
+
+def create_signed_refresh_token(
+    *, family: str, generation: int, expire_in: datetime
+) -> str:
+    # rt1.<family>.<generation>.<exp>.<signature>, checkable without the db
+    expire_at = int(expire_in.timestamp())
+    payload = f"{SIGNED_REFRESH_TOKEN_PREFIX}.{family}.{generation}.{expire_at}"
+    return f"{payload}.{_sign_refresh_token(payload)}"
+
+
+def is_signed_refresh_token(*, token: str) -> bool:
+    return token.startswith(f"{SIGNED_REFRESH_TOKEN_PREFIX}.")
+
+
+def validate_signed_refresh_token(*, token: str) -> tuple[str, int]:
+    # returns the family and generation of an authentic unexpired token
+    payload, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(signature, _sign_refresh_token(payload)):
+        raise AuthException
+
+    try:
+        _, family, generation, expire_at = payload.split(".")
+        generation, expire_at = int(generation), int(expire_at)
+    except ValueError:
+        raise AuthException
+    if expire_at <= time.time():
+        raise AuthException
+
+    return family, generation
+
+
 def create_access_token(*, user_id: int, is_superuser: bool) -> str:
-    time_now = datetime.now(tz=timezone.utc)
+    time_now = datetime.now(tz=UTC)
+    # iat keeps sub-second precision, so a token issued right after a
+    # revocation is not mistaken for one issued before it
     token_payload = {
         "id": user_id,
         "is_superuser": is_superuser,
-        "iat": time_now,
-        "exp": time_now + timedelta(minutes=15),
+        "iat": time_now.timestamp(),
+        "exp": time_now + timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES),
     }
 
+    signing_key = key_ring.signing_key
+    if signing_key is None:
+        return encode(
+            payload=token_payload,
+            key=config.JWT_SECRET_KEY,
+            algorithm=ALGORITHM,
+        )
+
     return encode(
         payload=token_payload,
-        key=config.JWT_SECRET_KEY,
-        algorithm=ALGORITHM,
+        key=signing_key.private_key,
+        algorithm=signing_key.algorithm,
+        headers={"kid": signing_key.kid},
     )
 
 
-def validate_access_token(*, token: str) -> TokenPayload:
+class TokenCache:
+    # verified payloads keyed by token digest, evicted least recently used
+    # first and never served past the token exp or the cache ttl
+    def __init__(self, *, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict[bytes, tuple[TokenPayload, float]] = OrderedDict()
+
+    @staticmethod
+    def _get_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, *, token: str) -> TokenPayload | None:
+        key = self._get_key(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        token_payload, expire_at = entry
+        if expire_at <= time.time():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return token_payload
+
+    def put(self, *, token: str, token_payload: TokenPayload) -> None:
+        expire_at = min(token_payload["exp"], time.time() + self.ttl_seconds)
+        key = self._get_key(token)
+        self.entries[key] = (token_payload, expire_at)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+token_cache = TokenCache(
+    max_size=config.JWT_CACHE_MAX_SIZE, ttl_seconds=config.JWT_CACHE_TTL_SECONDS
+)
+
+
+def _decode_access_token(*, token: str) -> TokenPayload:
+    # the kid picks a pre-parsed key and pins its algorithm, tokens without
+    # one are HS256 tokens from before the switch to a signing key
     try:
-        token_payload: TokenPayload = decode(
-            token, key=config.JWT_SECRET_KEY, algorithms=ALGORITHM
-        )
+        kid = get_unverified_header(token).get("kid")
+        if kid is not None:
+            signing_key = key_ring.get(kid=kid)
+            if signing_key is None:
+                raise AuthException
+            token_payload: TokenPayload = decode(
+                token, key=signing_key.public_jwk, algorithms=[signing_key.algorithm]
+            )
+        elif key_ring.signing_key is None or config.JWT_HS256_ACCEPTED:
+            token_payload = decode(
+                token, key=config.JWT_SECRET_KEY, algorithms=ALGORITHM
+            )
+        else:
+            raise AuthException
     except InvalidTokenError:
         raise AuthException
 
     return token_payload
+
+
+def validate_access_token(*, token: str) -> TokenPayload:
+    if not config.JWT_CACHE_ENABLED:
+        return _decode_access_token(token=token)
+
+    # only verified tokens are cached, a bad token is checked every time
+    token_payload = token_cache.get(token=token)
+    if token_payload is not None:
+        token_cache_total.inc(result="hit")
+        return token_payload
+
+    token_cache_total.inc(result="miss")
+    token_payload = _decode_access_token(token=token)
+    token_cache.put(token=token, token_payload=token_payload)
+    return token_payload
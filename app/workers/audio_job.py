@@ -0,0 +1,58 @@
+import asyncio
+from contextlib import suppress
+from logging import getLogger
+
+from app.repositories.uow import UnitOfWork
+from app.services.audio_job import AudioJobService
+from app.settings.config import config
+from app.storage.storage import storage
+from app.workers.pool import process_pool
+
+logger = getLogger(__name__)
+
+
+class AudioJobWorker:
+    # polls the shared job table, so any number of nodes can run a worker
+    def __init__(self, *, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        service = AudioJobService(
+            uow=UnitOfWork(), storage=storage, executor=process_pool.get()
+        )
+        while True:
+            try:
+                processed = await service.run_once()
+            except Exception:
+                logger.exception("Audio job batch failed")
+                processed = 0
+
+            if not processed:
+                await asyncio.sleep(self.poll_seconds)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+
+audio_job_worker = AudioJobWorker(poll_seconds=config.AUDIO_JOB_POLL_SECONDS)
+
+
+async def main():
+    audio_job_worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await audio_job_worker.stop()
+        process_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import asyncio
+from contextlib import suppress
+from logging import getLogger
+
+from app.repositories.uow import UnitOfWork
+from app.services.audio_upload import AudioUploadService
+from app.settings.config import config
+from app.storage.storage import storage
+
+logger = getLogger(__name__)
+
+
+class AudioUploadReaper:
+    # safe on every node: deletes skip rows another node has locked
+    def __init__(self, *, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.task: asyncio.Task | None = None
+
+    async def run_once(self) -> int:
+        service = AudioUploadService(uow=UnitOfWork(), storage=storage)
+        deleted = await service.delete_expired()
+        if deleted:
+            logger.info("Reaped %s expired audio uploads", deleted)
+        return deleted
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Audio upload reaper failed")
+
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+
+audio_upload_reaper = AudioUploadReaper(
+    interval_seconds=config.AUDIO_UPLOAD_REAPER_INTERVAL_SECONDS
+)
@@ -0,0 +1,28 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.settings.config import config
+
+
+class ProcessPool:
+    # one pool per process for CPU heavy audio work, created on first use
+    def __init__(self, *, max_workers: int):
+        self.max_workers = max_workers
+        self.executor: ProcessPoolExecutor | None = None
+
+    def get(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawned children do not inherit the event loop or database pool
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self.executor
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+process_pool = ProcessPool(max_workers=config.AUDIO_PROCESS_POOL_SIZE)
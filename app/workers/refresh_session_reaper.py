@@ -0,0 +1,65 @@
+import asyncio
+import time
+from contextlib import suppress
+from logging import getLogger
+
+from app.repositories.uow import UnitOfWork
+from app.services.refresh_session_reaper import (
+    RefreshSessionReaperService,
+    reaper_run_seconds,
+)
+from app.settings.config import config
+
+logger = getLogger(__name__)
+
+
+class RefreshSessionReaper:
+    # safe on every node: deletes skip rows another node has locked and
+    # partition maintenance is serialized by an advisory lock
+    def __init__(self, *, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.task: asyncio.Task | None = None
+
+    async def prepare(self) -> None:
+        # partitions must exist before the first login inserts a session
+        if config.REFRESH_SESSION_PARTITIONED:
+            await RefreshSessionReaperService(uow=UnitOfWork()).maintain_partitions()
+
+    async def run_once(self) -> int:
+        service = RefreshSessionReaperService(uow=UnitOfWork())
+        start = time.perf_counter()
+        try:
+            if config.REFRESH_SESSION_PARTITIONED:
+                await service.maintain_partitions()
+            # also clears the expired rows of the current day
+            deleted = await service.delete_expired()
+        finally:
+            reaper_run_seconds.observe(time.perf_counter() - start)
+
+        if deleted:
+            logger.info("Reaped %s expired refresh sessions", deleted)
+        return deleted
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Refresh session reaper failed")
+
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+
+refresh_session_reaper = RefreshSessionReaper(
+    interval_seconds=config.REFRESH_SESSION_REAPER_INTERVAL_SECONDS
+)
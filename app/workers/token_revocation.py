@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from logging import getLogger
+
+import asyncpg
+
+from app.metrics.metrics import registry
+from app.repositories.token_revocation import TOKEN_REVOCATIONS_CHANNEL
+from app.repositories.uow import UnitOfWork
+from app.settings.config import config
+from app.tokens.revocations import RevocationSet, revocation_set
+
+logger = getLogger(__name__)
+
+revocations_received_total = registry.counter(
+    name="token_revocations_received_total",
+    help="Token revocation notifications received from postgres.",
+)
+
+
+class TokenRevocationListener:
+    # keeps the in-process revocation set in step with the other workers,
+    # notifications missed while disconnected are reloaded on reconnect
+    def __init__(self, *, revocations: RevocationSet, reconnect_seconds: float):
+        self.revocations = revocations
+        self.reconnect_seconds = reconnect_seconds
+        self.connected = False
+        self.task: asyncio.Task | None = None
+
+    def _on_notification(
+        self, connection: asyncpg.Connection, pid: int, channel: str, payload: str
+    ) -> None:
+        try:
+            user_id, revoked_at = payload.split(":")
+            self.revocations.add(user_id=int(user_id), revoked_at=float(revoked_at))
+        except ValueError:
+            logger.error("Malformed token revocation notification: %s", payload)
+            return
+
+        revocations_received_total.inc()
+
+    async def reload(self) -> int:
+        # watermarks older than the access token lifetime cannot match a
+        # live token, so only the recent ones are loaded
+        since = datetime.now(tz=UTC) - timedelta(
+            seconds=self.revocations.max_age_seconds
+        )
+        async with UnitOfWork() as uow:
+            revocation_repo = uow.get_token_revocation_repo()
+            revocations = await revocation_repo.get_many_since(since=since)
+
+        for user_id, revoked_at in revocations:
+            self.revocations.add(user_id=user_id, revoked_at=revoked_at.timestamp())
+        return len(revocations)
+
+    async def _listen(self) -> None:
+        connection = await asyncpg.connect(
+            host=config.TOKEN_REVOCATION_LISTENER_HOST or config.DB_HOST,
+            port=config.DB_PORT,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_DATABASE,
+        )
+        try:
+            # listen before reloading, so nothing committed in between is lost
+            await connection.add_listener(
+                TOKEN_REVOCATIONS_CHANNEL, self._on_notification
+            )
+            reloaded = await self.reload()
+            logger.info("Token revocation listener loaded %s watermarks", reloaded)
+            self.connected = True
+
+            while not connection.is_closed():
+                await asyncio.sleep(self.reconnect_seconds)
+                # a round trip notices a dead connection asyncpg has not seen yet
+                await connection.execute("SELECT 1")
+        finally:
+            self.connected = False
+            await connection.close(timeout=self.reconnect_seconds)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except Exception:
+                logger.exception("Token revocation listener failed")
+
+            await asyncio.sleep(self.reconnect_seconds)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+
+token_revocation_listener = TokenRevocationListener(
+    revocations=revocation_set,
+    reconnect_seconds=config.TOKEN_REVOCATION_RECONNECT_SECONDS,
+)
+registry.gauge(
+    name="token_revocation_listener_connected",
+    help="Whether the token revocation listener holds a connection.",
+    callback=lambda: int(token_revocation_listener.connected),
+)
+registry.gauge(
+    name="token_revocation_watermarks",
+    help="Per-user revocation watermarks held in process.",
+    callback=lambda: len(revocation_set.watermarks),
+)
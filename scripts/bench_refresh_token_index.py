@@ -0,0 +1,103 @@
+"""Compare refresh token index layouts by size and lookup latency.
+
+Builds scratch tables holding the same random tokens, one per layout, then
+reports index size and the mean time of point lookups:
+
+    python -m scripts.bench_refresh_token_index --rows 20000000 --lookups 20000
+
+Needs Postgres 13+ for gen_random_uuid(). The scratch tables are dropped
+at the end.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from uuid import UUID
+
+from sqlalchemy import text
+
+from app.database.db import close_pool, engine
+from app.tokens.tokens import hash_refresh_token
+
+LAYOUTS = {
+    "text btree": ("token text", "btree (token)"),
+    "bytea btree": ("token bytea", "btree (token)"),
+    "bytea hash": ("token bytea", "hash (token)"),
+}
+
+
+async def build(*, name: str, column: str, index: str) -> None:
+    table = f"bench_tokens_{name.replace(' ', '_')}"
+    value = (
+        "uuid::text"
+        if column.startswith("token text")
+        else "sha256(convert_to(uuid::text, 'UTF8'))"
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        await conn.execute(text(f"CREATE TABLE {table} (id bigint, {column})"))
+        await conn.execute(
+            text(f"INSERT INTO {table} SELECT n, {value} FROM bench_tokens_source")
+        )
+        await conn.execute(text(f"CREATE INDEX {table}_token ON {table} USING {index}"))
+        await conn.execute(text(f"ANALYZE {table}"))
+
+
+async def measure(*, name: str, column: str, tokens: list[str]) -> tuple[int, float]:
+    table = f"bench_tokens_{name.replace(' ', '_')}"
+    async with engine.connect() as conn:
+        size = await conn.scalar(
+            text("SELECT pg_relation_size(:index)"), {"index": f"{table}_token"}
+        )
+        statement = text(f"SELECT id FROM {table} WHERE token = :token")
+        is_text = column.startswith("token text")
+        start = time.perf_counter()
+        for token in tokens:
+            key = token if is_text else hash_refresh_token(token=token)
+            await conn.scalar(statement, {"token": key})
+        elapsed = (time.perf_counter() - start) / len(tokens)
+
+    return size, elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS bench_tokens_source"))
+            await conn.execute(
+                text(
+                    "CREATE TABLE bench_tokens_source AS SELECT n, gen_random_uuid()"
+                    " AS uuid FROM generate_series(1, :rows) n"
+                ),
+                {"rows": args.rows},
+            )
+            sample = await conn.scalars(
+                text(
+                    "SELECT uuid FROM bench_tokens_source"
+                    " TABLESAMPLE SYSTEM (1) LIMIT :limit"
+                ),
+                {"limit": args.lookups},
+            )
+            tokens = [str(UUID(str(uuid))) for uuid in sample.all()]
+        random.shuffle(tokens)
+
+        print(f"{'layout':<14}{'index MiB':>12}{'lookup us':>12}")
+        for name, (column, index) in LAYOUTS.items():
+            await build(name=name, column=column, index=index)
+            size, elapsed = await measure(name=name, column=column, tokens=tokens)
+            print(f"{name:<14}{size / 2**20:>12.1f}{elapsed * 1e6:>12.1f}")
+    finally:
+        async with engine.begin() as conn:
+            for name in ["source", *(n.replace(" ", "_") for n in LAYOUTS)]:
+                await conn.execute(text(f"DROP TABLE IF EXISTS bench_tokens_{name}"))
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
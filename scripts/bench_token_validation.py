@@ -0,0 +1,53 @@
+"""Per-request cost of access token validation with and without the cache.
+
+Runs the same path as the dependency, header parsing included, against a
+small set of live tokens the way repeat clients send them:
+
+    python -m scripts.bench_token_validation --requests 100000 --tokens 50
+"""
+
+import argparse
+import random
+import time
+
+from app.http.deps import get_token_payload
+from app.settings.config import config
+from app.tokens.tokens import create_access_token, token_cache, token_cache_total
+
+
+def run(*, headers: list[str], requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        get_token_payload(authorization=random.choice(headers))
+    return (time.perf_counter() - start) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    headers = [
+        f"Bearer {create_access_token(user_id=user_id, is_superuser=False)}"
+        for user_id in range(args.tokens)
+    ]
+
+    config.JWT_CACHE_ENABLED = False
+    uncached = run(headers=headers, requests=args.requests)
+
+    config.JWT_CACHE_ENABLED = True
+    token_cache.clear()
+    cached = run(headers=headers, requests=args.requests)
+
+    print(f"uncached  {uncached * 1e6:8.2f} us/request")
+    print(f"cached    {cached * 1e6:8.2f} us/request")
+    print(f"speedup   {uncached / cached:8.1f}x")
+    print(
+        f"hits {token_cache_total.get(result='hit'):.0f}, "
+        f"misses {token_cache_total.get(result='miss'):.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
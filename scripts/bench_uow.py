@@ -0,0 +1,136 @@
+"""Count Postgres round trips per unit of work.
+
+A local TCP proxy sits between the app and the database and counts client
+writes, every write is one request the client waits on. Run against a
+database with the app tables created:
+
+    python -m scripts.bench_uow --iterations 200
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import time
+
+
+class CountingProxy:
+    def __init__(self, *, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.writes = 0
+
+    async def _pipe(self, reader, writer, *, count: bool) -> None:
+        try:
+            while data := await reader.read(65536):
+                if count:
+                    self.writes += 1
+                writer.write(data)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle(self, client_reader, client_writer) -> None:
+        server_reader, server_writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer, count=True),
+            self._pipe(server_reader, client_writer, count=False),
+            return_exceptions=True,
+        )
+
+
+class LegacyUnitOfWork:
+    # the previous lifecycle: every repository up front, ROLLBACK on exit
+    def __init__(self, uow):
+        self.uow = uow
+
+    async def __aenter__(self):
+        await self.uow.__aenter__()
+        for get_repo in (
+            self.uow.get_user_repo,
+            self.uow.get_refresh_session_repo,
+            self.uow.get_audio_file_repo,
+            self.uow.get_audio_upload_repo,
+            self.uow.get_audio_blob_repo,
+            self.uow.get_audio_job_repo,
+            self.uow.get_audio_rendition_repo,
+        ):
+            get_repo()
+        return self.uow
+
+    async def __aexit__(self, *args):
+        await self.uow.session.rollback()
+        await self.uow.__aexit__(*args)
+
+
+async def run(*, iterations: int, proxy: CountingProxy) -> None:
+    from app.database.db import close_pool
+    from app.repositories.uow import UnitOfWork
+
+    async def read(uow) -> None:
+        await uow.get_user_repo().get_one_by_id(id=1)
+
+    async def read_commit(uow) -> None:
+        await uow.get_user_repo().get_one_by_id(id=1)
+        await uow.commit()
+
+    scenarios = {
+        "read, legacy": (lambda uow: LegacyUnitOfWork(uow), read),
+        "read, transaction": (lambda uow: uow, read),
+        "read, readonly": (
+            lambda uow: uow.readonly(autocommit=False),
+            read,
+        ),
+        "read, readonly autocommit": (
+            lambda uow: uow.readonly(autocommit=True),
+            read,
+        ),
+        "commit, legacy": (lambda uow: LegacyUnitOfWork(uow), read_commit),
+        "commit, transaction": (lambda uow: uow, read_commit),
+    }
+
+    # warm the pool and the statement cache first
+    for enter, body in scenarios.values():
+        uow = UnitOfWork()
+        async with enter(uow) as active:
+            await body(active)
+
+    print(f"{'scenario':<28}{'round trips':>14}{'ms':>10}")
+    for name, (enter, body) in scenarios.items():
+        writes_before = proxy.writes
+        start = time.perf_counter()
+        for _ in range(iterations):
+            uow = UnitOfWork()
+            async with enter(uow) as active:
+                await body(active)
+        elapsed = (time.perf_counter() - start) / iterations
+        round_trips = (proxy.writes - writes_before) / iterations
+        print(f"{name:<28}{round_trips:>14.2f}{elapsed * 1000:>10.3f}")
+
+    await close_pool()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    # the engine is built on import, so it has to see the proxy address first
+    proxy = CountingProxy(
+        host=os.environ.get("DB_HOST", "localhost"),
+        port=int(os.environ.get("DB_PORT", "5432")),
+    )
+    listener = socket.create_server(("127.0.0.1", 0))
+    server = await asyncio.start_server(proxy.handle, sock=listener)
+    os.environ["DB_HOST"] = "127.0.0.1"
+    os.environ["DB_PORT"] = str(listener.getsockname()[1])
+    os.environ["DB_REPLICA_HOSTS"] = "[]"
+
+    async with server:
+        await run(iterations=args.iterations, proxy=proxy)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""Move refresh sessions from cleartext tokens to sha256 digests.
+
+Safe to rerun, every step checks what is already done:
+
+    python -m scripts.migrate_refresh_token_hash            # before deploy
+    python -m scripts.migrate_refresh_token_hash            # after deploy
+    python -m scripts.migrate_refresh_token_hash --finalize
+
+The first run adds the token_hash column, lets the old cleartext column go
+null, backfills digests in batches and builds the hash index without
+blocking writes. Run it again once the new code is live. That picks up
+rows the old code inserted in between. --finalize then drops the
+cleartext column and its index. Partitioned tables are created with the
+new layout and need none of this.
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+from app.database.db import close_pool, engine
+
+TABLE = "refresh_sessions"
+
+
+async def has_column(*, name: str) -> bool:
+    async with engine.connect() as conn:
+        return bool(
+            await conn.scalar(
+                text(
+                    "SELECT 1 FROM information_schema.columns"
+                    " WHERE table_name = :table AND column_name = :column"
+                ),
+                {"table": TABLE, "column": name},
+            )
+        )
+
+
+async def prepare() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS token_hash bytea")
+        )
+        await conn.execute(
+            text(f"ALTER TABLE {TABLE} ALTER COLUMN refresh_token DROP NOT NULL")
+        )
+
+
+async def backfill(*, batch_size: int) -> int:
+    # short transactions, so logins and refreshes keep going meanwhile
+    statement = text(
+        f"UPDATE {TABLE} SET token_hash = sha256(convert_to(refresh_token, 'UTF8'))"
+        f" WHERE id IN (SELECT id FROM {TABLE}"
+        " WHERE token_hash IS NULL AND refresh_token IS NOT NULL"
+        " LIMIT :limit FOR UPDATE SKIP LOCKED)"
+    )
+    total = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(statement, {"limit": batch_size})
+        total += result.rowcount
+        print(f"backfilled {total}")
+        if result.rowcount < batch_size:
+            return total
+
+
+async def create_index() -> None:
+    # CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(
+            text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS"
+                f" ix_{TABLE}_token_hash ON {TABLE} USING hash (token_hash)"
+            )
+        )
+
+
+async def finalize() -> None:
+    async with engine.begin() as conn:
+        # sessions without a digest cannot be looked up by the new code
+        result = await conn.execute(
+            text(f"DELETE FROM {TABLE} WHERE token_hash IS NULL")
+        )
+        print(f"deleted {result.rowcount} sessions without a digest")
+        await conn.execute(
+            text(f"ALTER TABLE {TABLE} ALTER COLUMN token_hash SET NOT NULL")
+        )
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(
+            text(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{TABLE}_refresh_token")
+        )
+        await conn.execute(text(f"ALTER TABLE {TABLE} DROP COLUMN refresh_token"))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--finalize", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        if not await has_column(name="refresh_token"):
+            print("already migrated")
+            return
+
+        await prepare()
+        await backfill(batch_size=args.batch_size)
+        await create_index()
+        if args.finalize:
+            await finalize()
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+"""In-memory stand-in for the parts of the S3 API the storage driver uses.
+
+Point the app or scripts.check_storage at it instead of MinIO:
+
+    python -m scripts.mock_s3 --port 9000
+    STORAGE_BACKEND=s3 S3_ENDPOINT_URL=http://127.0.0.1:9000 S3_BUCKET=audio
+
+Objects live in memory and vanish with the process. Requests must be
+signed, and the signed payload hash must match the body, but signatures
+are not verified. Use the minio compose profile to check those.
+"""
+
+import argparse
+import hashlib
+from datetime import UTC, datetime
+from email.utils import format_datetime
+from urllib.parse import unquote
+from uuid import uuid4
+from xml.etree import ElementTree
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+S3_XML_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def create_app() -> FastAPI:
+    app = FastAPI()
+    objects: dict[str, tuple[bytes, datetime]] = {}
+    uploads: dict[str, dict[int, bytes]] = {}
+
+    def error(status_code: int, code: str) -> Response:
+        return Response(
+            status_code=status_code,
+            content=f"<Error><Code>{code}</Code></Error>",
+            media_type="application/xml",
+        )
+
+    def object_headers(data: bytes, modified_at: datetime) -> dict[str, str]:
+        return {
+            "etag": f'"{hashlib.md5(data).hexdigest()}"',
+            "last-modified": format_datetime(modified_at, usegmt=True),
+            "accept-ranges": "bytes",
+        }
+
+    async def check_request(request: Request) -> tuple[bytes, Response | None]:
+        body = await request.body()
+        if "X-Amz-Signature" in request.query_params:
+            return body, None
+        if not request.headers.get("authorization", "").startswith("AWS4-HMAC-SHA256 "):
+            return body, error(403, "AccessDenied")
+        payload_sha256 = request.headers.get("x-amz-content-sha256")
+        if payload_sha256 != hashlib.sha256(body).hexdigest():
+            return body, error(400, "XAmzContentSHA256Mismatch")
+        return body, None
+
+    @app.get("/{bucket}/")
+    async def list_objects(request: Request, bucket: str) -> Response:
+        _, failure = await check_request(request)
+        if failure:
+            return failure
+
+        prefix = f"{bucket}/{request.query_params.get('prefix', '')}"
+        keys = sorted(key for key in objects if key.startswith(prefix))
+        # small pages, so clients have to follow continuation tokens
+        start = int(request.query_params.get("continuation-token", 0))
+        page = keys[start : start + 2]
+        contents = "".join(
+            f"<Contents><Key>{key.removeprefix(f'{bucket}/')}</Key>"
+            f"<Size>{len(objects[key][0])}</Size></Contents>"
+            for key in page
+        )
+        truncated = start + len(page) < len(keys)
+        token = (
+            f"<NextContinuationToken>{start + len(page)}</NextContinuationToken>"
+            if truncated
+            else ""
+        )
+        return Response(
+            content=(
+                f'<ListBucketResult xmlns="{S3_XML_NAMESPACE}">'
+                f"<IsTruncated>{str(truncated).lower()}</IsTruncated>"
+                f"{token}{contents}</ListBucketResult>"
+            ),
+            media_type="application/xml",
+        )
+
+    @app.api_route("/{bucket}/{key:path}", methods=["GET", "HEAD"])
+    async def get_object(request: Request, bucket: str, key: str) -> Response:
+        _, failure = await check_request(request)
+        if failure:
+            return failure
+        if f"{bucket}/{key}" not in objects:
+            return error(404, "NoSuchKey")
+
+        data, modified_at = objects[f"{bucket}/{key}"]
+        headers = object_headers(data, modified_at)
+        if request.method == "HEAD":
+            headers["content-length"] = str(len(data))
+            return Response(headers=headers)
+
+        if range_header := request.headers.get("range"):
+            start, _, end = range_header.removeprefix("bytes=").partition("-")
+            start, end = int(start), int(end) if end else len(data) - 1
+            headers["content-range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(
+                status_code=206, content=data[start : end + 1], headers=headers
+            )
+        return Response(content=data, headers=headers)
+
+    @app.put("/{bucket}/{key:path}")
+    async def put_object(request: Request, bucket: str, key: str) -> Response:
+        body, failure = await check_request(request)
+        if failure:
+            return failure
+
+        if copy_source := request.headers.get("x-amz-copy-source"):
+            source = unquote(copy_source).lstrip("/")
+            if source not in objects:
+                return error(404, "NoSuchKey")
+            body = objects[source][0]
+            if copy_range := request.headers.get("x-amz-copy-source-range"):
+                start, _, end = copy_range.removeprefix("bytes=").partition("-")
+                body = body[int(start) : int(end) + 1]
+
+        if upload_id := request.query_params.get("uploadId"):
+            if upload_id not in uploads:
+                return error(404, "NoSuchUpload")
+            uploads[upload_id][int(request.query_params["partNumber"])] = body
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if copy_source:
+                return Response(
+                    content=(
+                        f'<CopyPartResult xmlns="{S3_XML_NAMESPACE}">'
+                        f"<ETag>{etag}</ETag></CopyPartResult>"
+                    ),
+                    media_type="application/xml",
+                )
+            return Response(headers={"etag": etag})
+
+        objects[f"{bucket}/{key}"] = (body, datetime.now(tz=UTC))
+        return Response(headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+    @app.post("/{bucket}/{key:path}")
+    async def post_object(request: Request, bucket: str, key: str) -> Response:
+        body, failure = await check_request(request)
+        if failure:
+            return failure
+
+        if "uploads" in request.query_params:
+            upload_id = uuid4().hex
+            uploads[upload_id] = {}
+            return Response(
+                content=(
+                    f'<InitiateMultipartUploadResult xmlns="{S3_XML_NAMESPACE}">'
+                    f"<UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>"
+                ),
+                media_type="application/xml",
+            )
+
+        parts = uploads.pop(request.query_params.get("uploadId", ""), None)
+        if parts is None:
+            return error(404, "NoSuchUpload")
+        numbers = [
+            int(number.text)
+            for number in ElementTree.fromstring(body).iter("PartNumber")
+        ]
+        data = b"".join(parts[number] for number in numbers)
+        objects[f"{bucket}/{key}"] = (data, datetime.now(tz=UTC))
+        return Response(
+            content="<CompleteMultipartUploadResult/>", media_type="application/xml"
+        )
+
+    @app.delete("/{bucket}/{key:path}")
+    async def delete_object(request: Request, bucket: str, key: str) -> Response:
+        _, failure = await check_request(request)
+        if failure:
+            return failure
+
+        if upload_id := request.query_params.get("uploadId"):
+            uploads.pop(upload_id, None)
+        else:
+            objects.pop(f"{bucket}/{key}", None)
+        return Response(status_code=204)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Local stand-in for the Yandex OAuth token and user info endpoints.
+
+Point the app at it and drive the callback without touching Yandex:
+
+    python -m scripts.mock_yandex_oauth --port 8081 --fail-rate 0.2
+    YANDEX_OAUTH_TOKEN_URL=http://127.0.0.1:8081/token
+    YANDEX_API_USERINFO_URL=http://127.0.0.1:8081/info
+
+Any code is accepted except "invalid", which gets the 400 Yandex returns
+for expired codes. --fail-rate answers that share of requests with 503
+and --latency delays every response.
+"""
+
+import argparse
+import asyncio
+import random
+from hashlib import sha256
+
+import uvicorn
+from fastapi import FastAPI, Form, Header
+from fastapi.responses import JSONResponse
+
+
+def create_app(*, fail_rate: float, latency: float) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    async def delay_or_fail() -> JSONResponse | None:
+        app.state.requests += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < fail_rate:
+            return JSONResponse(status_code=503, content={"error": "unavailable"})
+        return None
+
+    @app.post("/token")
+    async def token(code: str = Form(), grant_type: str = Form()):
+        if failure := await delay_or_fail():
+            return failure
+        if code == "invalid" or grant_type != "authorization_code":
+            return JSONResponse(status_code=400, content={"error": "invalid_grant"})
+        return {"access_token": f"token-{code}", "token_type": "bearer"}
+
+    @app.get("/info")
+    async def info(authorization: str = Header()):
+        if failure := await delay_or_fail():
+            return failure
+        if not authorization.startswith("OAuth token-"):
+            return JSONResponse(status_code=401, content={"error": "unauthorized"})
+
+        # the same code always maps to the same user
+        code = authorization.removeprefix("OAuth token-")
+        user_id = int(sha256(code.encode()).hexdigest()[:8], 16)
+        return {
+            "id": str(user_id),
+            "login": f"user{user_id}",
+            "default_phone": {"number": f"+7900{user_id % 10_000_000:07d}"},
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_app(fail_rate=args.fail_rate, latency=args.latency)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()